@@ -93,7 +93,7 @@ benchmark_ls() {
         ))
         printf '%2d, %-25s, %7.3f, %6d, %07d, %-25s, %-25s, %0.3f, %2d, %2d, %2d, %2d, %2d, %2d, %2d, %2d\n' \
         "$attempts" "$dir_name" $test_duration $sent_tokens $received_tokens \
-          $test_model $test_edit_format $test_timeouts $test_num_error_outputs $test_num_user_asks $test_num_exhausted_context_windows \
+          $test_model $test_edit_format $test_cost $test_timeouts $test_num_error_outputs $test_num_user_asks $test_num_exhausted_context_windows \
           $test_num_malformed_responses $test_syntax_errors $test_indentation_errors $test_lazy_comments
     done < <(find "$benchmark_run_dir" -name '.aider.results.json' -print0 | sort -z)
 
@@ -0,0 +1,123 @@
+"""
+Parser for benchmark runs archived as `.zip` or `.tar` files (optionally compressed), without extracting them.
+Archive members are decompressed on the fly: results files are small and read whole, while chat histories are scanned
+in fixed-size chunks (see `iter_token_usage_stream`), so memory stays bounded however large the archive is.
+
+`.tar.gz`, `.tar.bz2` and `.tar.xz` are read with the standard library; `.tar.zst` needs the `zstandard` package.
+"""
+import json
+import os
+import tarfile
+import zipfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import BinaryIO
+
+from benchmark_parser import CHAT_HISTORY_FILE_NAME, RESULTS_FILE_NAME, AiderTestResult, build_test_result
+from benchmark_profile import add_counts, phase
+from chat_history import iter_token_usage_stream, sum_token_usage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_SUFFIXES = ('.tar.zst', '.tar.zstd', '.tzst')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz') + ZSTD_SUFFIXES
+ZIP_SUFFIXES = ('.zip',)
+
+
+def is_benchmark_archive(path: str) -> bool:
+    """True if `path` is a file with one of the supported archive suffixes."""
+    return path.lower().endswith(TAR_SUFFIXES + ZIP_SUFFIXES) and os.path.isfile(path)
+
+
+def _scan_tokens(stream: BinaryIO) -> tuple[int, int]:
+    token_usage = sum_token_usage(list(iter_token_usage_stream(stream)))
+    return token_usage.sent, token_usage.received
+
+
+def _split_member_name(member_name: str) -> tuple[str, str]:
+    test_dir, _, file_name = member_name.rstrip('/').rpartition('/')
+    return test_dir, file_name
+
+
+def parse_zip_archive(archive_path: str) -> list[AiderTestResult]:
+    """Parse all tests of a zipped benchmark run, sorted by the path of their results file."""
+    results = []
+    with zipfile.ZipFile(archive_path) as archive:
+        member_names = set(archive.namelist())
+        for member_name in sorted(member_names):
+            test_dir, file_name = _split_member_name(member_name)
+            if file_name != RESULTS_FILE_NAME:
+                continue
+            with archive.open(member_name) as results_file:
+                test_results = json.load(results_file)
+            history_name = f"{test_dir}/{CHAT_HISTORY_FILE_NAME}" if test_dir else CHAT_HISTORY_FILE_NAME
+            sent_tokens = received_tokens = 0
+            if history_name in member_names:
+                with archive.open(history_name) as history_file:
+                    sent_tokens, received_tokens = _scan_tokens(history_file)
+            results.append(build_test_result(test_dir.rpartition('/')[2], test_results, sent_tokens, received_tokens))
+    return results
+
+
+@contextmanager
+def _open_tar_stream(archive_path: str) -> Iterator[tarfile.TarFile]:
+    with open(archive_path, 'rb') as archive_file:
+        if archive_path.lower().endswith(ZSTD_SUFFIXES):
+            if zstandard is None:
+                raise RuntimeError(f"Reading {archive_path} needs the `zstandard` package: pip install zstandard")
+            with zstandard.ZstdDecompressor().stream_reader(archive_file) as stream:
+                with tarfile.open(fileobj=stream, mode='r|') as archive:
+                    yield archive
+        else:
+            # Stream mode: members are read in archive order, without seeking
+            with tarfile.open(fileobj=archive_file, mode='r|*') as archive:
+                yield archive
+
+
+def parse_tar_archive(archive_path: str) -> list[AiderTestResult]:
+    """
+    Parse all tests of a (compressed) tar benchmark run in a single streaming pass, sorted by the path of their results
+    file. Only the results and token totals of tests still waiting for their other file are kept in memory.
+    """
+    pending_results: dict[str, dict] = {}
+    pending_tokens: dict[str, tuple[int, int]] = {}
+    results: dict[str, AiderTestResult] = {}
+    with _open_tar_stream(archive_path) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            test_dir, file_name = _split_member_name(member.name)
+            if file_name not in (RESULTS_FILE_NAME, CHAT_HISTORY_FILE_NAME):
+                continue
+            member_file = archive.extractfile(member)
+            if file_name == RESULTS_FILE_NAME:
+                pending_results[test_dir] = json.load(member_file)
+            else:
+                pending_tokens[test_dir] = _scan_tokens(member_file)
+            if test_dir in pending_results and test_dir in pending_tokens:
+                results[test_dir] = build_test_result(
+                    test_dir.rpartition('/')[2], pending_results.pop(test_dir), *pending_tokens.pop(test_dir)
+                )
+    # Tests without a chat history have no token counts
+    for test_dir, test_results in pending_results.items():
+        results[test_dir] = build_test_result(test_dir.rpartition('/')[2], test_results, 0, 0)
+    return [results[test_dir] for test_dir in sorted(results)]
+
+
+def parse_benchmark_archive(archive_path: str) -> list[AiderTestResult]:
+    """
+    Parse all tests of an archived benchmark run (see `TAR_SUFFIXES` and `ZIP_SUFFIXES`).
+
+    Returns:
+    list[AiderTestResult]: The test results, sorted by the path of their results file
+    """
+    with phase('read archive'):
+        if archive_path.lower().endswith(ZIP_SUFFIXES):
+            results = parse_zip_archive(archive_path)
+        else:
+            results = parse_tar_archive(archive_path)
+        add_counts(files=1, bytes_read=os.path.getsize(archive_path))
+    return results
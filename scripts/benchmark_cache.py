@@ -0,0 +1,122 @@
+"""
+Persistent, incremental cache of parsed benchmark runs.
+Parsed tests are stored in a SQLite file inside the run dir, keyed by the path, mtime and size of their results and
+chat history files. On later calls, only new or changed tests are parsed again.
+"""
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+from benchmark_parser import (
+    CHAT_HISTORY_FILE_NAME, PARSER_VERSION, AiderTestResult, find_results_files, parse_results_files
+)
+from benchmark_profile import phase
+
+CACHE_FILE_NAME = '.benchmark-parse-cache.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tests (
+    path TEXT PRIMARY KEY,
+    results_mtime_ns INTEGER NOT NULL,
+    results_size INTEGER NOT NULL,
+    history_mtime_ns INTEGER NOT NULL,
+    history_size INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+"""
+
+FileSignature = tuple[int, int, int, int]
+
+
+def get_file_signature(path: str) -> tuple[int, int]:
+    """The mtime (ns) and size of a file, or (-1, -1) if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return -1, -1
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_test_signature(results_path: str) -> FileSignature:
+    """Return the mtime and size of a test's results file and of the chat history next to it."""
+    history_path = os.path.join(os.path.dirname(results_path), CHAT_HISTORY_FILE_NAME)
+    return get_file_signature(results_path) + get_file_signature(history_path)
+
+
+def open_cache(benchmark_dir: str) -> sqlite3.Connection | None:
+    """
+    Open (or create) the parse cache of a benchmark run dir.
+
+    Returns:
+    sqlite3.Connection | None: The cache connection, or None if the cache can't be used (e.g. a read-only run dir)
+    """
+    try:
+        connection = sqlite3.connect(os.path.join(benchmark_dir, CACHE_FILE_NAME))
+        connection.executescript(_SCHEMA)
+        row = connection.execute("SELECT value FROM meta WHERE key = 'parser_version'").fetchone()
+        if row is None or row[0] != str(PARSER_VERSION):
+            with connection:
+                connection.execute("DELETE FROM tests")
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('parser_version', ?)", (str(PARSER_VERSION),)
+                )
+        return connection
+    except sqlite3.Error:
+        return None
+
+
+def parse_benchmark_run_cached(benchmark_dir: str, threads: int | None = None) -> list[AiderTestResult]:
+    """
+    Parse all tests of a benchmark run dir, reusing cached results for tests whose files haven't changed.
+
+    Args:
+    benchmark_dir (str): Path to the benchmark run dir.
+    threads (int | None): Size of the thread pool used to read the new or changed test files.
+
+    Returns:
+    list[AiderTestResult]: The test results, sorted by the path of their results file
+
+    If the cache can't be opened or written, every test is parsed and nothing is stored.
+    """
+    results_files = find_results_files(benchmark_dir)
+    with phase('cache lookup'):
+        connection = open_cache(benchmark_dir)
+    if connection is None:
+        return parse_results_files(results_files, threads)
+
+    with closing(connection):
+        with phase('cache lookup'):
+            cached: dict[str, tuple[FileSignature, str]] = {
+                path: (tuple(signature), result)
+                for path, *signature, result in connection.execute(
+                    "SELECT path, results_mtime_ns, results_size, history_mtime_ns, history_size, result FROM tests"
+                )
+            }
+            results: dict[str, AiderTestResult] = {}
+            stale: list[tuple[str, str, FileSignature]] = []
+            for results_file in results_files:
+                path = os.path.relpath(results_file, benchmark_dir)
+                signature = get_test_signature(results_file)
+                cached_entry = cached.get(path)
+                if cached_entry and cached_entry[0] == signature:
+                    results[path] = AiderTestResult(*json.loads(cached_entry[1]))
+                else:
+                    stale.append((path, results_file, signature))
+
+        parsed = parse_results_files([results_file for _, results_file, _ in stale], threads)
+        removed = cached.keys() - {os.path.relpath(f, benchmark_dir) for f in results_files}
+        try:
+            with phase('cache write'), connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?, ?)",
+                    [(path, *signature, json.dumps(result)) for (path, _, signature), result in zip(stale, parsed)]
+                )
+                connection.executemany("DELETE FROM tests WHERE path = ?", [(path,) for path in removed])
+        except sqlite3.Error:
+            pass
+
+    for (path, _, _), result in zip(stale, parsed):
+        results[path] = result
+    return [results[os.path.relpath(f, benchmark_dir)] for f in results_files]
@@ -0,0 +1,238 @@
+"""
+Struct-of-arrays representation of a parsed benchmark run.
+Each `AiderTestResult` field is held in its own `array` column indexed by test id, so totals, category splits and
+success distributions are computed by scanning contiguous columns instead of looking tests up one by one.
+"""
+import sys
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from typing import NamedTuple
+
+from benchmark_matrix import IMPROVED, ONLY_1, ONLY_2, WORSENED, classify_test_change
+from benchmark_parser import AiderTestResult
+from chat_history import AttemptRecord
+
+_STRING_FIELDS = ('name', 'model', 'edit_format')
+_ARRAY_TYPECODES = {int: 'q', float: 'd'}
+SUMMED_FIELDS = (
+    'duration', 'sent_tokens', 'received_tokens', 'cost', 'timeouts', 'error_output_count', 'user_ask_count',
+    'exhausted_context_window_count', 'malformed_responses', 'syntax_errors', 'indentation_errors', 'lazy_comments',
+)
+
+
+def normalize_attempt_counts(attempt_counts: Counter) -> tuple[int, Counter]:
+    """
+    Normalize a Counter of failed attempt counts.
+
+    Returns:
+    tuple[int, Counter]: The absolute value of the failure limit (0 if no test hit it), and the Counter
+    where tests that hit the failure limit are counted under -1
+    """
+    result = Counter(attempt_counts)
+    negative_value = next((k for k in result.keys() if k < 0), None)
+    if negative_value is None:
+        return 0, result
+    max_failed_attempts = result.pop(negative_value)
+    result[-1] = max_failed_attempts
+    return abs(negative_value), result
+
+
+class RunTotals(NamedTuple):
+    test_count: int
+    pass_count: int
+    failed_test_count: int
+    failed_attempts: int
+    max_failed_attempt: int
+    attempt_counts: Counter
+    duration: float
+    sent_tokens: int
+    received_tokens: int
+    cost: float
+    timeouts: int
+    error_output_count: int
+    user_ask_count: int
+    exhausted_context_window_count: int
+    malformed_responses: int
+    syntax_errors: int
+    indentation_errors: int
+    lazy_comments: int
+
+
+class Efficiency(NamedTuple):
+    """Spend per passing test and throughput of a run (None when undefined, e.g. no passing tests)."""
+    cost_per_pass: float | None
+    sent_tokens_per_pass: float | None
+    received_tokens_per_pass: float | None
+    passes_per_dollar: float | None
+    passes_per_hour: float | None
+    tokens_per_second: float | None
+
+
+def get_efficiency(totals: RunTotals) -> Efficiency:
+    """Derive the efficiency metrics of a run from its totals. Durations are summed test wall-clock times."""
+    pass_count = totals.pass_count
+    return Efficiency(
+        cost_per_pass=totals.cost / pass_count if pass_count else None,
+        sent_tokens_per_pass=totals.sent_tokens / pass_count if pass_count else None,
+        received_tokens_per_pass=totals.received_tokens / pass_count if pass_count else None,
+        passes_per_dollar=pass_count / totals.cost if totals.cost else None,
+        passes_per_hour=pass_count * 3600 / totals.duration if totals.duration else None,
+        tokens_per_second=(totals.sent_tokens + totals.received_tokens) / totals.duration if totals.duration else None,
+    )
+
+
+class DepthTotals(NamedTuple):
+    """Totals of the tests that stopped at the same attempt depth."""
+    test_count: int
+    cost: float
+    sent_tokens: int
+    received_tokens: int
+    duration: float
+
+
+class AttemptTotals(NamedTuple):
+    """Totals of the n-th attempt of every test that got that far. Duration and cost are estimates."""
+    test_count: int
+    request_count: int
+    sent_tokens: int
+    received_tokens: int
+    estimated_duration: float
+    estimated_cost: float
+    error_categories: Counter
+
+
+def totals_by_attempt(attempts_by_test: Mapping[str, list[AttemptRecord]]) -> dict[int, AttemptTotals]:
+    """
+    Sum the per-attempt breakdown of all tests by attempt number (1 being the initial attempt).
+    Attempts that passed aren't counted in `error_categories`.
+    """
+    sums: dict[int, list] = {}
+    for attempts in attempts_by_test.values():
+        for attempt in attempts:
+            attempt_sums = sums.setdefault(attempt.attempt, [0, 0, 0, 0, 0.0, 0.0, Counter()])
+            attempt_sums[0] += 1
+            attempt_sums[1] += attempt.request_count
+            attempt_sums[2] += attempt.sent_tokens
+            attempt_sums[3] += attempt.received_tokens
+            attempt_sums[4] += attempt.estimated_duration
+            attempt_sums[5] += attempt.estimated_cost
+            if attempt.error_category is not None:
+                attempt_sums[6][attempt.error_category] += 1
+    return {number: AttemptTotals(*attempt_sums) for number, attempt_sums in sorted(sums.items())}
+
+
+class TestChanges(NamedTuple):
+    """Test names per change category and sub-category, each list sorted by test name."""
+    only_1_passed: list[str]
+    only_1_failed: list[str]
+    only_2_passed: list[str]
+    only_2_failed: list[str]
+    improved_now_passes: list[str]
+    improved_minor: list[str]
+    worsened_now_fails: list[str]
+    worsened_minor: list[str]
+    stable_passed: list[str]
+    stable_failed: list[str]
+
+
+class BenchmarkColumns(Mapping[str, AiderTestResult]):
+    """
+    A benchmark run stored as one column per `AiderTestResult` field.
+    It still behaves as a read-only `dict[str, AiderTestResult]`; rows are rebuilt on access.
+    """
+
+    def __init__(self, results: Iterable[AiderTestResult]):
+        self.columns: dict[str, list[str] | array] = {
+            field: [] if field in _STRING_FIELDS else array(_ARRAY_TYPECODES[field_type])
+            for field, field_type in AiderTestResult.__annotations__.items()
+        }
+        for result in results:
+            for field, value in zip(AiderTestResult._fields, result):
+                self.columns[field].append(sys.intern(value) if field in _STRING_FIELDS else value)
+        self.index: dict[str, int] = {name: i for i, name in enumerate(self.columns['name'])}
+
+    def __getitem__(self, test_name: str) -> AiderTestResult:
+        i = self.index[test_name]
+        return AiderTestResult(*(self.columns[field][i] for field in AiderTestResult._fields))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, test_name: object) -> bool:
+        return test_name in self.index
+
+    def failed_attempt_count(self, test_name: str) -> int:
+        return self.columns['failed_attempt_count'][self.index[test_name]]
+
+    def totals(self) -> RunTotals:
+        """Compute all run totals and the success distribution, scanning each column once."""
+        attempt_counts = Counter(self.columns['failed_attempt_count'])
+        failed_test_count = sum(count for failed_attempts, count in attempt_counts.items() if failed_attempts < 0)
+        max_failed_attempt, normalized_attempt_counts = normalize_attempt_counts(attempt_counts)
+        return RunTotals(
+            test_count=len(self),
+            pass_count=len(self) - failed_test_count,
+            failed_test_count=failed_test_count,
+            failed_attempts=sum(abs(failed_attempts) * count for failed_attempts, count in attempt_counts.items()),
+            max_failed_attempt=max_failed_attempt,
+            attempt_counts=normalized_attempt_counts,
+            **{field: sum(self.columns[field]) for field in SUMMED_FIELDS},
+        )
+
+    def totals_by_attempt_depth(self) -> dict[int, DepthTotals]:
+        """
+        Cost, tokens and duration of the tests grouped by failed attempt count.
+        Tests that never passed are grouped under -1, as in `normalize_attempt_counts`.
+        """
+        sums: dict[int, list] = {}
+        columns = self.columns
+        for failed_attempts, cost, sent_tokens, received_tokens, duration in zip(
+                columns['failed_attempt_count'], columns['cost'], columns['sent_tokens'],
+                columns['received_tokens'], columns['duration']
+        ):
+            depth_sums = sums.setdefault(max(failed_attempts, -1), [0, 0.0, 0, 0, 0.0])
+            depth_sums[0] += 1
+            depth_sums[1] += cost
+            depth_sums[2] += sent_tokens
+            depth_sums[3] += received_tokens
+            depth_sums[4] += duration
+        return {depth: DepthTotals(*depth_sums) for depth, depth_sums in sorted(sums.items())}
+
+
+def get_test_change(failed_attempts_1: int | None, failed_attempts_2: int | None) -> str:
+    """
+    Categorize how a test changed between two runs, split by outcome.
+
+    Returns:
+    str: The name of the `TestChanges` field the test belongs to
+    """
+    category = classify_test_change(failed_attempts_1, failed_attempts_2)
+    if category == ONLY_1:
+        return 'only_1_passed' if failed_attempts_1 >= 0 else 'only_1_failed'
+    if category == ONLY_2:
+        return 'only_2_passed' if failed_attempts_2 >= 0 else 'only_2_failed'
+    if category == IMPROVED:
+        return 'improved_now_passes' if failed_attempts_1 < 0 else 'improved_minor'
+    if category == WORSENED:
+        return 'worsened_now_fails' if failed_attempts_2 < 0 else 'worsened_minor'
+    return 'stable_passed' if failed_attempts_1 >= 0 else 'stable_failed'
+
+
+def split_test_changes(run_1: BenchmarkColumns, run_2: BenchmarkColumns) -> TestChanges:
+    """
+    Categorize all tests of two runs and split each category by outcome, in a single pass over the test names.
+    """
+    changes = TestChanges(*([] for _ in TestChanges._fields))
+    failed_attempts_1 = run_1.columns['failed_attempt_count']
+    failed_attempts_2 = run_2.columns['failed_attempt_count']
+    for test_name in sorted(run_1.index.keys() | run_2.index.keys()):
+        i_1 = run_1.index.get(test_name)
+        i_2 = run_2.index.get(test_name)
+        count_1 = None if i_1 is None else failed_attempts_1[i_1]
+        count_2 = None if i_2 is None else failed_attempts_2[i_2]
+        getattr(changes, get_test_change(count_1, count_2)).append(test_name)
+    return changes
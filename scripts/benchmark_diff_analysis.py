@@ -2,16 +2,35 @@
 """
 This script compares two benchmark run dir and analyzes the changes in test performance.
 It categorizes tests as improved, worsened, stable, or present in only one of the benchmark runs.
+Given more than two run dirs, it prints a test-by-run matrix with pairwise and best-of summaries instead.
 """
 from dataclasses import dataclass
+import cProfile
+import heapq
+import math
 import os
 import subprocess
 from collections import Counter
-from functools import total_ordering
-from typing import NamedTuple, Union
 
 from datetime import timedelta
 
+from benchmark_archive import is_benchmark_archive, parse_benchmark_archive
+from benchmark_cache import parse_benchmark_run_cached
+from benchmark_columns import (
+    BenchmarkColumns, get_efficiency, normalize_attempt_counts, split_test_changes, totals_by_attempt
+)
+from benchmark_matrix import IMPROVED, ONLY_1, ONLY_2, STABLE, WORSENED, BenchmarkMatrix, classify_test_change
+from benchmark_parser import AiderTestResult, parse_benchmark_attempts, parse_benchmark_run
+from benchmark_profile import phase, start_profiling, stop_profiling
+from benchmark_report import OUTPUT_FORMATS, BenchmarkComparison, write_comparison
+from benchmark_stats import (
+    PAIRED_METRICS, Distribution, bootstrap_paired_deltas, get_distribution, get_histogram, get_paired_samples
+)
+from benchmark_watch import watch_benchmark_run
+
+SPEEDSCOPE_SUFFIX = '.speedscope.json'
+
+
 def _get_visual_indicator(percent_change: float | None) -> str:
     """Generate a visual indicator string based on percentage change."""
     if percent_change is None:
@@ -47,6 +66,13 @@ def _get_token_change_indicators(test_1: 'AiderTestResult', test_2: 'AiderTestRe
     return recv_col, sent_col  # received tokens first, then sent tokens
 
 
+def _get_histogram_bar(count: int, max_count: int, width: int = 40) -> str:
+    """Generate a bar of '#' characters for a histogram bin, scaled so that `max_count` fills `width` chars."""
+    if not count:
+        return ""
+    return "#" * max(1, round(count * width / max_count))
+
+
 @dataclass
 class StatusPrinter:
     test_count: int
@@ -59,31 +85,66 @@ class StatusPrinter:
         print(f"{indent}{prefix}: {count:3d} ({current_percent:3.0f}%){_get_visual_indicator(current_percent)}")
 
 
-def main(benchmark_dir_1: str, benchmark_dir_2: str):
+def main(
+        benchmark_dir_1: str, benchmark_dir_2: str,
+        use_shell: bool = False, threads: int | None = None, use_cache: bool = True, output_format: str = 'text',
+        stats: bool = False, resamples: int = 10_000, confidence: float = 0.95, seed: int | None = None,
+        top: int = 5, attempts: bool = False
+):
     """
     Main function to compare two benchmark runs and print the analysis.
 
     Args:
     benchmark_dir_1 (str): Path to the first benchmark run.
     benchmark_dir_2 (str): Path to the second benchmark run.
+    use_shell (bool): If True, parse the runs with `benchmark-test-info.sh` instead of in-process.
+    threads (int | None): Size of the thread pool used to read the test files.
+    use_cache (bool): If True, reuse parsed tests cached in each run dir when their files haven't changed.
+    output_format (str): `text` for the human-readable report, or `json`, `csv` or `ndjson` (see `write_comparison`).
+    stats (bool): If True, also print bootstrap confidence intervals for the paired metric deltas.
+    resamples (int): Number of bootstrap resamples used by `stats`.
+    confidence (float): Confidence level of the intervals printed by `stats`.
+    seed (int | None): Seed for reproducible bootstrap resampling.
+    top (int): Number of slowest and most token-hungry tests to list.
+    attempts (bool): If True, also print the per-attempt breakdown (tokens, time and error types per retry).
 
     This function parses both benchmark runs, compares them, and prints a detailed analysis
     of how tests have changed between the two runs. It categorizes tests as improved,
     worsened, stable, or present in only one run, and provides a summary count for each category and sub-category.
     """
+    if output_format != 'text':
+        with phase('parse run 1'):
+            benchmark_run_1 = BenchmarkColumns(parse_benchmark_dir(benchmark_dir_1, use_shell, threads, use_cache))
+        with phase('parse run 2'):
+            benchmark_run_2 = BenchmarkColumns(parse_benchmark_dir(benchmark_dir_2, use_shell, threads, use_cache))
+        with phase('write comparison'):
+            write_comparison(
+                benchmark_run_1, benchmark_run_2, benchmark_dir_1.split('/')[-1], benchmark_dir_2.split('/')[-1],
+                output_format
+            )
+        return
     print(f"--- {benchmark_dir_1.split('/')[-1]}")
     print(f"+++ {benchmark_dir_2.split('/')[-1]}")
     print("# ============= Failed Attempts per Test =============")
     print("# N >= 0: It eventually passed after N failed attempts")
     print("# N < 0 : All attempts failed and the limit was reached")
-    benchmark_run_1 = {t.name: t for t in parse_benchmark_dir(benchmark_dir_1)}
-    benchmark_run_2 = {t.name: t for t in parse_benchmark_dir(benchmark_dir_2)}
-
-    (
-        test_names_only_1, test_names_only_2, test_names_improved, test_names_worsened, test_names_stable
-    ) = compare_benchmark_runs(benchmark_run_1, benchmark_run_2)
+    with phase('parse run 1'):
+        benchmark_run_1 = BenchmarkColumns(parse_benchmark_dir(benchmark_dir_1, use_shell, threads, use_cache))
+    with phase('parse run 2'):
+        benchmark_run_2 = BenchmarkColumns(parse_benchmark_dir(benchmark_dir_2, use_shell, threads, use_cache))
+
+    with phase('compare'):
+        (
+            test_names_only_1_passed, test_names_only_1_failed, test_names_only_2_passed, test_names_only_2_failed,
+            test_names_improved_now_passes, test_names_improved_minor, test_names_worsened_now_fails,
+            test_names_worsened_minor, test_names_stable_passed, test_names_stable_failed
+        ) = split_test_changes(benchmark_run_1, benchmark_run_2)
+    test_names_only_1 = test_names_only_1_passed + test_names_only_1_failed
+    test_names_only_2 = test_names_only_2_passed + test_names_only_2_failed
+    test_names_improved = test_names_improved_now_passes + test_names_improved_minor
+    test_names_worsened = test_names_worsened_now_fails + test_names_worsened_minor
+    test_names_stable = test_names_stable_passed + test_names_stable_failed
 
-    test_names_only_1_passed = [t for t in test_names_only_1 if benchmark_run_1[t].failed_attempt_count >= 0]
     if test_names_only_1_passed:
         print()
         print(f"@@ REMOVED ({len(test_names_only_1_passed)} PASSED) @@")
@@ -91,7 +152,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             failed_attempt_count = benchmark_run_1[test_name].failed_attempt_count
             print(f"<{'-' if failed_attempt_count < 0 else '+'}{test_name}: {failed_attempt_count}")
 
-    test_names_only_1_failed = [t for t in test_names_only_1 if benchmark_run_1[t].failed_attempt_count < 0]
     if test_names_only_1_failed:
         print()
         print(f"@@ REMOVED ({len(test_names_only_1_failed)} FAILED) @@")
@@ -99,7 +159,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             failed_attempt_count = benchmark_run_1[test_name].failed_attempt_count
             print(f"<{'-' if failed_attempt_count < 0 else '+'}{test_name}: {failed_attempt_count}")
 
-    test_names_only_2_passed = [t for t in test_names_only_2 if benchmark_run_2[t].failed_attempt_count >= 0]
     if test_names_only_2_passed:
         print()
         print(f"@@ NEW ({len(test_names_only_2_passed)} PASSED) @@")
@@ -107,7 +166,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             failed_attempt_count = benchmark_run_2[test_name].failed_attempt_count
             print(f">{'-' if failed_attempt_count < 0 else '+'}{test_name}: {failed_attempt_count}")
 
-    test_names_only_2_failed = [t for t in test_names_only_2 if benchmark_run_2[t].failed_attempt_count < 0]
     if test_names_only_2_failed:
         print()
         print(f"@@ NEW ({len(test_names_only_2_failed)} FAILED) @@")
@@ -115,7 +173,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             failed_attempt_count = benchmark_run_2[test_name].failed_attempt_count
             print(f">{'-' if failed_attempt_count < 0 else '+'}{test_name}: {failed_attempt_count}")
 
-    test_names_improved_now_passes = [t for t in test_names_improved if benchmark_run_1[t].failed_attempt_count < 0]
     if test_names_improved_now_passes:
         print()
         print(f"@@ Improved, now PASSED ({len(test_names_improved_now_passes)}) @@")
@@ -123,7 +180,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             sent_ind, recv_ind = _get_token_change_indicators(benchmark_run_1[test_name], benchmark_run_2[test_name])
             print(f"++ [{benchmark_run_1[test_name].failed_attempt_count} -> {benchmark_run_2[test_name].failed_attempt_count}] {sent_ind} {recv_ind} {test_name}")
 
-    test_names_improved_minor = [t for t in test_names_improved if benchmark_run_1[t].failed_attempt_count >= 0]
     if test_names_improved_minor:
         print()
         print(f"@@ Improved, minor ({len(test_names_improved_minor)}) @@")
@@ -131,7 +187,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             sent_ind, recv_ind = _get_token_change_indicators(benchmark_run_1[test_name], benchmark_run_2[test_name])
             print(f"+ [{benchmark_run_1[test_name].failed_attempt_count} -> {benchmark_run_2[test_name].failed_attempt_count}] {sent_ind} {recv_ind} {test_name}")
 
-    test_names_worsened_now_fails = [t for t in test_names_worsened if benchmark_run_2[t].failed_attempt_count < 0]
     if test_names_worsened_now_fails:
         print()
         print(f"@@ Worsened, now FAILED ({len(test_names_worsened_now_fails)}) @@")
@@ -139,7 +194,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             sent_ind, recv_ind = _get_token_change_indicators(benchmark_run_1[test_name], benchmark_run_2[test_name])
             print(f"-- [{benchmark_run_1[test_name].failed_attempt_count} -> {benchmark_run_2[test_name].failed_attempt_count}] {sent_ind} {recv_ind} {test_name}")
 
-    test_names_worsened_minor = [t for t in test_names_worsened if benchmark_run_2[t].failed_attempt_count >= 0]
     if test_names_worsened_minor:
         print()
         print(f"@@ Worsened, still PASSED ({len(test_names_worsened_minor)}) @@")
@@ -147,7 +201,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             sent_ind, recv_ind = _get_token_change_indicators(benchmark_run_1[test_name], benchmark_run_2[test_name])
             print(f"- [{benchmark_run_1[test_name].failed_attempt_count} -> {benchmark_run_2[test_name].failed_attempt_count}] {sent_ind} {recv_ind} {test_name}")
 
-    test_names_stable_passed = [t for t in test_names_stable if benchmark_run_1[t].failed_attempt_count >= 0]
     if test_names_stable_passed:
         print()
         print(f"@@ Stable: PASSED ({len(test_names_stable_passed)}) @@")
@@ -156,7 +209,6 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
             sent_ind, recv_ind = _get_token_change_indicators(benchmark_run_1[test_name], benchmark_run_2[test_name])
             print(f"=+ [{benchmark_run_1[test_name].failed_attempt_count} -> {failed_attempts_2}] {sent_ind} {recv_ind} {test_name}")
 
-    test_names_stable_failed = [t for t in test_names_stable if benchmark_run_1[t].failed_attempt_count < 0]
     if test_names_stable_failed:
         print()
         print(f"@@ Stable: FAILED ({len(test_names_stable_failed)}) @@")
@@ -203,33 +255,10 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
 
     test_count_delta = len(benchmark_run_2) - len(benchmark_run_1)
     # Calculate totals for each run
-    sent_tokens_1 = sum(t.sent_tokens for t in benchmark_run_1.values())
-    received_tokens_1 = sum(t.received_tokens for t in benchmark_run_1.values())
-    duration_1 = sum(t.duration for t in benchmark_run_1.values())
-    sent_tokens_2 = sum(t.sent_tokens for t in benchmark_run_2.values())
-    received_tokens_2 = sum(t.received_tokens for t in benchmark_run_2.values())
-    cost_1 = sum(t.cost for t in benchmark_run_1.values())
-    cost_2 = sum(t.cost for t in benchmark_run_2.values())
-    timeouts_1 = sum(t.timeouts for t in benchmark_run_1.values())
-    timeouts_2 = sum(t.timeouts for t in benchmark_run_2.values())
-    error_outputs_1 = sum(t.error_output_count for t in benchmark_run_1.values())
-    error_outputs_2 = sum(t.error_output_count for t in benchmark_run_2.values())
-    user_asks_1 = sum(t.user_ask_count for t in benchmark_run_1.values())
-    user_asks_2 = sum(t.user_ask_count for t in benchmark_run_2.values())
-    context_exhausts_1 = sum(t.exhausted_context_window_count for t in benchmark_run_1.values())
-    context_exhausts_2 = sum(t.exhausted_context_window_count for t in benchmark_run_2.values())
-    malformed_1 = sum(t.malformed_responses for t in benchmark_run_1.values())
-    malformed_2 = sum(t.malformed_responses for t in benchmark_run_2.values())
-    syntax_errors_1 = sum(t.syntax_errors for t in benchmark_run_1.values())
-    syntax_errors_2 = sum(t.syntax_errors for t in benchmark_run_2.values())
-    indent_errors_1 = sum(t.indentation_errors for t in benchmark_run_1.values())
-    indent_errors_2 = sum(t.indentation_errors for t in benchmark_run_2.values())
-    lazy_comments_1 = sum(t.lazy_comments for t in benchmark_run_1.values())
-    lazy_comments_2 = sum(t.lazy_comments for t in benchmark_run_2.values())
-    duration_2 = sum(t.duration for t in benchmark_run_2.values())
-
-    max_failed_attempt_1, attempt_counts_1 = _get_attempt_limit_and_normalized_counts(benchmark_run_1)
-    max_failed_attempt_2, attempt_counts_2 = _get_attempt_limit_and_normalized_counts(benchmark_run_2)
+    totals_1 = benchmark_run_1.totals()
+    totals_2 = benchmark_run_2.totals()
+    max_failed_attempt_1, attempt_counts_1 = totals_1.max_failed_attempt, totals_1.attempt_counts
+    max_failed_attempt_2, attempt_counts_2 = totals_2.max_failed_attempt, totals_2.attempt_counts
 
     print()
     print("@@ ============ Success Distribution =========== @@")
@@ -260,18 +289,196 @@ def main(benchmark_dir_1: str, benchmark_dir_2: str):
     print(f"# EDIT FORMAT      : {edit_format_2:>10} {'(was ' + edit_format_1 + ')' if edit_format_1 != edit_format_2 else ''}")
     print(f"# TOTAL TEST COUNT : {len(benchmark_run_2):10d} {f'({test_count_delta:+10d}, {test_count_delta*100/len(benchmark_run_1):+4.0f}%){_get_visual_indicator(test_count_delta*100/len(benchmark_run_1) if test_count_delta else None)}' if test_count_delta else ''}")
     print(f"# Max attempt count: {max_failed_attempt_2:10d}{f" ({max_failed_attempt_2 - max_failed_attempt_1:+d})" if max_failed_attempt_2 != max_failed_attempt_1 else ""}")
-    print(f"# DURATION hh:mm:ss:    {str(timedelta(seconds=int(duration_2)))} ({'-' if duration_2 < duration_1 else '+'}  {str(timedelta(seconds=int(abs(duration_2 - duration_1))))}, {(duration_2 - duration_1)*100/duration_1:+4.0f}%){_get_visual_indicator((duration_2 - duration_1)*100/duration_1)}")
-    print(f"# COST ($)         : {cost_2:10,.2f} {f'({cost_2 - cost_1:+10,.2f}, {(cost_2 - cost_1)*100/cost_1:+4.0f}%){_get_visual_indicator((cost_2 - cost_1)*100/cost_1)}' if cost_1 else 'N/A'}")
-    print(f"# TOKENS SENT      : {sent_tokens_2:10,} ({sent_tokens_2 - sent_tokens_1:+10,}, {(sent_tokens_2 - sent_tokens_1)*100/sent_tokens_1:+4.0f}%){_get_visual_indicator((sent_tokens_2 - sent_tokens_1)*100/sent_tokens_1)}")
-    print(f"# TOKENS RECEIVED  : {received_tokens_2:10,} ({received_tokens_2 - received_tokens_1:+10,}, {(received_tokens_2 - received_tokens_1)*100/received_tokens_1:+4.0f}%){_get_visual_indicator((received_tokens_2 - received_tokens_1)*100/received_tokens_1)}")
-    print_metric_diff("TIMEOUTS         ", timeouts_1, timeouts_2)
-    print_metric_diff("ERROR OUTPUTS    ", error_outputs_1, error_outputs_2)
-    print_metric_diff("USER ASKS        ", user_asks_1, user_asks_2)
-    print_metric_diff("CONTEXT EXHAUSTS ", context_exhausts_1, context_exhausts_2)
-    print_metric_diff("MALFORMED        ", malformed_1, malformed_2)
-    print_metric_diff("SYNTAX ERRORS    ", syntax_errors_1, syntax_errors_2)
-    print_metric_diff("INDENT ERRORS    ", indent_errors_1, indent_errors_2)
-    print_metric_diff("LAZY COMMENTS    ", lazy_comments_1, lazy_comments_2)
+    print(f"# DURATION hh:mm:ss:    {str(timedelta(seconds=int(totals_2.duration)))} ({'-' if totals_2.duration < totals_1.duration else '+'}  {str(timedelta(seconds=int(abs(totals_2.duration - totals_1.duration))))}, {(totals_2.duration - totals_1.duration)*100/totals_1.duration:+4.0f}%){_get_visual_indicator((totals_2.duration - totals_1.duration)*100/totals_1.duration)}")
+    print(f"# COST ($)         : {totals_2.cost:10,.2f} {f'({totals_2.cost - totals_1.cost:+10,.2f}, {(totals_2.cost - totals_1.cost)*100/totals_1.cost:+4.0f}%){_get_visual_indicator((totals_2.cost - totals_1.cost)*100/totals_1.cost)}' if totals_1.cost else 'N/A'}")
+    print(f"# TOKENS SENT      : {totals_2.sent_tokens:10,} ({totals_2.sent_tokens - totals_1.sent_tokens:+10,}, {(totals_2.sent_tokens - totals_1.sent_tokens)*100/totals_1.sent_tokens:+4.0f}%){_get_visual_indicator((totals_2.sent_tokens - totals_1.sent_tokens)*100/totals_1.sent_tokens)}")
+    print(f"# TOKENS RECEIVED  : {totals_2.received_tokens:10,} ({totals_2.received_tokens - totals_1.received_tokens:+10,}, {(totals_2.received_tokens - totals_1.received_tokens)*100/totals_1.received_tokens:+4.0f}%){_get_visual_indicator((totals_2.received_tokens - totals_1.received_tokens)*100/totals_1.received_tokens)}")
+    print_metric_diff("TIMEOUTS         ", totals_1.timeouts, totals_2.timeouts)
+    print_metric_diff("ERROR OUTPUTS    ", totals_1.error_output_count, totals_2.error_output_count)
+    print_metric_diff("USER ASKS        ", totals_1.user_ask_count, totals_2.user_ask_count)
+    print_metric_diff("CONTEXT EXHAUSTS ", totals_1.exhausted_context_window_count, totals_2.exhausted_context_window_count)
+    print_metric_diff("MALFORMED        ", totals_1.malformed_responses, totals_2.malformed_responses)
+    print_metric_diff("SYNTAX ERRORS    ", totals_1.syntax_errors, totals_2.syntax_errors)
+    print_metric_diff("INDENT ERRORS    ", totals_1.indentation_errors, totals_2.indentation_errors)
+    print_metric_diff("LAZY COMMENTS    ", totals_1.lazy_comments, totals_2.lazy_comments)
+
+    print()
+    print("@@ ============ EFFICIENCY ============ @@")
+    efficiency_1, efficiency_2 = get_efficiency(totals_1), get_efficiency(totals_2)
+    for metric_name, field, value_format in (
+            ("COST / PASS ($)  ", 'cost_per_pass', ',.4f'),
+            ("SENT / PASS      ", 'sent_tokens_per_pass', ',.0f'),
+            ("RECEIVED / PASS  ", 'received_tokens_per_pass', ',.0f'),
+            ("PASSES / $       ", 'passes_per_dollar', ',.2f'),
+            ("PASSES / HOUR    ", 'passes_per_hour', ',.2f'),
+            ("TOKENS / SECOND  ", 'tokens_per_second', ',.1f'),
+    ):
+        print_ratio_diff(metric_name, getattr(efficiency_1, field), getattr(efficiency_2, field), value_format)
+
+    depth_totals_1 = benchmark_run_1.totals_by_attempt_depth()
+    depth_totals_2 = benchmark_run_2.totals_by_attempt_depth()
+    print("# ---- Average per test, by attempt depth (delta vs 1st run) ----")
+    for depth, depth_totals in depth_totals_2.items():
+        test_count = depth_totals.test_count
+        previous = depth_totals_1.get(depth)
+        averages = []
+        for label, field, value_format in (
+                ('$', 'cost', ',.4f'), ('sent', 'sent_tokens', ',.0f'),
+                ('recv', 'received_tokens', ',.0f'), ('s', 'duration', ',.1f')
+        ):
+            average = getattr(depth_totals, field) / test_count
+            change = ""
+            if previous and getattr(previous, field):
+                previous_average = getattr(previous, field) / previous.test_count
+                change = f" ({(average - previous_average) * 100 / previous_average:+4.0f}%)"
+            averages.append(f"{label} {average:{value_format}}{change}")
+        prefix = "FAIL    " if depth < 0 else f"Pass {depth + 1:3d}"
+        print(f"#     {prefix}: {test_count:4d} tests | {' | '.join(averages)}")
+
+    print()
+    print("@@ ============ PER-TEST DISTRIBUTIONS ========= @@")
+    for metric_name, field in (
+            ("DURATION (s)", 'duration'), ("TOKENS SENT", 'sent_tokens'), ("TOKENS RECEIVED", 'received_tokens')
+    ):
+        print_distribution(metric_name, benchmark_run_1.columns[field], benchmark_run_2.columns[field])
+    if top > 0:
+        print()
+        print(f"@@ ============ TOP {top} TESTS ============ @@")
+        print_top_tests("SLOWEST (s)", benchmark_run_1, benchmark_run_2, lambda t: t.duration, top)
+        print_top_tests(
+            "MOST TOKENS (sent + received)", benchmark_run_1, benchmark_run_2,
+            lambda t: t.sent_tokens + t.received_tokens, top, value_format=','
+        )
+
+    if attempts:
+        print()
+        print("@@ ============ RETRY SPEND (by attempt) ============ @@")
+        with phase('parse attempts'):
+            attempts_1 = parse_benchmark_attempts(benchmark_dir_1, threads)
+            attempts_2 = parse_benchmark_attempts(benchmark_dir_2, threads)
+        print_attempt_breakdown(attempts_1, attempts_2)
+
+    if stats:
+        paired_test_names = test_names_improved + test_names_worsened + test_names_stable
+        with phase('bootstrap'):
+            intervals = bootstrap_paired_deltas(
+                *get_paired_samples(benchmark_run_1, benchmark_run_2, paired_test_names),
+                resamples=resamples, confidence=confidence, seed=seed
+            )
+        print()
+        print(f"@@ ====== CONFIDENCE INTERVALS ({confidence:.0%}, {resamples:,} resamples of {len(paired_test_names)} paired tests) ====== @@")
+        for (metric, label), interval in zip(PAIRED_METRICS, intervals):
+            unit = 'pp' if metric == 'pass_rate' else '% '
+            print(f"# {label}: {interval.observed:+8.1f}{unit} [{interval.low:+8.1f}{unit}, {interval.high:+8.1f}{unit}]{' *' if interval.significant else ''}")
+        print("# pp: percentage points; *: the interval excludes 0")
+
+
+def compare_benchmark_dirs(
+        benchmark_dir_1: str, benchmark_dir_2: str,
+        use_shell: bool = False, threads: int | None = None, use_cache: bool = True
+) -> BenchmarkComparison:
+    """
+    Compare two benchmark runs and return the structured result instead of printing it.
+
+    Args:
+    benchmark_dir_1 (str): Path to the first benchmark run.
+    benchmark_dir_2 (str): Path to the second benchmark run.
+    use_shell (bool): If True, parse the runs with `benchmark-test-info.sh` instead of in-process.
+    threads (int | None): Size of the thread pool used to read the test files.
+    use_cache (bool): If True, reuse parsed tests cached in each run dir when their files haven't changed.
+
+    Returns:
+    BenchmarkComparison: Test names per category, per-test deltas and aggregate metrics of both runs
+    """
+    return BenchmarkComparison.from_runs(
+        BenchmarkColumns(parse_benchmark_dir(benchmark_dir_1, use_shell, threads, use_cache)),
+        BenchmarkColumns(parse_benchmark_dir(benchmark_dir_2, use_shell, threads, use_cache)),
+        benchmark_dir_1.split('/')[-1], benchmark_dir_2.split('/')[-1],
+    )
+
+
+def main_matrix(
+        benchmark_dirs: list[str], use_shell: bool = False, threads: int | None = None, use_cache: bool = True
+):
+    """
+    Compare any number of benchmark runs and print a test-by-run matrix, with pairwise and best-of summaries.
+
+    Args:
+    benchmark_dirs (list[str]): Paths to the benchmark runs, in the order they should be compared.
+    use_shell (bool): If True, parse the runs with `benchmark-test-info.sh` instead of in-process.
+    threads (int | None): Size of the thread pool used to read the test files.
+    use_cache (bool): If True, reuse parsed tests cached in each run dir when their files haven't changed.
+
+    Each run is parsed only once; every summary is computed from the shared `BenchmarkMatrix`.
+    """
+    run_names = [benchmark_dir.rstrip('/').split('/')[-1] for benchmark_dir in benchmark_dirs]
+    matrix = BenchmarkMatrix.from_runs(
+        run_names, [parse_benchmark_dir(d, use_shell, threads, use_cache) for d in benchmark_dirs]
+    )
+    run_labels = [f"[{i + 1}]" for i in range(matrix.run_count)]
+    for run_label, run_name in zip(run_labels, run_names):
+        print(f"# {run_label:>5} {run_name}")
+
+    print("# ============= Failed Attempts per Test =============")
+    print("# N >= 0: It eventually passed after N failed attempts")
+    print("# N < 0 : All attempts failed and the limit was reached")
+    print("# *     : Best run for the test (fewest failed attempts, then fewest sent tokens)")
+    print()
+    print(f"{' '.join(f'{run_label:>5}' for run_label in run_labels)} test")
+    for row, test_name in enumerate(matrix.test_names):
+        best_runs = matrix.best_runs(row)
+        cells = [
+            f"{'*' if run_index in best_runs else ' '}{count:4d}" if count is not None else f"{'':>4}-"
+            for run_index, count in enumerate(matrix.cells['failed_attempt_count'][row])
+        ]
+        print(f"{' '.join(cells)} {test_name}")
+
+    summaries = [matrix.summarize_run(run_index) for run_index in range(matrix.run_count)]
+    print()
+    print("@@ ============ RUN SUMMARIES ============ @@")
+    print(f"# {'run':>5} {'tests':>6} {'pass':>6} {'pass%':>6} {'sent':>12} {'received':>10} {'cost ($)':>9} {'hh:mm:ss':>9}")
+    for run_label, summary in zip(run_labels, summaries):
+        print(
+            f"# {run_label:>5} {summary.test_count:6d} {summary.pass_count:6d} {summary.pass_rate:5.1f}%"
+            f" {summary.sent_tokens:12,} {summary.received_tokens:10,} {summary.cost:9,.2f}"
+            f" {str(timedelta(seconds=int(summary.duration))):>9}"
+        )
+
+    print()
+    print("@@ ============ PAIRWISE CHANGES ============ @@")
+    for run_index_1 in range(matrix.run_count):
+        for run_index_2 in range(run_index_1 + 1, matrix.run_count):
+            changes = matrix.compare_runs(run_index_1, run_index_2)
+            print(
+                f"# {run_labels[run_index_1]:>5} -> {run_labels[run_index_2]:<5}:"
+                f" +{changes[IMPROVED]:<3d} (now PASS {changes['now_pass']:3d})"
+                f" -{changes[WORSENED]:<3d} (now FAIL {changes['now_fail']:3d})"
+                f" ={changes[STABLE]:<3d} <{changes[ONLY_1]:<3d} >{changes[ONLY_2]:<3d}"
+                f" ∂nowPASS-FAIL: {changes['now_pass'] - changes['now_fail']:+d}"
+            )
+
+    best_run_counts = Counter()
+    sole_best_run_counts = Counter()
+    passed_in_any_run = 0
+    for row in range(len(matrix.test_names)):
+        best_runs = matrix.best_runs(row)
+        if best_runs:
+            passed_in_any_run += 1
+        best_run_counts.update(best_runs)
+        if len(best_runs) == 1:
+            sole_best_run_counts[best_runs[0]] += 1
+
+    print()
+    print("@@ ============ BEST OF ============ @@")
+    test_count = len(matrix.test_names)
+    print(f"# PASSED IN ANY RUN: {passed_in_any_run:6d} / {test_count} ({passed_in_any_run * 100 / test_count if test_count else 0:3.0f}%)")
+    for run_index, run_label in enumerate(run_labels):
+        print(f"# {run_label:>5} BEST FOR  : {best_run_counts[run_index]:6d} tests ({sole_best_run_counts[run_index]} uniquely)")
+    print(f"# HIGHEST PASS RATE: {run_labels[max(range(matrix.run_count), key=lambda i: summaries[i].pass_rate)]}")
+    print(f"# LOWEST COST      : {run_labels[min(range(matrix.run_count), key=lambda i: summaries[i].cost)]}")
+    print(f"# FEWEST SENT      : {run_labels[min(range(matrix.run_count), key=lambda i: summaries[i].sent_tokens)]}")
+    print(f"# FEWEST RECEIVED  : {run_labels[min(range(matrix.run_count), key=lambda i: summaries[i].received_tokens)]}")
+    print(f"# SHORTEST DURATION: {run_labels[min(range(matrix.run_count), key=lambda i: summaries[i].duration)]}")
 
 
 def print_metric_diff(metric_name, value_run_1, value_run_2):
@@ -279,50 +486,116 @@ def print_metric_diff(metric_name, value_run_1, value_run_2):
         f"# {metric_name}: {value_run_2:10d} {f"({value_run_2 - value_run_1:+10d}, {(value_run_2 - value_run_1) * 100 / value_run_1:+4.0f}%){_get_visual_indicator((value_run_2 - value_run_1) * 100 / value_run_1 if value_run_1 else None)}" if value_run_1 else 'N/A'}")
 
 
-@total_ordering
-class AiderTestResult(NamedTuple):
-    failed_attempt_count: int
-    name: str
-    duration: float
-    sent_tokens: int
-    received_tokens: int
-    model: str
-    edit_format: str
-    cost: float
-    timeouts: int
-    error_output_count: int
-    user_ask_count: int
-    exhausted_context_window_count: int
-    malformed_responses: int
-    syntax_errors: int
-    indentation_errors: int
-    lazy_comments: int
-
-    def __eq__(self, other: Union['AiderTestResult', int]) -> bool:
-        if isinstance(other, int):
-            return self.failed_attempt_count == other
-        if isinstance(other, AiderTestResult):
-            return self.failed_attempt_count == other.failed_attempt_count
-        return NotImplemented
-
-    def __lt__(self, other: Union['AiderTestResult', int]) -> bool:
-        if isinstance(other, int):
-            return self.failed_attempt_count < other
-        if isinstance(other, AiderTestResult):
-            return self.failed_attempt_count < other.failed_attempt_count
-        return NotImplemented
-
-    def __int__(self) -> int:
-        return self.failed_attempt_count
-
-
-def _get_attempt_limit_and_normalized_counts(benchmark_run: dict[str, AiderTestResult]) -> tuple[int | None, Counter]:
-    result = Counter([t.failed_attempt_count for t in benchmark_run.values()])
+def print_ratio_diff(metric_name: str, value_run_1: float | None, value_run_2: float | None, value_format: str):
+    """Print a derived (non-integer) metric of the second run, with its delta against the first run."""
+    if value_run_2 is None:
+        print(f"# {metric_name}: {'N/A':>10}")
+        return
+    if not value_run_1:
+        print(f"# {metric_name}: {value_run_2:10{value_format}} N/A")
+        return
+    percent_change = (value_run_2 - value_run_1) * 100 / value_run_1
+    print(
+        f"# {metric_name}: {value_run_2:10{value_format}}"
+        f" ({value_run_2 - value_run_1:+10{value_format}}, {percent_change:+4.0f}%){_get_visual_indicator(percent_change)}"
+    )
+
+
+def print_distribution(metric_name: str, values_run_1, values_run_2, bins: int = 10):
+    """
+    Print percentiles and maximum of a per-test metric for the second run, with deltas against the first run,
+    followed by a histogram of the second run (bin count deltas against the first run in parentheses).
+    """
+    distribution_1 = get_distribution(values_run_1)
+    distribution_2 = get_distribution(values_run_2)
+    print(f"# {metric_name}")
+    for stat_name, value_1, value_2 in zip(Distribution._fields, distribution_1, distribution_2):
+        # NaN when a run has no tests
+        comparable = value_1 and not math.isnan(value_1) and not math.isnan(value_2)
+        percent_change = (value_2 - value_1) * 100 / value_1 if comparable else None
+        delta = f"({value_2 - value_1:+12,.1f}, {percent_change:+4.0f}%)" if percent_change is not None else ""
+        print(f"#   {stat_name:>3}: {value_2:12,.1f} {delta}{_get_visual_indicator(percent_change)}")
+    all_values = [*values_run_1, *values_run_2]
+    if not all_values:
+        return
+    low, high = min(all_values), max(all_values)
+    # All values equal: `get_histogram` puts them in the first bin, so print only that one
+    if low == high:
+        bins = 1
+    counts_1 = get_histogram(values_run_1, low, high, bins)
+    counts_2 = get_histogram(values_run_2, low, high, bins)
+    max_count = max(counts_2) or 1
+    bin_width = (high - low) / bins
+    for i, (count_1, count_2) in enumerate(zip(counts_1, counts_2)):
+        bin_start = low + bin_width * i
+        print((
+            f"#   [{bin_start:12,.1f}, {bin_start + bin_width:12,.1f}{']' if i == bins - 1 else ')'}:"
+            f" {count_2:4d} {f'({count_2 - count_1:+4d})' if count_2 != count_1 else '      '}"
+            f" {_get_histogram_bar(count_2, max_count)}"
+        ).rstrip())
+
+
+def print_top_tests(
+        title: str, benchmark_run_1: BenchmarkColumns, benchmark_run_2: BenchmarkColumns, key, top: int,
+        value_format: str = ',.1f'
+):
+    """Print the `top` tests of the second run with the highest `key(test)`, along with the value in the first run."""
+    print(f"# {title}")
+    for test in heapq.nlargest(top, benchmark_run_2.values(), key=key):
+        test_1 = benchmark_run_1.get(test.name)
+        was = f"(was {key(test_1):{value_format}})" if test_1 else "(new)"
+        print(f"#   {key(test):>12{value_format}} {was} {test.name}")
+
+
+def print_attempt_breakdown(attempts_1: dict[str, list], attempts_2: dict[str, list], top_errors: int = 3):
+    """
+    Print, for each attempt number, the tokens, estimated time and cost spent on it by the second run, its share of
+    the run total (and the share in the first run), and the most common reasons that attempt failed.
+    """
+    totals_1, totals_2 = totals_by_attempt(attempts_1), totals_by_attempt(attempts_2)
+    run_totals = []
+    for totals in (totals_1, totals_2):
+        run_totals.append({
+            field: sum(getattr(attempt_totals, field) for attempt_totals in totals.values())
+            for field in ('sent_tokens', 'received_tokens', 'estimated_duration', 'estimated_cost')
+        })
+
+    def share(totals, number, field, run_index):
+        run_total = run_totals[run_index][field]
+        return getattr(totals[number], field) * 100 / run_total if number in totals and run_total else 0.0
+
+    for number, attempt_totals in totals_2.items():
+        columns = []
+        for label, field, value_format in (
+                ('sent', 'sent_tokens', ',.0f'), ('recv', 'received_tokens', ',.0f'),
+                ('~s', 'estimated_duration', ',.1f'), ('~$', 'estimated_cost', ',.4f')
+        ):
+            columns.append(
+                f"{label} {getattr(attempt_totals, field):{value_format}}"
+                f" ({share(totals_2, number, field, 1):3.0f}%, was {share(totals_1, number, field, 0):3.0f}%)"
+            )
+        errors = ', '.join(
+            f"{category} {count}" for category, count in attempt_totals.error_categories.most_common(top_errors)
+        )
+        print(f"# Attempt {number}: {attempt_totals.test_count:4d} tests | {' | '.join(columns)}")
+        if errors:
+            print(f"#   failed: {errors}")
+    retry_shares = [
+        sum(share(totals, number, 'estimated_cost', run_index) for number in totals if number > 1)
+        for run_index, totals in enumerate((totals_1, totals_2))
+    ]
+    print(f"# Retries (attempt 2+): {retry_shares[1]:.0f}% of the cost (was {retry_shares[0]:.0f}%)")
+    print("# ~: estimated from each attempt's token share of the test duration and cost")
+
+
+def _get_attempt_limit_and_normalized_counts(
+        benchmark_run: dict[str, AiderTestResult] | BenchmarkColumns
+) -> tuple[int | None, Counter]:
     """
     Process and normalize the failed attempt counts from a benchmark run.
 
     Args:
-    benchmark_run (dict[str, AiderTestResult]): Dictionary mapping test names to their results
+    benchmark_run (dict[str, AiderTestResult] | BenchmarkColumns): Dictionary mapping test names to their results
 
     Returns:
     tuple[int | None, Counter]: A tuple containing:
@@ -333,17 +606,9 @@ def _get_attempt_limit_and_normalized_counts(benchmark_run: dict[str, AiderTestR
     Note: All tests that hit the failure limit are normalized to count -1,
     regardless of the actual negative value used in the input
     """
-    # Find the negative value (if any) and its count
-    negative_value = next((k for k in result.keys() if k < 0), None)
-    if negative_value is None:
-        return 0, result
-    # Get the count of tests with this negative value
-    max_failed_attempts = result[negative_value]
-    # Remove the original negative value from counter
-    del result[negative_value]
-    # Add the count to -1 in the counter
-    result[-1] = max_failed_attempts
-    return abs(negative_value), result
+    if isinstance(benchmark_run, BenchmarkColumns):
+        return normalize_attempt_counts(Counter(benchmark_run.columns['failed_attempt_count']))
+    return normalize_attempt_counts(Counter([t.failed_attempt_count for t in benchmark_run.values()]))
 
 
 def create_aider_test_result(csv_string):
@@ -373,19 +638,31 @@ def create_aider_test_result(csv_string):
     return AiderTestResult(**converted_values)
 
 
-def parse_benchmark_dir(benchmark_dir: str) -> list[AiderTestResult]:
+def parse_benchmark_dir(
+        benchmark_dir: str, use_shell: bool = False, threads: int | None = None, use_cache: bool = True
+) -> list[AiderTestResult]:
     """
     Parse a benchmark run dir and extract test results.
 
     Args:
-    benchmark_dir (str): Path to the benchmark run dir.
+    benchmark_dir (str): Path to the benchmark run dir, or to a `.zip` / `.tar[.gz|.bz2|.xz|.zst]` archive of it
+    (archives are always read in-process, streaming their members).
+    use_shell (bool): If True, fall back to parsing the output of `benchmark-test-info.sh`.
+    threads (int | None): Size of the thread pool used by the in-process parser.
+    use_cache (bool): If True, the in-process parser only re-parses tests that are new or changed since the last call.
 
     Returns:
     list[AiderTestResult]: A list of test resulkts
 
-    The function reads the file line by line, looking for lines that start with a number or a minus sign.
-    These lines are expected to be in the format: "failed_attempts,test_name".
+    When using the shell script, the function reads its output line by line, looking for lines that start with a number
+    or a minus sign. These lines are expected to be in the format: "failed_attempts,test_name".
     """
+    if is_benchmark_archive(benchmark_dir):
+        return parse_benchmark_archive(benchmark_dir)
+    if not use_shell:
+        if use_cache:
+            return parse_benchmark_run_cached(benchmark_dir, threads=threads)
+        return parse_benchmark_run(benchmark_dir, threads=threads)
 
     results = []
     ls = benchmark_ls(benchmark_dir)
@@ -420,39 +697,18 @@ def compare_benchmark_runs(benchmark_run_1: dict[str, AiderTestResult], benchmar
     improved = []
     worsened = []
     stable = []
+    categories = {ONLY_1: only_1, ONLY_2: only_2, IMPROVED: improved, WORSENED: worsened, STABLE: stable}
 
     all_test_names = set(benchmark_run_1.keys()) | set(benchmark_run_2.keys())
 
     for test_name in sorted(all_test_names):
         test_from_run_1 = benchmark_run_1.get(test_name)
         test_from_run_2 = benchmark_run_2.get(test_name)
-
-        if test_from_run_1 is None:
-            only_2.append(test_name)
-            continue
-        if test_from_run_2 is None:
-            only_1.append(test_name)
-            continue
-        if test_from_run_1 == test_from_run_2:
-            stable.append(test_name)
-            continue
-        if test_from_run_1 < 0 and test_from_run_2 < 0:
-            stable.append(test_name)
-            continue
-
-        if test_from_run_1.failed_attempt_count < 0:
-            improved.append(test_name)
-            continue
-        if test_from_run_2 < 0:
-            worsened.append(test_name)
-            continue
-        if test_from_run_2 < test_from_run_1:
-            improved.append(test_name)
-            continue
-        if test_from_run_2 > test_from_run_1:
-            worsened.append(test_name)
-            continue
-        stable.append(test_name)
+        category = classify_test_change(
+            None if test_from_run_1 is None else test_from_run_1.failed_attempt_count,
+            None if test_from_run_2 is None else test_from_run_2.failed_attempt_count,
+        )
+        categories[category].append(test_name)
 
     return only_1, only_2, improved, worsened, stable
 
@@ -467,12 +723,13 @@ def benchmark_ls(benchmark_run_dir):
         benchmark_run_dir = os.path.join(os.getcwd(), benchmark_run_dir)
 
         # Run the shell script and capture its output
-        result = subprocess.run(
-            [script_path, benchmark_run_dir],
-            capture_output=True,
-            text=True,
-            check=False
-        )
+        with phase('subprocess'):
+            result = subprocess.run(
+                [script_path, benchmark_run_dir],
+                capture_output=True,
+                text=True,
+                check=False
+            )
         return result.stdout.strip()
 
     except subprocess.CalledProcessError as e:
@@ -485,8 +742,117 @@ def benchmark_ls(benchmark_run_dir):
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python benchmark_diff_analysis.py <benchmark_dir_1> <benchmark_dir_2>")
-        sys.exit(1)
-    main(sys.argv[1], sys.argv[2])
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "benchmark_dirs", nargs='+', metavar="benchmark_dir",
+        help="Paths to the benchmark runs. With more than 2 runs, a test-by-run matrix is printed"
+    )
+    parser.add_argument(
+        "--matrix", action="store_true",
+        help="Print the test-by-run matrix even when comparing only 2 runs"
+    )
+    parser.add_argument(
+        "--shell", action="store_true",
+        help="Parse the runs with benchmark-test-info.sh (slow fallback) instead of the in-process parser"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=None,
+        help="Size of the thread pool used to read test files (default: ThreadPoolExecutor default; 1: sequential)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Re-parse every test instead of reusing the parse cache stored in each run dir"
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Compare a run that is still executing (2nd dir) against a baseline (1st dir) as each test lands"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=5.0,
+        help="Seconds between polls of the running benchmark dir in --watch mode (default: 5)"
+    )
+    parser.add_argument(
+        "--idle-timeout", type=float, default=None,
+        help="In --watch mode, stop after this many seconds without new results (default: run until interrupted)"
+    )
+    parser.add_argument(
+        "--format", choices=OUTPUT_FORMATS, default='text', dest="output_format",
+        help="Output format when comparing 2 runs (default: text). json, csv and ndjson stream one row per test"
+    )
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="Print bootstrap confidence intervals for the pass rate, token, cost and duration deltas"
+    )
+    parser.add_argument(
+        "--resamples", type=int, default=10_000, help="Number of bootstrap resamples for --stats (default: 10000)"
+    )
+    parser.add_argument(
+        "--confidence", type=float, default=0.95, help="Confidence level for --stats (default: 0.95)"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible --stats resampling")
+    parser.add_argument(
+        "--top", type=int, default=5, help="Number of slowest and most token-hungry tests to list (default: 5)"
+    )
+    parser.add_argument(
+        "--attempts", action="store_true",
+        help="Print tokens, estimated time and cost, and error types per attempt, parsed from the chat histories"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Print wall and CPU time, file and byte counts per phase (scan, parse, cache, compare, ...) to stderr"
+    )
+    parser.add_argument(
+        "--profile-output", metavar="PATH",
+        help="With --profile, also write a dump: speedscope phases if PATH ends with .speedscope.json, else cProfile"
+    )
+    args = parser.parse_args()
+    if len(args.benchmark_dirs) < 2:
+        parser.error("at least 2 benchmark dirs are required")
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1 (exclusive)")
+    if args.resamples < 1:
+        parser.error("--resamples must be at least 1")
+    if args.output_format != 'text' and (args.watch or args.matrix or len(args.benchmark_dirs) > 2):
+        parser.error(f"--format {args.output_format} only applies when comparing 2 runs, not to --watch or the matrix")
+    if args.profile_output and not args.profile:
+        parser.error("--profile-output needs --profile")
+    profiler = start_profiling() if args.profile else None
+    c_profile = None
+    if profiler and args.profile_output and not args.profile_output.endswith(SPEEDSCOPE_SUFFIX):
+        c_profile = cProfile.Profile()
+        c_profile.enable()
+    try:
+        with phase('main'):
+            if args.watch:
+                if len(args.benchmark_dirs) != 2:
+                    parser.error("--watch takes exactly 2 benchmark dirs: the baseline and the running benchmark")
+                baseline_dir, running_dir = args.benchmark_dirs
+                print(f"--- {baseline_dir.split('/')[-1]}")
+                print(f"+++ {running_dir.split('/')[-1]}")
+                watch_benchmark_run(
+                    BenchmarkColumns(parse_benchmark_dir(baseline_dir, args.shell, args.threads, not args.no_cache)),
+                    running_dir, interval=args.interval, idle_timeout=args.idle_timeout
+                )
+            elif args.matrix or len(args.benchmark_dirs) > 2:
+                main_matrix(
+                    args.benchmark_dirs, use_shell=args.shell, threads=args.threads, use_cache=not args.no_cache
+                )
+            else:
+                main(
+                    *args.benchmark_dirs,
+                    use_shell=args.shell, threads=args.threads, use_cache=not args.no_cache,
+                    output_format=args.output_format, stats=args.stats, resamples=args.resamples,
+                    confidence=args.confidence, seed=args.seed, top=args.top, attempts=args.attempts
+                )
+    finally:
+        if c_profile:
+            c_profile.disable()
+            c_profile.dump_stats(args.profile_output)
+        if profiler:
+            stop_profiling()
+            profiler.print_summary()
+            if args.profile_output and not c_profile:
+                profiler.write_speedscope(args.profile_output, name='benchmark_diff_analysis')
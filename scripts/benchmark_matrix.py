@@ -0,0 +1,144 @@
+"""
+Test-by-run matrix used to compare any number of benchmark runs.
+Each run is parsed once and its metrics are laid out in a single matrix, from which pairwise and best-of summaries
+are computed without going back to the run dirs.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from benchmark_parser import AiderTestResult
+
+ONLY_1 = 'only_1'
+ONLY_2 = 'only_2'
+IMPROVED = 'improved'
+WORSENED = 'worsened'
+STABLE = 'stable'
+
+MATRIX_METRICS = ('failed_attempt_count', 'sent_tokens', 'received_tokens', 'cost', 'duration')
+
+
+def classify_test_change(failed_attempts_1: int | None, failed_attempts_2: int | None) -> str:
+    """
+    Categorize how a test changed between two runs.
+
+    Args:
+    failed_attempts_1 (int | None): Failed attempt count in the first run, or None if the test isn't in that run.
+    failed_attempts_2 (int | None): Failed attempt count in the second run, or None if the test isn't in that run.
+
+    Returns:
+    str: One of ONLY_1, ONLY_2, IMPROVED, WORSENED or STABLE
+
+    Negative failed attempt counts indicate the limit of failed attempts was reached and the test didn't pass.
+    """
+    if failed_attempts_1 is None:
+        return ONLY_2
+    if failed_attempts_2 is None:
+        return ONLY_1
+    if failed_attempts_1 == failed_attempts_2:
+        return STABLE
+    if failed_attempts_1 < 0 and failed_attempts_2 < 0:
+        return STABLE
+    if failed_attempts_1 < 0:
+        return IMPROVED
+    if failed_attempts_2 < 0:
+        return WORSENED
+    if failed_attempts_2 < failed_attempts_1:
+        return IMPROVED
+    if failed_attempts_2 > failed_attempts_1:
+        return WORSENED
+    return STABLE
+
+
+class RunSummary(NamedTuple):
+    name: str
+    test_count: int
+    pass_count: int
+    sent_tokens: int
+    received_tokens: int
+    cost: float
+    duration: float
+
+    @property
+    def pass_rate(self) -> float:
+        return self.pass_count * 100 / self.test_count if self.test_count else 0
+
+
+@dataclass
+class BenchmarkMatrix:
+    """
+    Metrics of N benchmark runs, indexed as `cells[metric][test_index][run_index]`.
+    A cell is None when the test isn't present in that run.
+    """
+    run_names: list[str]
+    test_names: list[str]
+    cells: dict[str, list[list[int | float | None]]]
+
+    @classmethod
+    def from_runs(cls, run_names: list[str], runs: list[list[AiderTestResult]]) -> 'BenchmarkMatrix':
+        """Build the matrix from already parsed runs (one list of test results per run)."""
+        test_names = sorted({t.name for run in runs for t in run})
+        test_index = {name: i for i, name in enumerate(test_names)}
+        cells = {metric: [[None] * len(runs) for _ in test_names] for metric in MATRIX_METRICS}
+        for run_index, run in enumerate(runs):
+            for test in run:
+                row = test_index[test.name]
+                for metric in MATRIX_METRICS:
+                    cells[metric][row][run_index] = getattr(test, metric)
+        return cls(run_names, test_names, cells)
+
+    @property
+    def run_count(self) -> int:
+        return len(self.run_names)
+
+    def summarize_run(self, run_index: int) -> RunSummary:
+        """Totals of a single run, computed from its column of the matrix."""
+        columns = {metric: [row[run_index] for row in rows if row[run_index] is not None]
+                   for metric, rows in self.cells.items()}
+        failed_attempt_counts = columns['failed_attempt_count']
+        return RunSummary(
+            name=self.run_names[run_index],
+            test_count=len(failed_attempt_counts),
+            pass_count=sum(1 for count in failed_attempt_counts if count >= 0),
+            sent_tokens=sum(columns['sent_tokens']),
+            received_tokens=sum(columns['received_tokens']),
+            cost=sum(columns['cost']),
+            duration=sum(columns['duration']),
+        )
+
+    def compare_runs(self, run_index_1: int, run_index_2: int) -> Counter:
+        """
+        Count test changes from one run to another.
+
+        Returns:
+        Counter: Counts per category (see `classify_test_change`), plus `now_pass` and `now_fail` for tests that
+        started or stopped passing. Tests absent from both runs aren't counted.
+        """
+        result = Counter()
+        for row in self.cells['failed_attempt_count']:
+            failed_attempts_1, failed_attempts_2 = row[run_index_1], row[run_index_2]
+            if failed_attempts_1 is None and failed_attempts_2 is None:
+                continue
+            category = classify_test_change(failed_attempts_1, failed_attempts_2)
+            result[category] += 1
+            if category == IMPROVED and failed_attempts_1 < 0:
+                result['now_pass'] += 1
+            elif category == WORSENED and failed_attempts_2 < 0:
+                result['now_fail'] += 1
+        return result
+
+    def best_runs(self, test_row: int) -> list[int]:
+        """
+        Find the runs that did best on a test: it passed with the fewest failed attempts.
+        Ties are broken by the fewest sent tokens.
+
+        Returns:
+        list[int]: Indexes of the best runs (empty if the test didn't pass in any run)
+        """
+        failed_attempt_counts = self.cells['failed_attempt_count'][test_row]
+        sent_tokens = self.cells['sent_tokens'][test_row]
+        passed = [i for i, count in enumerate(failed_attempt_counts) if count is not None and count >= 0]
+        if not passed:
+            return []
+        best_key = min((failed_attempt_counts[i], sent_tokens[i]) for i in passed)
+        return [i for i in passed if (failed_attempt_counts[i], sent_tokens[i]) == best_key]
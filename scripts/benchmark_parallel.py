@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Run aider's `benchmark/benchmark.py` on several worker processes at once, then merge their tests into a single run dir.
+
+A single benchmark.py process must run with `--threads 1` when using `--edit-format cedarscript`, so instead each
+worker is a separate benchmark.py process with `--threads 1`, its own `AIDER_BENCHMARK_DIR` (and so its own working
+copy of the exercises, chat histories and results files), and a `--keywords` list selecting its share of the tests.
+When all workers are done, their test dirs are moved into `<AIDER_BENCHMARK_DIR>/<timestamp>--<run name>`, with the
+same layout as a run made by benchmark.py itself, so `benchmark_diff_analysis.py` reads it as usual.
+
+Run it from the root of the aider repo (inside the benchmark docker container), e.g.:
+    python .../scripts/benchmark_parallel.py gemini-flash-cedarscript-refactor --workers 8 -- \\
+        --model gemini/gemini-1.5-flash-latest --edit-format cedarscript --exercises-dir refactor-benchmark
+"""
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmark_parser import RESULTS_FILE_NAME, find_results_files
+
+DEFAULT_BENCHMARK_DIR = 'tmp.benchmarks'
+WORKERS_DIR_NAME = '.parallel-workers'
+WORKER_LOG_FILE_NAME = 'benchmark.log'
+
+
+def find_test_names(exercises_dir: str) -> list[str]:
+    """
+    List the test names of an exercises dir, sorted.
+    Both the flat layout (`<test>/`) and the polyglot layout (`<language>/exercises/practice/<test>/`) are supported.
+    """
+    nested = []
+    for language in sorted(os.listdir(exercises_dir)):
+        practice_dir = os.path.join(exercises_dir, language, 'exercises', 'practice')
+        if os.path.isdir(practice_dir):
+            nested.extend(
+                name for name in os.listdir(practice_dir) if os.path.isdir(os.path.join(practice_dir, name))
+            )
+    if nested:
+        return sorted(nested)
+    return sorted(
+        name for name in os.listdir(exercises_dir)
+        if not name.startswith('.') and os.path.isdir(os.path.join(exercises_dir, name))
+    )
+
+
+def shard_test_names(test_names: list[str], shard_count: int) -> list[list[str]]:
+    """
+    Split test names into at most `shard_count` non-empty shards of similar size.
+
+    benchmark.py selects the tests whose name *contains* any of the `--keywords`, so a test whose name is part of
+    another test's name is kept in the same shard as that test; otherwise both shards would run the longer one.
+    Containment is transitive here: `ab` and `bc` both go with `abc`, so all three share a shard.
+    """
+    # Union-find over "one name contains the other"
+    parent = {name: name for name in test_names}
+
+    def find(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    names_by_length = sorted(parent, key=len)
+    for i, name in enumerate(names_by_length):
+        for other in names_by_length[:i]:
+            if other in name:
+                parent[find(other)] = find(name)
+    groups_by_root: dict[str, list[str]] = {}
+    for name in names_by_length:
+        groups_by_root.setdefault(find(name), []).append(name)
+    groups = list(groups_by_root.values())
+    shards: list[list[str]] = [[] for _ in range(min(shard_count, len(groups)))]
+    # Largest groups first, each into the currently smallest shard
+    for group in sorted(groups, key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [sorted(shard) for shard in shards]
+
+
+def _strip_threads_arg(benchmark_args: list[str]) -> list[str]:
+    result = []
+    skip_next = False
+    for arg in benchmark_args:
+        if skip_next:
+            skip_next = False
+        elif arg == '--threads':
+            skip_next = True
+        elif not arg.startswith('--threads='):
+            result.append(arg)
+    return result
+
+
+def run_worker(
+        worker_dir: str, run_dir_name: str, test_names: list[str], exercises_dir: str, benchmark_args: list[str],
+        aider_dir: str
+) -> int:
+    """
+    Run benchmark.py on a share of the tests, isolated in its own benchmark dir.
+
+    Args:
+    worker_dir (str): The `AIDER_BENCHMARK_DIR` of this worker. The exercises dir is symlinked into it.
+    run_dir_name (str): Name of the run dir benchmark.py creates inside `worker_dir`.
+    test_names (list[str]): Tests to run, passed to benchmark.py as `--keywords`.
+    exercises_dir (str): Path to the exercises dir (e.g. `tmp.benchmarks/refactor-benchmark`).
+    benchmark_args (list[str]): Further benchmark.py arguments (model, edit format, ...).
+    aider_dir (str): Root of the aider repo.
+
+    Returns:
+    int: The exit code of benchmark.py. Its output goes to `benchmark.log` in `worker_dir`.
+    """
+    os.makedirs(worker_dir, exist_ok=True)
+    exercises_link = os.path.join(worker_dir, os.path.basename(exercises_dir))
+    if not os.path.lexists(exercises_link):
+        os.symlink(os.path.abspath(exercises_dir), exercises_link)
+    command = [
+        sys.executable, os.path.join(aider_dir, 'benchmark', 'benchmark.py'),
+        # A path with more than one part is used as-is, instead of getting a timestamp prefix
+        os.path.join(worker_dir, run_dir_name),
+        '--exercises-dir', os.path.basename(exercises_dir),
+        '--keywords', ','.join(test_names),
+        '--threads', '1',
+        *_strip_threads_arg(benchmark_args),
+    ]
+    with open(os.path.join(worker_dir, WORKER_LOG_FILE_NAME), 'w', encoding='utf-8') as log_file:
+        return subprocess.run(
+            command, cwd=aider_dir, env={**os.environ, 'AIDER_BENCHMARK_DIR': worker_dir},
+            stdout=log_file, stderr=subprocess.STDOUT, check=False
+        ).returncode
+
+
+def merge_worker_runs(worker_run_dirs: list[str], run_dir: str) -> int:
+    """
+    Move the tests each worker ran into the final run dir, keeping their relative paths.
+    Exercises no worker ran are taken from the first worker's copy, so the layout matches a single benchmark.py run.
+
+    Returns:
+    int: The number of tests with results
+    """
+    test_count = 0
+    for worker_run_dir in worker_run_dirs:
+        for results_file in find_results_files(worker_run_dir):
+            test_dir = os.path.dirname(results_file)
+            target = os.path.join(run_dir, os.path.relpath(test_dir, worker_run_dir))
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(test_dir, target)
+            test_count += 1
+    if worker_run_dirs and os.path.isdir(worker_run_dirs[0]):
+        _copy_missing(worker_run_dirs[0], run_dir)
+    return test_count
+
+
+def _copy_missing(source_dir: str, target_dir: str) -> None:
+    os.makedirs(target_dir, exist_ok=True)
+    for entry in os.scandir(source_dir):
+        target = os.path.join(target_dir, entry.name)
+        if not os.path.lexists(target):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.copytree(entry.path, target, symlinks=True)
+            else:
+                shutil.copy2(entry.path, target, follow_symlinks=False)
+        elif entry.is_dir(follow_symlinks=False) and not os.path.isfile(os.path.join(target, RESULTS_FILE_NAME)):
+            _copy_missing(entry.path, target)
+
+
+def run_parallel_benchmark(
+        run_name: str, benchmark_args: list[str], exercises_dir_name: str, workers: int,
+        aider_dir: str = '.', keep_workers: bool = False
+) -> str:
+    """
+    Run a benchmark on `workers` benchmark.py processes and merge the results.
+
+    Args:
+    run_name (str): Name of the run; the run dir is `<timestamp>--<run_name>`, as benchmark.py names it.
+    benchmark_args (list[str]): Arguments for every benchmark.py process (model, edit format, ...).
+    exercises_dir_name (str): Name of the exercises dir inside the benchmark dir (e.g. `refactor-benchmark`).
+    workers (int): Number of benchmark.py processes to run at once.
+    aider_dir (str): Root of the aider repo.
+    keep_workers (bool): If True, keep each worker's dir (and its `benchmark.log`) after merging.
+
+    Returns:
+    str: Path to the merged run dir
+    """
+    benchmark_dir = os.path.abspath(
+        os.path.join(aider_dir, os.environ.get('AIDER_BENCHMARK_DIR', DEFAULT_BENCHMARK_DIR))
+    )
+    exercises_dir = os.path.join(benchmark_dir, exercises_dir_name)
+    run_dir_name = f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}--{run_name}"
+    run_dir = os.path.join(benchmark_dir, run_dir_name)
+    workers_dir = os.path.join(benchmark_dir, WORKERS_DIR_NAME, run_dir_name)
+
+    shards = shard_test_names(find_test_names(exercises_dir), workers)
+    worker_dirs = [os.path.join(workers_dir, f"worker-{i:02d}") for i in range(len(shards))]
+    print(f"# Running {sum(map(len, shards))} tests on {len(shards)} workers (logs in {workers_dir})")
+    with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+        exit_codes = list(executor.map(
+            lambda worker: run_worker(
+                worker[0], run_dir_name, worker[1], exercises_dir, benchmark_args, os.path.abspath(aider_dir)
+            ),
+            zip(worker_dirs, shards)
+        ))
+    for worker_dir, exit_code in zip(worker_dirs, exit_codes):
+        if exit_code:
+            print(f"# {worker_dir}: benchmark.py exited with code {exit_code}", file=sys.stderr)
+
+    test_count = merge_worker_runs([os.path.join(worker_dir, run_dir_name) for worker_dir in worker_dirs], run_dir)
+    print(f"# Merged {test_count} tests into {run_dir}")
+    if not keep_workers:
+        shutil.rmtree(workers_dir, ignore_errors=True)
+    return run_dir
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+        usage="%(prog)s run_name [--workers N] [--keep-workers] [--exercises-dir DIR] -- <benchmark.py arguments>"
+    )
+    parser.add_argument("run_name", help="Name of the benchmark run (the run dir gets a timestamp prefix)")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="Number of benchmark.py processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--aider-dir", default='.', help="Root of the aider repo (default: current dir)"
+    )
+    parser.add_argument(
+        "--keep-workers", action="store_true", help="Keep each worker's dir and benchmark.log after merging"
+    )
+    parser.add_argument(
+        "--exercises-dir", default='refactor-benchmark',
+        help="Exercises dir inside the benchmark dir (default: refactor-benchmark). Also accepted after --"
+    )
+    args, benchmark_args = parser.parse_known_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if benchmark_args[:1] == ['--']:
+        benchmark_args = benchmark_args[1:]
+    # Every worker gets its own `--exercises-dir`, so take it out of the benchmark.py arguments too
+    exercises_parser = argparse.ArgumentParser(prog=parser.prog, add_help=False, allow_abbrev=False)
+    exercises_parser.add_argument("--exercises-dir", default=args.exercises_dir)
+    exercises_args, benchmark_args = exercises_parser.parse_known_args(benchmark_args)
+    run_parallel_benchmark(
+        args.run_name, benchmark_args, exercises_args.exercises_dir, args.workers,
+        aider_dir=args.aider_dir, keep_workers=args.keep_workers
+    )
@@ -0,0 +1,229 @@
+"""
+In-process parser for aider benchmark run dirs.
+It reads each test's `.aider.results.json` and `.aider.chat.history.md` directly and produces the same fields
+as `benchmark-test-info.sh`, without forking `jq`, `grep` or `awk` for every test.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import total_ordering
+from typing import NamedTuple, Union
+
+from benchmark_profile import add_counts, is_profiling, phase
+from chat_history import AttemptRecord, scan_attempts, scan_token_usage, sum_token_usage
+
+RESULTS_FILE_NAME = '.aider.results.json'
+CHAT_HISTORY_FILE_NAME = '.aider.chat.history.md'
+
+# Bump whenever the parsed values change for the same input files, so that cached results get discarded
+PARSER_VERSION = 2
+
+
+@total_ordering
+class AiderTestResult(NamedTuple):
+    failed_attempt_count: int
+    name: str
+    duration: float
+    sent_tokens: int
+    received_tokens: int
+    model: str
+    edit_format: str
+    cost: float
+    timeouts: int
+    error_output_count: int
+    user_ask_count: int
+    exhausted_context_window_count: int
+    malformed_responses: int
+    syntax_errors: int
+    indentation_errors: int
+    lazy_comments: int
+
+    def __eq__(self, other: Union['AiderTestResult', int]) -> bool:
+        if isinstance(other, int):
+            return self.failed_attempt_count == other
+        if isinstance(other, AiderTestResult):
+            return self.failed_attempt_count == other.failed_attempt_count
+        return NotImplemented
+
+    def __lt__(self, other: Union['AiderTestResult', int]) -> bool:
+        if isinstance(other, int):
+            return self.failed_attempt_count < other
+        if isinstance(other, AiderTestResult):
+            return self.failed_attempt_count < other.failed_attempt_count
+        return NotImplemented
+
+    def __int__(self) -> int:
+        return self.failed_attempt_count
+
+
+def extract_token_counts(chat_history_path: str) -> tuple[int, int]:
+    """
+    Sum the sent and received token counts from all `> Tokens:` lines in a chat history file.
+
+    Args:
+    chat_history_path (str): Path to a `.aider.chat.history.md` file.
+
+    Returns:
+    tuple[int, int]: Total sent tokens and total received tokens (both 0 if the file doesn't exist)
+    """
+    token_usage = sum_token_usage(scan_token_usage(chat_history_path))
+    return token_usage.sent, token_usage.received
+
+
+def get_failed_attempt_count(tests_outcomes: list[bool] | None) -> int:
+    """
+    Count the failed attempts of a test.
+
+    Returns:
+    int: The number of failed attempts, made negative if no attempt succeeded
+    """
+    tests_outcomes = tests_outcomes or []
+    failed_attempt_count = sum(1 for outcome in tests_outcomes if outcome is False)
+    return failed_attempt_count if True in tests_outcomes else -failed_attempt_count
+
+
+def parse_test_results(results_path: str) -> AiderTestResult:
+    """
+    Parse a single test from its `.aider.results.json` file and the chat history next to it.
+
+    Args:
+    results_path (str): Path to the `.aider.results.json` file of a test.
+
+    Returns:
+    AiderTestResult: The test result, named after the directory that holds the results file
+    """
+    test_dir = os.path.dirname(results_path)
+    with open(results_path, encoding='utf-8') as results_file:
+        results = json.load(results_file)
+    sent_tokens, received_tokens = extract_token_counts(os.path.join(test_dir, CHAT_HISTORY_FILE_NAME))
+    return build_test_result(os.path.basename(test_dir), results, sent_tokens, received_tokens)
+
+
+def build_test_result(test_name: str, results: dict, sent_tokens: int, received_tokens: int) -> AiderTestResult:
+    """
+    Build a test result from the contents of its `.aider.results.json` file and its chat history token totals.
+    """
+    return AiderTestResult(
+        failed_attempt_count=get_failed_attempt_count(results.get('tests_outcomes')),
+        name=test_name,
+        duration=float(results.get('duration') or 0),
+        sent_tokens=sent_tokens,
+        received_tokens=received_tokens,
+        model=str(results.get('model')),
+        edit_format=str(results.get('edit_format')),
+        cost=float(results.get('cost') or 0),
+        timeouts=int(results.get('test_timeouts') or 0),
+        error_output_count=int(results.get('num_error_outputs') or 0),
+        user_ask_count=int(results.get('num_user_asks') or 0),
+        exhausted_context_window_count=int(results.get('num_exhausted_context_windows') or 0),
+        malformed_responses=int(results.get('num_malformed_responses') or 0),
+        syntax_errors=int(results.get('syntax_errors') or 0),
+        indentation_errors=int(results.get('indentation_errors') or 0),
+        lazy_comments=int(results.get('lazy_comments') or 0),
+    )
+
+
+def find_results_files(benchmark_dir: str) -> list[str]:
+    """Find all `.aider.results.json` files below a benchmark run dir, sorted by path."""
+    results_files = []
+    with phase('scan dirs'):
+        for dir_path, _, file_names in os.walk(benchmark_dir):
+            if RESULTS_FILE_NAME in file_names:
+                results_files.append(os.path.join(dir_path, RESULTS_FILE_NAME))
+        add_counts(files=len(results_files))
+    return sorted(results_files)
+
+
+def parse_benchmark_run(benchmark_dir: str, threads: int | None = None) -> list[AiderTestResult]:
+    """
+    Parse all tests of a benchmark run dir.
+
+    Args:
+    benchmark_dir (str): Path to the benchmark run dir.
+    threads (int | None): Size of the thread pool used to read the test files.
+    `None` uses the `ThreadPoolExecutor` default, and `1` reads them sequentially.
+
+    Returns:
+    list[AiderTestResult]: The test results, sorted by the path of their results file
+    """
+    return parse_results_files(find_results_files(benchmark_dir), threads)
+
+
+def parse_results_files(results_files: list[str], threads: int | None = None) -> list[AiderTestResult]:
+    """
+    Parse the given `.aider.results.json` files, keeping their order.
+
+    Args:
+    results_files (list[str]): Paths to the results files.
+    threads (int | None): Size of the thread pool used to read the test files (`1` reads them sequentially).
+    """
+    with phase('parse files'):
+        if threads == 1 or len(results_files) < 2:
+            results = [parse_test_results(f) for f in results_files]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = list(executor.map(parse_test_results, results_files))
+        if is_profiling():
+            add_counts(files=2 * len(results_files), bytes_read=sum(map(_get_test_file_size, results_files)))
+    return results
+
+
+def _get_test_file_size(results_path: str) -> int:
+    size = os.path.getsize(results_path)
+    try:
+        return size + os.path.getsize(os.path.join(os.path.dirname(results_path), CHAT_HISTORY_FILE_NAME))
+    except FileNotFoundError:
+        return size
+
+
+def _get_shares(weights: list[float]) -> list[float]:
+    total = sum(weights)
+    return [weight / total for weight in weights] if total else [1 / len(weights)] * len(weights)
+
+
+def parse_test_attempts(results_path: str) -> list[AttemptRecord]:
+    """
+    Get the per-attempt breakdown of a test from its chat history.
+
+    The chat history doesn't record timestamps or prices, so the test duration is apportioned by each attempt's share
+    of the received tokens (generation dominates the latency), and the test cost by its share of all tokens.
+
+    Args:
+    results_path (str): Path to the `.aider.results.json` file of a test.
+
+    Returns:
+    list[AttemptRecord]: One record per attempt, in order
+    """
+    with open(results_path, encoding='utf-8') as results_file:
+        results = json.load(results_file)
+    chat_history_path = os.path.join(os.path.dirname(results_path), CHAT_HISTORY_FILE_NAME)
+    attempts = scan_attempts(chat_history_path, results.get('tests_outcomes'))
+    if not attempts:
+        return []
+    duration_shares = _get_shares([attempt.received_tokens for attempt in attempts])
+    cost_shares = _get_shares([attempt.sent_tokens + attempt.received_tokens for attempt in attempts])
+    duration = float(results.get('duration') or 0)
+    cost = float(results.get('cost') or 0)
+    return [
+        attempt._replace(estimated_duration=duration * duration_share, estimated_cost=cost * cost_share)
+        for attempt, duration_share, cost_share in zip(attempts, duration_shares, cost_shares)
+    ]
+
+
+def parse_benchmark_attempts(benchmark_dir: str, threads: int | None = None) -> dict[str, list[AttemptRecord]]:
+    """
+    Get the per-attempt breakdown of every test of a benchmark run dir (see `parse_test_attempts`).
+
+    Returns:
+    dict[str, list[AttemptRecord]]: The attempts of each test, by test name
+    """
+    results_files = find_results_files(benchmark_dir)
+    if threads == 1 or len(results_files) < 2:
+        attempts = [parse_test_attempts(f) for f in results_files]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            attempts = list(executor.map(parse_test_attempts, results_files))
+    return {
+        os.path.basename(os.path.dirname(results_file)): test_attempts
+        for results_file, test_attempts in zip(results_files, attempts)
+    }
@@ -0,0 +1,140 @@
+"""
+Phase timing for the benchmark scripts.
+Code marks its phases with `with phase('name'):`. While profiling is off, that still enters a generator-based context
+manager but records nothing, so phases should mark coarse steps rather than per-item work. Once `start_profiling()` was
+called, each phase records its wall and CPU time plus the files and bytes it reported with `add_counts`. Nested phases
+are reported under their parent, whose self time excludes them.
+Only phases entered on the thread that started profiling are recorded; work done by thread pools is attributed to the
+phase that waits for it.
+"""
+import json
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TextIO
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    files: int = 0
+    bytes: int = 0
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.stats: dict[tuple[str, ...], PhaseStats] = {}
+        # (event type, phase name, seconds since start): `O` opens a phase and `C` closes it, as in speedscope
+        self.events: list[tuple[str, str, float]] = []
+        self.thread_id = threading.get_ident()
+        self.start_time = time.perf_counter()
+        self._stack: list[str] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self._stack.append(name)
+        path = tuple(self._stack)
+        stats = self.stats.setdefault(path, PhaseStats())
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        self.events.append(('O', name, wall_start - self.start_time))
+        try:
+            yield
+        finally:
+            wall_end = time.perf_counter()
+            stats.calls += 1
+            stats.wall += wall_end - wall_start
+            stats.cpu += time.process_time() - cpu_start
+            self.events.append(('C', name, wall_end - self.start_time))
+            self._stack.pop()
+
+    def add_counts(self, files: int = 0, bytes_read: int = 0) -> None:
+        """Add file and byte counts to the innermost open phase."""
+        if self._stack:
+            stats = self.stats[tuple(self._stack)]
+            stats.files += files
+            stats.bytes += bytes_read
+
+    def print_summary(self, out: TextIO = sys.stderr) -> None:
+        """Print a table of all phases in the order they were first entered, children indented below their parent."""
+        print("# ============= PROFILE =============", file=out)
+        print(
+            f"# {'phase':32s} {'calls':>5s} {'wall (s)':>9s} {'self (s)':>9s} {'cpu (s)':>9s}"
+            f" {'files':>7s} {'MiB':>8s} {'MiB/s':>8s}",
+            file=out
+        )
+        for path, stats in self.stats.items():
+            children_wall = sum(
+                child.wall for child_path, child in self.stats.items()
+                if len(child_path) == len(path) + 1 and child_path[:-1] == path
+            )
+            mib = stats.bytes / (1 << 20)
+            throughput = f"{mib / stats.wall:8.1f}" if stats.bytes and stats.wall else f"{'':8s}"
+            name = '  ' * (len(path) - 1) + path[-1]
+            print((
+                f"# {name:32s} {stats.calls:5d} {stats.wall:9.3f} {stats.wall - children_wall:9.3f} {stats.cpu:9.3f}"
+                f" {stats.files or '':>7} {f'{mib:8.2f}' if stats.bytes else '':>8s} {throughput}"
+            ).rstrip(), file=out)
+        print(f"# {'total':32s} {'':5s} {time.perf_counter() - self.start_time:9.3f}", file=out)
+
+    def write_speedscope(self, path: str, name: str = 'benchmark') -> None:
+        """Write the recorded phases as an evented speedscope profile (https://www.speedscope.app)."""
+        frame_indexes: dict[str, int] = {}
+        for _, phase_name, _ in self.events:
+            frame_indexes.setdefault(phase_name, len(frame_indexes))
+        end_value = self.events[-1][2] * 1000 if self.events else 0
+        profile = {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'shared': {'frames': [{'name': phase_name} for phase_name in frame_indexes]},
+            'profiles': [{
+                'type': 'evented', 'name': name, 'unit': 'milliseconds', 'startValue': 0, 'endValue': end_value,
+                'events': [
+                    {'type': event_type, 'frame': frame_indexes[phase_name], 'at': at * 1000}
+                    for event_type, phase_name, at in self.events
+                ],
+            }],
+        }
+        with open(path, 'w', encoding='utf-8') as profile_file:
+            json.dump(profile, profile_file)
+
+
+_active_profiler: PhaseProfiler | None = None
+
+
+def start_profiling() -> PhaseProfiler:
+    """Start recording phases on the calling thread, returning the profiler that collects them."""
+    global _active_profiler
+    _active_profiler = PhaseProfiler()
+    return _active_profiler
+
+
+def stop_profiling() -> None:
+    global _active_profiler
+    _active_profiler = None
+
+
+def is_profiling() -> bool:
+    """True if phases of the calling thread are being recorded (use it to skip work done only for `add_counts`)."""
+    return _active_profiler is not None and _active_profiler.thread_id == threading.get_ident()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the enclosed code as a phase of the active profiler (a no-op while profiling is off)."""
+    if not is_profiling():
+        yield
+        return
+    with _active_profiler.phase(name):
+        yield
+
+
+def add_counts(files: int = 0, bytes_read: int = 0) -> None:
+    """Add file and byte counts to the innermost phase of the active profiler (a no-op while profiling is off)."""
+    if is_profiling():
+        _active_profiler.add_counts(files, bytes_read)
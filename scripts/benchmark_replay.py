@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Offline replay of a recorded benchmark run: no LLM is called.
+The assistant responses recorded in each test's `.aider.chat.history.md` are re-applied, attempt by attempt, to a fresh
+copy of the original exercise files with the installed `cedarscript-editor`, and the unit tests are re-run after each
+attempt. Each replayed test gets a `.aider.results.json` of the same shape, so the replay can be compared against the
+recorded run with `benchmark_diff_analysis.py`.
+
+This measures changes to edit application only: the recorded responses of later attempts were written in reply to the
+*recorded* test failures, so a test can't take a different path through the conversation.
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from benchmark_parser import CHAT_HISTORY_FILE_NAME, RESULTS_FILE_NAME, find_results_files
+from chat_history import iter_assistant_responses, map_chat_history, split_attempts
+
+TEST_FILE_SUFFIX = '_test.py'
+# Files written by aider or the benchmark, which aren't part of the exercise
+_AIDER_FILE_PREFIX = '.aider'
+
+
+class ReplayedTest(NamedTuple):
+    name: str
+    tests_outcomes: list[bool]
+    edit_errors: int
+    test_timeouts: int
+
+
+def apply_response(response: str, test_dir: str) -> str | None:
+    """
+    Apply the CEDARScript blocks of an assistant response to the files in `test_dir`.
+
+    Returns:
+    str | None: The error message if the script couldn't be parsed or applied, else None
+    """
+    from cedarscript_editor import CEDARScriptEditor, find_commands
+    # find_commands reports the block count on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            commands = list(find_commands(response))
+            if commands:
+                CEDARScriptEditor(test_dir).apply_commands(commands)
+        except Exception as e:
+            return str(e)
+    return None
+
+
+def run_unit_tests(test_dir: str, timeout: float) -> bool | None:
+    """
+    Run the `*_test.py` files of a test dir with pytest.
+
+    Returns:
+    bool | None: True if all of them passed, False if any failed, None if they timed out
+    """
+    test_files = sorted(f for f in os.listdir(test_dir) if f.endswith(TEST_FILE_SUFFIX))
+    for test_file in test_files:
+        try:
+            result = subprocess.run(
+                [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', test_file],
+                cwd=test_dir, capture_output=True, timeout=timeout, check=False
+            )
+        except subprocess.TimeoutExpired:
+            return None
+        if result.returncode != 0:
+            return False
+    return True
+
+
+def _copy_exercise(exercise_dir: str, test_dir: str) -> None:
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    shutil.copytree(exercise_dir, test_dir, ignore=shutil.ignore_patterns(f"{_AIDER_FILE_PREFIX}*"))
+
+
+def replay_test(recorded_test_dir: str, exercise_dir: str, test_dir: str, timeout: float = 60.0) -> ReplayedTest:
+    """
+    Replay a single test and write its `.aider.results.json`.
+    A chat history without any attempt is recorded as a single failed attempt.
+
+    Args:
+    recorded_test_dir (str): Test dir of the recorded run, holding its chat history and results.
+    exercise_dir (str): The original (unedited) exercise files of the test.
+    test_dir (str): Where to replay the test. Replaced if it exists.
+    timeout (float): Seconds allowed for each unit test file.
+
+    The results are a copy of the recorded ones with the replayed outcomes, duration and error counts.
+    Only the chat history up to the last replayed attempt is copied, so token counts reflect the attempts that the
+    replay needed.
+    """
+    with open(os.path.join(recorded_test_dir, RESULTS_FILE_NAME), encoding='utf-8') as results_file:
+        results = json.load(results_file)
+    _copy_exercise(exercise_dir, test_dir)
+    start_time = time.monotonic()
+    tests_outcomes = []
+    edit_errors = test_timeouts = 0
+    with map_chat_history(os.path.join(recorded_test_dir, CHAT_HISTORY_FILE_NAME)) as buffer:
+        history_end = 0
+        for attempt_start, attempt_end in split_attempts(buffer):
+            for response in iter_assistant_responses(buffer, attempt_start, attempt_end):
+                if apply_response(response, test_dir) is not None:
+                    edit_errors += 1
+            outcome = run_unit_tests(test_dir, timeout)
+            test_timeouts += outcome is None
+            tests_outcomes.append(outcome is True)
+            history_end = attempt_end
+            if outcome:
+                break
+        with open(os.path.join(test_dir, CHAT_HISTORY_FILE_NAME), 'wb') as chat_history:
+            chat_history.write(buffer[:history_end])
+    if not tests_outcomes:
+        # No attempt was recorded: count it as a failure, not as a pass on the first try
+        tests_outcomes.append(False)
+
+    results.update(
+        testdir=test_dir,
+        tests_outcomes=tests_outcomes,
+        duration=time.monotonic() - start_time,
+        test_timeouts=test_timeouts,
+        num_error_outputs=edit_errors,
+        replayed_from=recorded_test_dir,
+    )
+    with open(os.path.join(test_dir, RESULTS_FILE_NAME), 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=4)
+    return ReplayedTest(os.path.basename(test_dir), tests_outcomes, edit_errors, test_timeouts)
+
+
+def _replay_test_args(args: tuple[str, str, str, float]) -> ReplayedTest:
+    return replay_test(*args)
+
+
+def replay_benchmark_run(
+        recorded_run_dir: str, exercises_dir: str, replay_run_dir: str,
+        workers: int | None = None, timeout: float = 60.0
+) -> list[ReplayedTest]:
+    """
+    Replay every test of a recorded run into `replay_run_dir`, keeping the test dir layout.
+
+    Args:
+    recorded_run_dir (str): Path to the recorded benchmark run.
+    exercises_dir (str): Path to the original exercises (e.g. `tmp.benchmarks/refactor-benchmark`).
+    replay_run_dir (str): Path to the replay run dir to create.
+    workers (int | None): Number of worker processes (`None`: CPU count; `1`: sequential, in-process).
+    timeout (float): Seconds allowed for each unit test file.
+    """
+    jobs = []
+    for results_file in find_results_files(recorded_run_dir):
+        recorded_test_dir = os.path.dirname(results_file)
+        relative_path = os.path.relpath(recorded_test_dir, recorded_run_dir)
+        exercise_dir = os.path.join(exercises_dir, relative_path)
+        if not os.path.isdir(exercise_dir):
+            print(f"# Skipped {relative_path}: not found in {exercises_dir}", file=sys.stderr)
+            continue
+        if not os.path.isfile(os.path.join(recorded_test_dir, CHAT_HISTORY_FILE_NAME)):
+            print(f"# Skipped {relative_path}: no {CHAT_HISTORY_FILE_NAME} to replay", file=sys.stderr)
+            continue
+        jobs.append((recorded_test_dir, exercise_dir, os.path.join(replay_run_dir, relative_path), timeout))
+    if workers == 1 or len(jobs) < 2:
+        return [_replay_test_args(job) for job in jobs]
+    # Separate processes also keep the editor's state isolated between tests
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_replay_test_args, jobs))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recorded_run_dir", help="Path to the recorded benchmark run")
+    parser.add_argument("exercises_dir", help="Path to the original exercises (e.g. tmp.benchmarks/refactor-benchmark)")
+    parser.add_argument("replay_run_dir", help="Path to the replay run dir to create")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of worker processes (default: CPU count; 1: sequential)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="Seconds allowed for each unit test file (default: 60)"
+    )
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.timeout <= 0:
+        parser.error("--timeout must be positive")
+    try:
+        import cedarscript_editor  # noqa: F401
+    except ImportError:
+        parser.error("the replay needs the `cedarscript-editor` package: pip install cedarscript-editor")
+    replayed_tests = replay_benchmark_run(
+        args.recorded_run_dir, args.exercises_dir, args.replay_run_dir, workers=args.workers, timeout=args.timeout
+    )
+    pass_count = sum(1 for test in replayed_tests if True in test.tests_outcomes)
+    print(f"# Replayed {len(replayed_tests)} tests into {args.replay_run_dir}: {pass_count} passed")
+    print(f"# Compare with: benchmark_diff_analysis.py {args.recorded_run_dir} {args.replay_run_dir}")
@@ -0,0 +1,156 @@
+"""
+Structured (machine-readable) comparison of two benchmark runs.
+`BenchmarkComparison` holds the whole comparison for library use, while `write_comparison` streams per-test rows as
+JSON, CSV or NDJSON while they are computed, for dashboards and metrics stores.
+"""
+import csv
+import json
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any, NamedTuple, TextIO
+
+from benchmark_columns import BenchmarkColumns, RunTotals, TestChanges, get_test_change
+from benchmark_matrix import classify_test_change
+
+OUTPUT_FORMATS = ('text', 'json', 'csv', 'ndjson')
+DELTA_METRICS = ('sent_tokens', 'received_tokens', 'cost', 'duration')
+
+
+class TestDelta(NamedTuple):
+    """How a single test changed between two runs. Values of a run are None if the test isn't in it."""
+    name: str
+    category: str
+    change: str
+    failed_attempt_count_1: int | None
+    failed_attempt_count_2: int | None
+    sent_tokens_1: int | None
+    sent_tokens_2: int | None
+    received_tokens_1: int | None
+    received_tokens_2: int | None
+    cost_1: float | None
+    cost_2: float | None
+    duration_1: float | None
+    duration_2: float | None
+
+
+def iter_test_deltas(run_1: BenchmarkColumns, run_2: BenchmarkColumns) -> Iterator[TestDelta]:
+    """Yield the delta of every test in either run, sorted by test name, computing each one on demand."""
+    columns_1, columns_2 = run_1.columns, run_2.columns
+    for test_name in sorted(run_1.index.keys() | run_2.index.keys()):
+        i_1 = run_1.index.get(test_name)
+        i_2 = run_2.index.get(test_name)
+        values = {}
+        for metric in ('failed_attempt_count',) + DELTA_METRICS:
+            values[f"{metric}_1"] = None if i_1 is None else columns_1[metric][i_1]
+            values[f"{metric}_2"] = None if i_2 is None else columns_2[metric][i_2]
+        count_1, count_2 = values['failed_attempt_count_1'], values['failed_attempt_count_2']
+        yield TestDelta(
+            name=test_name,
+            category=classify_test_change(count_1, count_2),
+            change=get_test_change(count_1, count_2),
+            **values
+        )
+
+
+def _totals_to_dict(totals: RunTotals) -> dict[str, Any]:
+    result = totals._asdict()
+    result['attempt_counts'] = {str(k): v for k, v in sorted(totals.attempt_counts.items())}
+    return result
+
+
+def get_aggregate_metrics(totals_1: RunTotals, totals_2: RunTotals) -> dict[str, Any]:
+    """Totals of both runs, plus the absolute and percent delta of every numeric total."""
+    deltas = {}
+    for field in RunTotals._fields:
+        value_1, value_2 = getattr(totals_1, field), getattr(totals_2, field)
+        if isinstance(value_1, (int, float)):
+            deltas[field] = {
+                'delta': value_2 - value_1,
+                'percent': (value_2 - value_1) * 100 / value_1 if value_1 else None,
+            }
+    return {'run_1': _totals_to_dict(totals_1), 'run_2': _totals_to_dict(totals_2), 'deltas': deltas}
+
+
+def _get_run_info(run: BenchmarkColumns, run_name: str) -> dict[str, str]:
+    return {
+        'name': run_name,
+        'model': run.columns['model'][0] if run else 'N/A',
+        'edit_format': run.columns['edit_format'][0] if run else 'N/A',
+    }
+
+
+@dataclass
+class BenchmarkComparison:
+    run_1: dict[str, str]
+    run_2: dict[str, str]
+    categories: TestChanges
+    tests: list[TestDelta]
+    metrics: dict[str, Any]
+
+    @classmethod
+    def from_runs(
+            cls, run_1: BenchmarkColumns, run_2: BenchmarkColumns, run_name_1: str, run_name_2: str
+    ) -> 'BenchmarkComparison':
+        tests = list(iter_test_deltas(run_1, run_2))
+        categories = TestChanges(*([] for _ in TestChanges._fields))
+        for test in tests:
+            getattr(categories, test.change).append(test.name)
+        return cls(
+            run_1=_get_run_info(run_1, run_name_1),
+            run_2=_get_run_info(run_2, run_name_2),
+            categories=categories,
+            tests=tests,
+            metrics=get_aggregate_metrics(run_1.totals(), run_2.totals()),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'run_1': self.run_1,
+            'run_2': self.run_2,
+            'categories': self.categories._asdict(),
+            'tests': [test._asdict() for test in self.tests],
+            'metrics': self.metrics,
+        }
+
+
+def write_comparison(
+        run_1: BenchmarkColumns, run_2: BenchmarkColumns, run_name_1: str, run_name_2: str,
+        output_format: str, out: TextIO = sys.stdout
+) -> None:
+    """
+    Stream a comparison of two runs in a machine-readable format.
+
+    Args:
+    output_format (str): One of:
+        - `ndjson`: a `run` line for each run, one `test` line per test, then a `metrics` line
+        - `json`: a single object shaped like `BenchmarkComparison.to_dict()`
+        - `csv`: a header and one row per test (aggregate metrics are only available in the other formats)
+
+    Per-test rows are written as soon as they are computed; only the aggregates (and, for `json`, the test names
+    per category) are kept until the end.
+    """
+    run_info_1, run_info_2 = _get_run_info(run_1, run_name_1), _get_run_info(run_2, run_name_2)
+    test_deltas = iter_test_deltas(run_1, run_2)
+    match output_format:
+        case 'ndjson':
+            for run_index, run_info in ((1, run_info_1), (2, run_info_2)):
+                out.write(json.dumps({'type': 'run', 'run': run_index, **run_info}) + '\n')
+            for test in test_deltas:
+                out.write(json.dumps({'type': 'test', **test._asdict()}) + '\n')
+            metrics = get_aggregate_metrics(run_1.totals(), run_2.totals())
+            out.write(json.dumps({'type': 'metrics', **metrics}) + '\n')
+        case 'json':
+            categories = TestChanges(*([] for _ in TestChanges._fields))
+            out.write(f'{{"run_1": {json.dumps(run_info_1)}, "run_2": {json.dumps(run_info_2)}, "tests": [')
+            for i, test in enumerate(test_deltas):
+                getattr(categories, test.change).append(test.name)
+                out.write(('\n' if i == 0 else ',\n') + json.dumps(test._asdict()))
+            metrics = get_aggregate_metrics(run_1.totals(), run_2.totals())
+            out.write(f'\n], "categories": {json.dumps(categories._asdict())}, "metrics": {json.dumps(metrics)}}}\n')
+        case 'csv':
+            writer = csv.writer(out)
+            writer.writerow(TestDelta._fields)
+            writer.writerows(test_deltas)
+        case _:
+            raise ValueError(f"Unsupported output format: {output_format}")
@@ -0,0 +1,187 @@
+"""
+Statistics over paired benchmark results.
+Bootstrap resampling of the tests present in both runs gives confidence intervals for the pass rate, token, cost and
+duration deltas, telling a real change apart from noise.
+NumPy is used when installed (thousands of resamples take well under a second); otherwise a pure-Python fallback
+computes the same statistics, only slower.
+"""
+import math
+import random
+from bisect import bisect_right
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from benchmark_columns import BenchmarkColumns
+
+# (metric, label): pass_rate deltas are in percentage points, the other ones are percent changes of the total
+PAIRED_METRICS = (
+    ('pass_rate', 'PASS RATE        '),
+    ('sent_tokens', 'TOKENS SENT      '),
+    ('received_tokens', 'TOKENS RECEIVED  '),
+    ('cost', 'COST             '),
+    ('duration', 'DURATION         '),
+)
+PERCENTILES = (50, 90, 95, 99)
+# Upper bound for the number of cells drawn per NumPy batch, to keep memory bounded on large runs
+_MAX_BATCH_CELLS = 2_000_000
+
+
+class ConfidenceInterval(NamedTuple):
+    metric: str
+    observed: float
+    low: float
+    high: float
+
+    @property
+    def significant(self) -> bool:
+        """True if the interval doesn't include 0"""
+        return self.low > 0 or self.high < 0
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Percentile of already sorted values, using linear interpolation between the closest ranks (NumPy's default).
+
+    Args:
+    sorted_values (Sequence[float]): Values sorted in ascending order.
+    q (float): Percentile, between 0 and 100.
+    """
+    if not sorted_values:
+        return math.nan
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class Distribution(NamedTuple):
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+    max: float
+
+
+def get_distribution(values: Iterable[float]) -> Distribution:
+    """Percentiles (see `PERCENTILES`) and maximum of per-test values (all NaN if there are no values)."""
+    sorted_values = sorted(values)
+    return Distribution(
+        *(percentile(sorted_values, q) for q in PERCENTILES),
+        max=sorted_values[-1] if sorted_values else math.nan
+    )
+
+
+def get_histogram(values: Iterable[float], low: float, high: float, bins: int = 10) -> list[int]:
+    """
+    Count values into `bins` equal-width bins spanning [low, high]. The last bin also includes `high`.
+    """
+    width = (high - low) / bins
+    if width <= 0:
+        return [sum(1 for _ in values)] + [0] * (bins - 1)
+    edges = [low + width * i for i in range(1, bins)]
+    counts = [0] * bins
+    for value in values:
+        counts[bisect_right(edges, value)] += 1
+    return counts
+
+
+def get_paired_samples(
+        run_1: BenchmarkColumns, run_2: BenchmarkColumns, test_names: Sequence[str]
+) -> tuple[dict[str, list[float]], dict[str, list[float]]]:
+    """
+    Per-test values of each paired metric, for tests present in both runs (same order in both runs).
+    The `pass_rate` sample holds 1 for a passed test and 0 for a failed one.
+    """
+    samples = []
+    for run in (run_1, run_2):
+        rows = [run.index[name] for name in test_names]
+        columns = run.columns
+        run_samples = {'pass_rate': [1 if columns['failed_attempt_count'][i] >= 0 else 0 for i in rows]}
+        for metric, _ in PAIRED_METRICS[1:]:
+            run_samples[metric] = [columns[metric][i] for i in rows]
+        samples.append(run_samples)
+    return samples[0], samples[1]
+
+
+def _get_statistic(metric: str, total_1: float, total_2: float, n: int) -> float:
+    if metric == 'pass_rate':
+        return (total_2 - total_1) * 100 / n
+    return (total_2 - total_1) * 100 / total_1 if total_1 else math.nan
+
+
+def _bootstrap_numpy(samples_1, samples_2, metrics, n, resamples, seed) -> list[list[float]]:
+    rng = np.random.default_rng(seed)
+    values_1 = {metric: np.asarray(samples_1[metric], dtype=float) for metric in metrics}
+    values_2 = {metric: np.asarray(samples_2[metric], dtype=float) for metric in metrics}
+    statistics = np.empty((len(metrics), resamples))
+    batch_size = max(1, _MAX_BATCH_CELLS // n)
+    for start in range(0, resamples, batch_size):
+        end = min(start + batch_size, resamples)
+        # The same test indexes are used for every metric, keeping the resamples paired
+        indexes = rng.integers(0, n, size=(end - start, n))
+        for k, metric in enumerate(metrics):
+            total_1 = values_1[metric][indexes].sum(axis=1)
+            total_2 = values_2[metric][indexes].sum(axis=1)
+            if metric == 'pass_rate':
+                statistics[k, start:end] = (total_2 - total_1) * 100 / n
+            else:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    statistics[k, start:end] = np.where(total_1 != 0, (total_2 - total_1) * 100 / total_1, np.nan)
+    return [sorted(row[~np.isnan(row)].tolist()) for row in statistics]
+
+
+def _bootstrap_python(samples_1, samples_2, metrics, n, resamples, seed) -> list[list[float]]:
+    rng = random.Random(seed)
+    population = range(n)
+    statistics = [[] for _ in metrics]
+    for _ in range(resamples):
+        indexes = rng.choices(population, k=n)
+        for k, metric in enumerate(metrics):
+            values_1, values_2 = samples_1[metric], samples_2[metric]
+            statistic = _get_statistic(
+                metric, sum(values_1[i] for i in indexes), sum(values_2[i] for i in indexes), n
+            )
+            if not math.isnan(statistic):
+                statistics[k].append(statistic)
+    return [sorted(row) for row in statistics]
+
+
+def bootstrap_paired_deltas(
+        samples_1: dict[str, Sequence[float]], samples_2: dict[str, Sequence[float]],
+        resamples: int = 10_000, confidence: float = 0.95, seed: int | None = None
+) -> list[ConfidenceInterval]:
+    """
+    Compute percentile bootstrap confidence intervals for the change of each paired metric.
+
+    Args:
+    samples_1 (dict[str, Sequence[float]]): Per-test values of each metric in the first run (see `get_paired_samples`).
+    samples_2 (dict[str, Sequence[float]]): Per-test values of each metric in the second run, in the same test order.
+    resamples (int): Number of bootstrap resamples.
+    confidence (float): Confidence level of the intervals.
+    seed (int | None): Seed for reproducible resampling.
+
+    Returns:
+    list[ConfidenceInterval]: One interval per metric. `pass_rate` is a delta in percentage points; the other ones
+    are percent changes of the metric total.
+    """
+    metrics = [metric for metric, _ in PAIRED_METRICS]
+    n = len(samples_1[metrics[0]])
+    if n == 0:
+        return [ConfidenceInterval(metric, math.nan, math.nan, math.nan) for metric in metrics]
+    bootstrap = _bootstrap_numpy if np is not None else _bootstrap_python
+    statistics = bootstrap(samples_1, samples_2, metrics, n, resamples, seed)
+    tail = (1 - confidence) * 100 / 2
+    return [
+        ConfidenceInterval(
+            metric=metric,
+            observed=_get_statistic(metric, sum(samples_1[metric]), sum(samples_2[metric]), n),
+            low=percentile(metric_statistics, tail),
+            high=percentile(metric_statistics, 100 - tail),
+        )
+        for metric, metric_statistics in zip(metrics, statistics)
+    ]
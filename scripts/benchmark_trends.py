@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Append-only trend store of benchmark run summaries, and regression detection against a rolling baseline.
+
+Each run is summarized with the totals `benchmark-test-info.sh` prints on its `# duration_s, test_pass_count, ...` line,
+and appended as one JSON line to the store (`benchmark-trends.ndjson` by default). Lines are never rewritten: when a
+run is recorded again, its latest line wins.
+
+`check` compares a run against the previous runs of the same model and edit format (the rolling baseline):
+- pass rate: one-sided two-proportion z-test of the run against the pooled baseline tests
+- tokens, cost and duration per test: z-score of the run against the mean and standard deviation of the baseline runs
+It exits with status 1 if any metric regressed, so it can gate a CI job.
+"""
+import json
+import math
+import os
+import re
+import sys
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from statistics import NormalDist, mean, stdev
+from typing import Any, NamedTuple
+
+from benchmark_archive import TAR_SUFFIXES, ZIP_SUFFIXES, is_benchmark_archive, parse_benchmark_archive
+from benchmark_cache import parse_benchmark_run_cached
+from benchmark_columns import BenchmarkColumns
+
+DEFAULT_STORE_PATH = 'benchmark-trends.ndjson'
+# Run dirs made by aider's benchmark.py start with their creation time
+_RUN_DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2})--")
+# (metric, label): per-test averages where higher is worse
+PER_TEST_METRICS = (
+    ('sent_tokens', 'TOKENS SENT / TEST    '),
+    ('received_tokens', 'TOKENS RECEIVED / TEST'),
+    ('cost', 'COST / TEST           '),
+    ('duration', 'DURATION / TEST       '),
+)
+
+
+def get_run_date(run_name: str) -> str | None:
+    """Creation time of a run, from the `YYYY-MM-DD-HH-MM-SS--` prefix of its dir name (None if absent)."""
+    match = _RUN_DATE_RE.match(run_name)
+    return match.group(1) if match else None
+
+
+def get_record_time(record: dict[str, Any]) -> datetime:
+    """
+    When a recorded run was made, in UTC: its run date (local time) if its dir name has one, else when it was recorded.
+    """
+    if record.get('run_date'):
+        # A naive datetime is taken as local time by `astimezone`
+        return datetime.strptime(record['run_date'], '%Y-%m-%d-%H-%M-%S').astimezone(timezone.utc)
+    return datetime.fromisoformat(record['recorded_at'])
+
+
+def summarize_run(benchmark_dir: str, threads: int | None = None) -> dict[str, Any]:
+    """Summarize a benchmark run (a run dir or an archive of it) as a trend store record."""
+    run_name = os.path.basename(os.path.normpath(benchmark_dir))
+    if is_benchmark_archive(benchmark_dir):
+        run = BenchmarkColumns(parse_benchmark_archive(benchmark_dir))
+        suffix = next(s for s in TAR_SUFFIXES + ZIP_SUFFIXES if run_name.lower().endswith(s))
+        run_name = run_name[:-len(suffix)]
+    else:
+        run = BenchmarkColumns(parse_benchmark_run_cached(benchmark_dir, threads=threads))
+    totals = run.totals()._asdict()
+    totals['attempt_counts'] = {str(k): v for k, v in sorted(totals['attempt_counts'].items())}
+    return {
+        'run_name': run_name,
+        'run_date': get_run_date(run_name),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'model': run.columns['model'][0] if run else None,
+        'edit_format': run.columns['edit_format'][0] if run else None,
+        **totals,
+    }
+
+
+def append_records(store_path: str, records: list[dict[str, Any]]) -> None:
+    """Append records to the trend store, one JSON object per line."""
+    with open(store_path, 'a', encoding='utf-8') as store:
+        for record in records:
+            store.write(json.dumps(record) + '\n')
+
+
+def iter_records(store_path: str) -> Iterator[dict[str, Any]]:
+    """
+    Yield the records of the trend store, ordered by run date (then by when they were recorded).
+    Only the latest record of each run is kept. A missing store has no records.
+    """
+    latest = {}
+    try:
+        with open(store_path, encoding='utf-8') as store:
+            for line in store:
+                if line.strip():
+                    record = json.loads(line)
+                    latest[record['run_name']] = record
+    except FileNotFoundError:
+        return
+    yield from sorted(
+        latest.values(), key=lambda r: (get_record_time(r), datetime.fromisoformat(r['recorded_at']))
+    )
+
+
+class Regression(NamedTuple):
+    metric: str
+    value: float
+    baseline: float
+    z_score: float
+    p_value: float
+    regressed: bool
+
+
+def check_pass_rate(record: dict[str, Any], baseline: list[dict[str, Any]], alpha: float) -> Regression:
+    """One-sided two-proportion z-test: is the run's pass rate lower than the pooled baseline pass rate?"""
+    passes, tests = record['pass_count'], record['test_count']
+    baseline_passes = sum(r['pass_count'] for r in baseline)
+    baseline_tests = sum(r['test_count'] for r in baseline)
+    rate = passes / tests if tests else math.nan
+    baseline_rate = baseline_passes / baseline_tests if baseline_tests else math.nan
+    pooled = (passes + baseline_passes) / (tests + baseline_tests) if tests + baseline_tests else math.nan
+    if not tests or not baseline_tests or pooled in (0, 1):
+        return Regression('pass_rate', rate, baseline_rate, 0.0, 1.0, False)
+    standard_error = math.sqrt(pooled * (1 - pooled) * (1 / tests + 1 / baseline_tests))
+    if not standard_error:
+        return Regression('pass_rate', rate, baseline_rate, 0.0, 1.0, False)
+    z_score = (rate - baseline_rate) / standard_error
+    p_value = NormalDist().cdf(z_score)
+    return Regression('pass_rate', rate, baseline_rate, z_score, p_value, p_value < alpha)
+
+
+def check_per_test_metric(
+        metric: str, record: dict[str, Any], baseline: list[dict[str, Any]], alpha: float, min_change: float
+) -> Regression:
+    """
+    Z-score of the run's per-test average against the baseline runs' per-test averages (higher is worse).
+    A regression also needs a relative increase of at least `min_change`, so a very stable baseline doesn't flag noise.
+    The spread of a single baseline run is unknown, so at least 2 are needed.
+    """
+    def per_test(r: dict[str, Any]) -> float:
+        return r[metric] / r['test_count'] if r['test_count'] else math.nan
+
+    value = per_test(record)
+    baseline_values = [v for v in map(per_test, baseline) if not math.isnan(v)]
+    if not baseline_values or math.isnan(value):
+        return Regression(metric, value, math.nan, 0.0, 1.0, False)
+    baseline_mean = mean(baseline_values)
+    if len(baseline_values) < 2:
+        return Regression(metric, value, baseline_mean, math.nan, math.nan, False)
+    baseline_stdev = stdev(baseline_values)
+    relative_change = (value - baseline_mean) / baseline_mean if baseline_mean else 0.0
+    if baseline_stdev:
+        z_score = (value - baseline_mean) / baseline_stdev
+        p_value = 1 - NormalDist().cdf(z_score)
+    else:
+        z_score = math.inf if value > baseline_mean else 0.0
+        p_value = 0.0 if value > baseline_mean else 1.0
+    regressed = p_value < alpha and relative_change >= min_change
+    return Regression(metric, value, baseline_mean, z_score, p_value, regressed)
+
+
+def get_baseline(
+        records: list[dict[str, Any]], record: dict[str, Any], window: int
+) -> list[dict[str, Any]]:
+    """The last `window` runs before `record` with the same model and edit format."""
+    record_time = get_record_time(record)
+    candidates = [
+        r for r in records
+        if r['run_name'] != record['run_name']
+        and r['model'] == record['model'] and r['edit_format'] == record['edit_format']
+        and get_record_time(r) <= record_time
+    ]
+    return candidates[-window:]
+
+
+def check_regressions(
+        record: dict[str, Any], baseline: list[dict[str, Any]], alpha: float = 0.05, min_change: float = 0.05
+) -> list[Regression]:
+    """Check the pass rate and each per-test metric of a run against its baseline."""
+    return [check_pass_rate(record, baseline, alpha)] + [
+        check_per_test_metric(metric, record, baseline, alpha, min_change) for metric, _ in PER_TEST_METRICS
+    ]
+
+
+def print_trend(records: list[dict[str, Any]]) -> None:
+    print("# run_date            pass  tests   rate  sent/test  recv/test  cost/test  s/test  run")
+    for r in records:
+        test_count = r['test_count'] or 1
+        print(
+            f"# {r.get('run_date') or r['recorded_at'][:19]:19s} {r['pass_count']:5d} {r['test_count']:6d}"
+            f" {r['pass_count'] * 100 / test_count:5.1f}% {r['sent_tokens'] / test_count:10,.0f}"
+            f" {r['received_tokens'] / test_count:10,.0f} {r['cost'] / test_count:10.4f}"
+            f" {r['duration'] / test_count:7.1f}  {r['run_name']}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--store", default=DEFAULT_STORE_PATH, help=f"Path to the trend store (default: {DEFAULT_STORE_PATH})"
+    )
+    parser.add_argument("--threads", type=int, default=None, help="Size of the thread pool used to read test files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="Summarize runs and append them to the store")
+    add_parser.add_argument("benchmark_dirs", nargs='+', metavar="benchmark_dir")
+    show_parser = commands.add_parser("show", help="Print the recorded runs, oldest first")
+    show_parser.add_argument("--model", help="Only show runs of this model")
+    show_parser.add_argument("--edit-format", help="Only show runs of this edit format")
+    check_parser = commands.add_parser(
+        "check", help="Check a run against the rolling baseline of its model and edit format (exit 1 on regression)"
+    )
+    check_parser.add_argument("benchmark_dir")
+    check_parser.add_argument(
+        "--window", type=int, default=5, help="Number of previous runs in the baseline (default: 5)"
+    )
+    check_parser.add_argument(
+        "--alpha", type=float, default=0.05, help="One-sided significance level (default: 0.05)"
+    )
+    check_parser.add_argument(
+        "--min-change", type=float, default=0.05,
+        help="Minimum relative increase of a per-test metric to count as a regression (default: 0.05)"
+    )
+    check_parser.add_argument("--record", action="store_true", help="Also append the run to the store")
+    args = parser.parse_args()
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+
+    if args.command == 'add':
+        new_records = [summarize_run(benchmark_dir, args.threads) for benchmark_dir in args.benchmark_dirs]
+        for benchmark_dir, new_record in zip(args.benchmark_dirs, new_records):
+            if not new_record['test_count']:
+                parser.error(f"{benchmark_dir}: no tests found; an empty run can't be recorded")
+        append_records(args.store, new_records)
+        print_trend(new_records)
+    elif args.command == 'show':
+        print_trend([
+            r for r in iter_records(args.store)
+            if (args.model is None or r['model'] == args.model)
+            and (args.edit_format is None or r['edit_format'] == args.edit_format)
+        ])
+    else:
+        run_record = summarize_run(args.benchmark_dir, args.threads)
+        if not run_record['test_count']:
+            parser.error(f"{args.benchmark_dir}: no tests found; an empty run can't be checked or recorded")
+        baseline_records = get_baseline(list(iter_records(args.store)), run_record, args.window)
+        if args.record:
+            append_records(args.store, [run_record])
+        print(f"# {run_record['run_name']} ({run_record['model']}, {run_record['edit_format']})")
+        if not baseline_records:
+            print("# No baseline: no previous run of the same model and edit format in the store")
+            sys.exit(0)
+        print(
+            f"# Baseline: {len(baseline_records)} previous runs,"
+            f" {baseline_records[0]['run_name']} .. {baseline_records[-1]['run_name']}"
+        )
+        labels = dict(PER_TEST_METRICS, pass_rate='PASS RATE             ')
+        results = check_regressions(run_record, baseline_records, args.alpha, args.min_change)
+        for result in results:
+            value_format = '.1%' if result.metric == 'pass_rate' else ',.4f'
+            if math.isnan(result.z_score):
+                # The spread of a single baseline run is unknown (see `check_per_test_metric`)
+                test = "n/a (needs ≥2 baseline runs)"
+            else:
+                test = f"z {result.z_score:+6.2f} p {result.p_value:.4f}{'  REGRESSION' if result.regressed else ''}"
+            print(
+                f"# {labels[result.metric]}: {result.value:{value_format}} (baseline {result.baseline:{value_format}})"
+                f" {test}"
+            )
+        sys.exit(1 if any(result.regressed for result in results) else 0)
@@ -0,0 +1,155 @@
+"""
+Live comparison of a benchmark run that is still executing against a finished baseline run.
+The run dir is polled for new or changed `.aider.results.json` files; each test is compared against the baseline as
+soon as it lands, so a regressing prompt change shows up long before the run finishes.
+"""
+import json
+import os
+import time
+from collections import Counter
+
+from benchmark_cache import get_test_signature
+from benchmark_columns import BenchmarkColumns
+from benchmark_matrix import IMPROVED, ONLY_2, STABLE, WORSENED, classify_test_change
+from benchmark_parser import RESULTS_FILE_NAME, AiderTestResult, parse_test_results
+
+
+class RunWatcher:
+    """Polls a benchmark run dir, returning the tests whose results file is new or changed since the last poll."""
+
+    def __init__(self, benchmark_dir: str):
+        self.benchmark_dir = benchmark_dir
+        self.signatures: dict[str, tuple[int, int, int, int]] = {}
+
+    def _find_results_files(self) -> list[str]:
+        results_files = []
+        for dir_path, dir_names, file_names in os.walk(self.benchmark_dir):
+            if RESULTS_FILE_NAME in file_names:
+                results_files.append(os.path.join(dir_path, RESULTS_FILE_NAME))
+                # Results files aren't nested inside test dirs, so don't walk the exercise files
+                dir_names.clear()
+        return sorted(results_files)
+
+    def poll(self) -> list[AiderTestResult]:
+        """
+        Parse the tests that finished (or were re-run) since the last poll.
+        Results files that can't be parsed yet (e.g. still being written) are retried on the next poll.
+        """
+        results = []
+        for results_file in self._find_results_files():
+            signature = get_test_signature(results_file)
+            if self.signatures.get(results_file) == signature:
+                continue
+            try:
+                results.append(parse_test_results(results_file))
+            except (json.JSONDecodeError, OSError):
+                continue
+            self.signatures[results_file] = signature
+        return results
+
+
+def _get_change_marker(baseline_test: AiderTestResult | None, test: AiderTestResult) -> str:
+    category = classify_test_change(
+        None if baseline_test is None else baseline_test.failed_attempt_count, test.failed_attempt_count
+    )
+    passed = test.failed_attempt_count >= 0
+    if category == ONLY_2:
+        return '>+' if passed else '>-'
+    if category == IMPROVED:
+        return '++' if baseline_test.failed_attempt_count < 0 else '+ '
+    if category == WORSENED:
+        return '- ' if passed else '--'
+    return '=+' if passed else '=-'
+
+
+def _format_percent_change(value: float, baseline_value: float) -> str:
+    return f"{(value - baseline_value) * 100 / baseline_value:+4.0f}%" if baseline_value else ' N/A'
+
+
+_SUMMARY_METRICS = (('sent', 'sent_tokens'), ('received', 'received_tokens'), ('cost', 'cost'), ('duration', 'duration'))
+
+
+class LiveComparison:
+    """
+    Comparison of the tests seen so far against a baseline run.
+    Running counters are updated per test (a re-run test replaces its previous result), so each update costs O(1).
+    """
+
+    def __init__(self, baseline: BenchmarkColumns):
+        self.baseline = baseline
+        self.tests: dict[str, AiderTestResult] = {}
+        self.counters = Counter()
+
+    def _count(self, test: AiderTestResult, sign: int) -> None:
+        baseline_test = self.baseline.get(test.name)
+        baseline_count = None if baseline_test is None else baseline_test.failed_attempt_count
+        counters = self.counters
+        counters[classify_test_change(baseline_count, test.failed_attempt_count)] += sign
+        counters['pass'] += sign * (test.failed_attempt_count >= 0)
+        if baseline_test is None:
+            return
+        counters['baseline_pass'] += sign * (baseline_count >= 0)
+        counters['now_pass'] += sign * (baseline_count < 0 <= test.failed_attempt_count)
+        counters['now_fail'] += sign * (test.failed_attempt_count < 0 <= baseline_count)
+        for _, field in _SUMMARY_METRICS:
+            counters[field] += sign * getattr(test, field)
+            counters[f"baseline_{field}"] += sign * getattr(baseline_test, field)
+
+    def update(self, test: AiderTestResult) -> str:
+        """Record a finished test and return its diff line."""
+        previous = self.tests.get(test.name)
+        if previous is not None:
+            self._count(previous, -1)
+        self.tests[test.name] = test
+        self._count(test, 1)
+        baseline_test = self.baseline.get(test.name)
+        baseline_count = 'N/A' if baseline_test is None else baseline_test.failed_attempt_count
+        return f"{_get_change_marker(baseline_test, test)} [{baseline_count} -> {test.failed_attempt_count}] {test.name}"
+
+    def summary(self) -> str:
+        """One-line summary of the comparison so far. Metric deltas only consider tests present in both runs."""
+        counters = self.counters
+        metric_changes = ' '.join(
+            f"{label} {_format_percent_change(counters[field], counters[f'baseline_{field}'])}"
+            for label, field in _SUMMARY_METRICS
+        )
+        return (
+            f"# [{len(self.tests):4d} / {len(self.baseline)} done]"
+            f" PASS {counters['pass']:4d} (baseline {counters['baseline_pass']:4d})"
+            f" | +{counters[IMPROVED]} -{counters[WORSENED]} ={counters[STABLE]} >{counters[ONLY_2]}"
+            f" | ∂nowPASS-FAIL: {counters['now_pass'] - counters['now_fail']:+d} | {metric_changes}"
+        )
+
+
+def watch_benchmark_run(
+        baseline: BenchmarkColumns, benchmark_dir: str, interval: float = 5.0, idle_timeout: float | None = None
+) -> LiveComparison:
+    """
+    Poll a running benchmark and print each test's change against the baseline as soon as it lands.
+
+    Args:
+    baseline (BenchmarkColumns): The parsed baseline run.
+    benchmark_dir (str): Path to the benchmark run that is still executing.
+    interval (float): Seconds between polls.
+    idle_timeout (float | None): Stop after this many seconds without new results (None: run until interrupted).
+
+    Returns:
+    LiveComparison: The comparison as of the last poll
+    """
+    watcher = RunWatcher(benchmark_dir)
+    comparison = LiveComparison(baseline)
+    last_update = time.monotonic()
+    try:
+        while True:
+            new_results = watcher.poll()
+            for test in new_results:
+                print(comparison.update(test))
+            if new_results:
+                print(comparison.summary(), flush=True)
+                last_update = time.monotonic()
+            elif idle_timeout is not None and time.monotonic() - last_update >= idle_timeout:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return comparison
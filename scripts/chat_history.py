@@ -0,0 +1,291 @@
+"""
+Streaming scanner for aider's `.aider.chat.history.md` files.
+The history is memory-mapped and searched with compiled byte regexes, so even multi-hundred-MB histories are never
+loaded into memory as a whole.
+"""
+import mmap
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, NamedTuple
+
+# A `> Tokens:` line, as in: "> Tokens: 10k sent, 2.0k cache write, 8.0k cache hit, 345 received. Cost: ..."
+_TOKENS_LINE_RE = re.compile(rb"^> tokens:[^\n]*", re.MULTILINE | re.IGNORECASE)
+_TOKEN_COUNT_RE = re.compile(rb"([\d.,]+)([km]?)\s+(sent|received|cache write|cache hit)\b", re.IGNORECASE)
+_TOKEN_SUFFIX_MULTIPLIERS = {b'': 1, b'k': 1_000, b'm': 1_000_000}
+
+
+class TokenUsage(NamedTuple):
+    """Token counts of a single LLM request, as reported by one `> Tokens:` line."""
+    sent: int
+    received: int
+    cache_write: int = 0
+    cache_hit: int = 0
+
+
+def parse_token_count(number: bytes, suffix: bytes = b'') -> int:
+    """
+    Convert a token count as printed by aider (`1,234`, `345`, `2.1k`, `1.2m`) to an integer.
+    Decimal arithmetic is used, so `2.1k` becomes exactly 2100. Aider itself rounds large counts when printing them
+    with a suffix, which no parser can undo.
+    """
+    try:
+        value = Decimal(number.replace(b',', b'').decode('ascii'))
+    except InvalidOperation:
+        return 0
+    return int(value * _TOKEN_SUFFIX_MULTIPLIERS[suffix.lower()])
+
+
+def parse_tokens_line(line: bytes) -> TokenUsage:
+    """Parse the counts of a `> Tokens:` line. Counts missing from the line are 0."""
+    counts = {b'sent': 0, b'received': 0, b'cache write': 0, b'cache hit': 0}
+    for number, suffix, kind in _TOKEN_COUNT_RE.findall(line):
+        counts[kind.lower()] += parse_token_count(number, suffix)
+    return TokenUsage(counts[b'sent'], counts[b'received'], counts[b'cache write'], counts[b'cache hit'])
+
+
+def iter_token_usage(buffer: bytes | mmap.mmap) -> Iterator[TokenUsage]:
+    """Yield the token counts of every `> Tokens:` line in a chat history buffer, in order."""
+    for line in _TOKENS_LINE_RE.finditer(buffer):
+        yield parse_tokens_line(line.group())
+
+
+@contextmanager
+def map_chat_history(chat_history_path: str) -> Iterator[bytes | mmap.mmap]:
+    """
+    Memory-map a chat history file for reading.
+    Yields an empty `bytes` object for empty files, since those can't be mapped.
+    """
+    with open(chat_history_path, 'rb') as chat_history:
+        try:
+            buffer = mmap.mmap(chat_history.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            buffer = None
+        if buffer is None:
+            yield b''
+            return
+        with buffer:
+            yield buffer
+
+
+def scan_token_usage(chat_history_path: str) -> list[TokenUsage]:
+    """
+    Get the token counts of every LLM request recorded in a chat history file.
+
+    Returns:
+    list[TokenUsage]: One entry per `> Tokens:` line, in file order (empty if the file doesn't exist)
+    """
+    try:
+        with map_chat_history(chat_history_path) as buffer:
+            return list(iter_token_usage(buffer))
+    except FileNotFoundError:
+        return []
+
+
+def sum_token_usage(token_usage: list[TokenUsage]) -> TokenUsage:
+    """Add up the token counts of several requests."""
+    return TokenUsage(*(sum(counts) for counts in zip(*token_usage))) if token_usage else TokenUsage(0, 0)
+
+
+# The first line of a user message; aider prefixes every line of a user message with "#### "
+_USER_MESSAGE_LINE_RE = re.compile(rb"^#### ", re.MULTILINE)
+_ERROR_DETAILS_RE = re.compile(rb"<error-details>")
+_EXCEPTION_NAME_RE = re.compile(rb"\b([A-Z]\w*(?:Error|Exception))\b")
+_TIMEOUT_RE = re.compile(rb"timed out", re.IGNORECASE)
+
+EDIT_ERROR = 'edit_error'
+TIMEOUT = 'timeout'
+TEST_FAILURE = 'test_failure'
+UNKNOWN_ERROR = 'unknown'
+
+
+class AttemptRecord(NamedTuple):
+    """
+    What a single attempt of a benchmark test cost.
+    An attempt starts with a user message (the instructions, or the failing test output of the previous attempt).
+    """
+    attempt: int
+    request_count: int
+    sent_tokens: int
+    received_tokens: int
+    cache_hit_tokens: int
+    error_category: str | None
+    estimated_duration: float = 0.0
+    estimated_cost: float = 0.0
+
+
+def split_attempts(buffer: bytes | mmap.mmap) -> list[tuple[int, int]]:
+    """
+    Find the byte range of each attempt in a chat history buffer.
+    Anything before the first user message (the session header) doesn't belong to any attempt.
+    """
+    starts = []
+    for line in _USER_MESSAGE_LINE_RE.finditer(buffer):
+        position = line.start()
+        previous_line_start = buffer.rfind(b'\n', 0, max(position - 1, 0)) + 1
+        if position == 0 or buffer[previous_line_start:previous_line_start + 5] != b'#### ':
+            starts.append(position)
+    return list(zip(starts, starts[1:] + [len(buffer)]))
+
+
+def _get_user_message_end(buffer: bytes | mmap.mmap, start: int, end: int) -> int:
+    position = start
+    while position < end and buffer[position:position + 5] == b'#### ':
+        line_end = buffer.find(b'\n', position, end)
+        position = end if line_end < 0 else line_end + 1
+    return position
+
+
+def get_error_category(failure_message: bytes) -> str:
+    """
+    Categorize a failing test output: `timeout`, the name of the last exception it mentions (e.g. `ImportError`),
+    or `test_failure` if neither is found.
+    """
+    if _TIMEOUT_RE.search(failure_message):
+        return TIMEOUT
+    exception_names = _EXCEPTION_NAME_RE.findall(failure_message)
+    if exception_names:
+        return exception_names[-1].decode('ascii')
+    return TEST_FAILURE
+
+
+def iter_attempts(buffer: bytes | mmap.mmap, tests_outcomes: list[bool] | None = None) -> Iterator[AttemptRecord]:
+    """
+    Split a chat history buffer into attempts, yielding what each one cost and why it failed.
+
+    Args:
+    buffer (bytes | mmap.mmap): The chat history contents.
+    tests_outcomes (list[bool] | None): The test outcome of each attempt, from `.aider.results.json`.
+
+    The error category of a failed attempt is `edit_error` if its edits couldn't be applied (an `<error-details>`
+    block), otherwise the category of the test output sent as the next user message (see `get_error_category`).
+    Attempts that passed have no error category.
+    """
+    tests_outcomes = tests_outcomes or []
+    attempts = split_attempts(buffer)
+    for i, (start, end) in enumerate(attempts):
+        passed = i < len(tests_outcomes) and tests_outcomes[i] is True
+        error_category = None
+        if not passed:
+            if _ERROR_DETAILS_RE.search(buffer, start, end):
+                error_category = EDIT_ERROR
+            elif i + 1 < len(attempts):
+                next_start, next_end = attempts[i + 1]
+                failure_message = buffer[next_start:_get_user_message_end(buffer, next_start, next_end)]
+                error_category = get_error_category(failure_message)
+            else:
+                error_category = UNKNOWN_ERROR
+        token_usage = [parse_tokens_line(line.group()) for line in _TOKENS_LINE_RE.finditer(buffer, start, end)]
+        total = sum_token_usage(token_usage)
+        yield AttemptRecord(
+            attempt=i + 1,
+            request_count=len(token_usage),
+            sent_tokens=total.sent,
+            received_tokens=total.received,
+            cache_hit_tokens=total.cache_hit,
+            error_category=error_category,
+        )
+
+
+def scan_attempts(chat_history_path: str, tests_outcomes: list[bool] | None = None) -> list[AttemptRecord]:
+    """
+    Get the per-attempt breakdown of a chat history file (see `iter_attempts`).
+
+    Returns:
+    list[AttemptRecord]: One record per attempt (empty if the file doesn't exist)
+    """
+    try:
+        with map_chat_history(chat_history_path) as buffer:
+            return list(iter_attempts(buffer, tests_outcomes))
+    except FileNotFoundError:
+        return []
+
+
+def iter_assistant_responses(buffer: bytes | mmap.mmap, start: int = 0, end: int | None = None) -> Iterator[str]:
+    """
+    Yield the text of each assistant response between `start` and `end` (e.g. an attempt, see `split_attempts`).
+    A response is a run of lines that are neither user messages (`#### `) nor tool output (`> `); a reflection
+    (the model answering an edit error within the same attempt) is a separate response.
+    """
+    end = len(buffer) if end is None else end
+    lines = []
+    position = start
+    while position < end:
+        line_end = buffer.find(b'\n', position, end)
+        line_end = end if line_end < 0 else line_end + 1
+        line = buffer[position:line_end]
+        if line.startswith((b'#### ', b'> ')) or line.rstrip(b'\r\n') in (b'####', b'>'):
+            if any(response_line.strip() for response_line in lines):
+                yield b''.join(lines).decode('utf-8', errors='replace')
+            lines = []
+        else:
+            lines.append(line)
+        position = line_end
+    if any(response_line.strip() for response_line in lines):
+        yield b''.join(lines).decode('utf-8', errors='replace')
+
+
+def get_user_message(buffer: bytes | mmap.mmap, start: int, end: int | None = None) -> str:
+    """Get the text of the user message that starts at `start` (e.g. the start of an attempt), without `#### `."""
+    end = len(buffer) if end is None else end
+    message_end = _get_user_message_end(buffer, start, end)
+    lines = buffer[start:message_end].decode('utf-8', errors='replace').splitlines()
+    return '\n'.join(line[5:].rstrip() if line.startswith('#### ') else '' for line in lines).strip()
+
+
+_ERROR_DETAILS_BLOCK_RE = re.compile(rb"<error-details>.*?</error-details>", re.DOTALL)
+_TOOL_OUTPUT_PREFIX_RE = re.compile(rb"^> ?", re.MULTILINE)
+_ERROR_MESSAGE_RE = re.compile(r"<error-message>(.*?)</error-message>", re.DOTALL)
+_EXCEPTION_LINE_RE = re.compile(r"^\s*(?:E\s+)?([A-Z]\w*(?:Error|Exception))\b:?\s*(.*)$", re.MULTILINE)
+_FAILED_TEST_LINE_RE = re.compile(r"^(?:FAILED|ERROR)\b.*$", re.MULTILINE)
+
+
+class ErrorPayload(NamedTuple):
+    """An error reported back to the model: an edit that couldn't be applied, or a failing test output."""
+    attempt: int
+    kind: str
+    message: str
+
+
+def iter_error_payloads(buffer: bytes | mmap.mmap) -> Iterator[ErrorPayload]:
+    """
+    Yield every error payload of a chat history buffer, in order.
+
+    - `<error-details>` blocks (kind `edit_error`), with the `<error-message>` as message when there is one
+    - failing test outputs sent back as user messages, with the kind from `get_error_category` and the exception line
+      (or the first FAILED line) as message. Each of these belongs to the attempt before the one it starts.
+    """
+    for i, (start, end) in enumerate(split_attempts(buffer)):
+        if i > 0:
+            failure_message = get_user_message(buffer, start, end)
+            kind = get_error_category(failure_message.encode('utf-8'))
+            exception_lines = _EXCEPTION_LINE_RE.findall(failure_message)
+            if exception_lines:
+                message = ': '.join(part for part in exception_lines[-1] if part)
+            else:
+                failed_line = _FAILED_TEST_LINE_RE.search(failure_message)
+                message = failed_line.group() if failed_line else failure_message.partition('\n')[0]
+            yield ErrorPayload(i, kind, message.strip())
+        for block in _ERROR_DETAILS_BLOCK_RE.finditer(buffer, start, end):
+            details = _TOOL_OUTPUT_PREFIX_RE.sub(b'', block.group()).decode('utf-8', errors='replace')
+            error_message = _ERROR_MESSAGE_RE.search(details)
+            yield ErrorPayload(i + 1, EDIT_ERROR, (error_message.group(1) if error_message else details).strip())
+
+
+def iter_token_usage_stream(stream: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[TokenUsage]:
+    """
+    Yield the token counts of every `> Tokens:` line read from a binary stream (e.g. an archive member being
+    decompressed), holding at most one chunk plus one partial line in memory.
+    """
+    remainder = b''
+    while chunk := stream.read(chunk_size):
+        buffer = remainder + chunk
+        last_newline = buffer.rfind(b'\n')
+        if last_newline < 0:
+            remainder = buffer
+            continue
+        yield from iter_token_usage(buffer[:last_newline + 1])
+        remainder = buffer[last_newline + 1:]
+    if remainder:
+        yield from iter_token_usage(remainder)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+Cluster the errors of a benchmark run by cause.
+Every error payload (`<error-details>` blocks and failing test outputs, see `iter_error_payloads`) of every chat history
+is normalized into a signature: paths, line numbers, numbers, addresses and quoted names are replaced by placeholders,
+so the same failure in different tests lands in the same cluster.
+
+Signatures are kept in a SQLite index inside the run dir (signature -> tests), and only histories that are new or
+changed since the last call are read again, so re-indexing thousands of histories takes a few stat calls.
+"""
+import os
+import re
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
+
+from benchmark_cache import get_file_signature
+from benchmark_parser import CHAT_HISTORY_FILE_NAME, find_results_files
+from chat_history import ErrorPayload, iter_error_payloads, map_chat_history
+
+INDEX_FILE_NAME = '.failure-clusters.sqlite'
+# Bump whenever extraction or normalization changes, so that indexed signatures get discarded
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS histories (
+    test_name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    test_name TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    signature TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payloads_signature ON payloads (signature);
+CREATE INDEX IF NOT EXISTS payloads_test_name ON payloads (test_name);
+"""
+
+# Applied in order: quoted paths before quoted names, paths before bare numbers
+_NORMALIZATIONS = (
+    (re.compile(r"""(["'])(?:[A-Za-z]:)?[^"'\s]*[/\\][^"'\s]*\1"""), '<path>'),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\w.-]*[/\\])+[\w.-]+"), '<path>'),
+    (re.compile(r"\bline[= ]\d+", re.IGNORECASE), 'line <n>'),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), '<addr>'),
+    (re.compile(r"""(["'`])[^"'`\n]{1,200}?\1"""), '<name>'),
+    (re.compile(r"(?<![\w.])\d+(?:\.\d+)?"), '<n>'),
+    (re.compile(r"\s+"), ' '),
+)
+
+
+def get_signature(payload: ErrorPayload) -> str:
+    """Normalize an error payload into its cluster signature, e.g. `ImportError: cannot import name <name> from ...`"""
+    message = payload.message
+    for pattern, replacement in _NORMALIZATIONS:
+        message = pattern.sub(replacement, message)
+    message = message.strip()
+    return message if message.startswith(payload.kind) else f"{payload.kind}: {message}"
+
+
+def extract_payloads(chat_history_path: str) -> list[ErrorPayload]:
+    try:
+        with map_chat_history(chat_history_path) as buffer:
+            return list(iter_error_payloads(buffer))
+    except FileNotFoundError:
+        return []
+
+
+def open_index(benchmark_dir: str) -> sqlite3.Connection:
+    """
+    Open (or create) the failure index of a run dir. If the run dir isn't writable, an in-memory index is used.
+    """
+    connection = None
+    try:
+        connection = sqlite3.connect(os.path.join(benchmark_dir, INDEX_FILE_NAME))
+        connection.executescript(_SCHEMA)
+    except sqlite3.Error:
+        if connection is not None:
+            connection.close()
+        connection = sqlite3.connect(':memory:')
+        connection.executescript(_SCHEMA)
+    row = connection.execute("SELECT value FROM meta WHERE key = 'index_version'").fetchone()
+    if row is None or row[0] != str(INDEX_VERSION):
+        with connection:
+            connection.execute("DELETE FROM histories")
+            connection.execute("DELETE FROM payloads")
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('index_version', ?)", (str(INDEX_VERSION),)
+            )
+    return connection
+
+
+def update_index(connection: sqlite3.Connection, benchmark_dir: str, threads: int | None = None) -> int:
+    """
+    Bring the index up to date with the run dir: new or changed histories are re-read, removed tests are dropped.
+
+    Returns:
+    int: The number of histories that were (re-)read
+    """
+    histories = {}
+    for results_file in find_results_files(benchmark_dir):
+        test_dir = os.path.dirname(results_file)
+        histories[os.path.basename(test_dir)] = os.path.join(test_dir, CHAT_HISTORY_FILE_NAME)
+    indexed = {
+        test_name: (mtime_ns, size)
+        for test_name, mtime_ns, size in connection.execute("SELECT test_name, mtime_ns, size FROM histories")
+    }
+    signatures = {test_name: get_file_signature(path) for test_name, path in histories.items()}
+    stale = [test_name for test_name, signature in signatures.items() if indexed.get(test_name) != signature]
+    removed = [test_name for test_name in indexed if test_name not in histories]
+
+    paths = [histories[test_name] for test_name in stale]
+    if threads == 1 or len(paths) < 2:
+        payloads = [extract_payloads(path) for path in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            payloads = list(executor.map(extract_payloads, paths))
+
+    with connection:
+        for test_name in stale + removed:
+            connection.execute("DELETE FROM payloads WHERE test_name = ?", (test_name,))
+            connection.execute("DELETE FROM histories WHERE test_name = ?", (test_name,))
+        for test_name, test_payloads in zip(stale, payloads):
+            connection.execute(
+                "INSERT INTO histories (test_name, mtime_ns, size) VALUES (?, ?, ?)",
+                (test_name, *signatures[test_name])
+            )
+            connection.executemany(
+                "INSERT INTO payloads (test_name, attempt, signature, message) VALUES (?, ?, ?, ?)",
+                [(test_name, p.attempt, get_signature(p), p.message) for p in test_payloads]
+            )
+    return len(stale)
+
+
+class FailureCluster(NamedTuple):
+    signature: str
+    count: int
+    test_names: list[str]
+    example: str
+
+
+def get_clusters(connection: sqlite3.Connection) -> list[FailureCluster]:
+    """All clusters of an index, largest first (ties broken by the number of affected tests, then by signature)."""
+    rows = connection.execute(
+        "SELECT signature, test_name, COUNT(*), MIN(message) FROM payloads"
+        " GROUP BY signature, test_name ORDER BY signature, test_name"
+    )
+    clusters = []
+    for signature, test_rows in groupby(rows, key=itemgetter(0)):
+        test_rows = list(test_rows)
+        clusters.append(FailureCluster(
+            signature, sum(row[2] for row in test_rows), [row[1] for row in test_rows], min(row[3] for row in test_rows)
+        ))
+    clusters.sort(key=lambda c: (-c.count, -len(c.test_names), c.signature))
+    return clusters
+
+
+def index_benchmark_run(benchmark_dir: str, threads: int | None = None) -> list[FailureCluster]:
+    """Update the failure index of a run dir and return its clusters."""
+    with closing(open_index(benchmark_dir)) as connection:
+        update_index(connection, benchmark_dir, threads)
+        return get_clusters(connection)
+
+
+def print_clusters(clusters: list[FailureCluster], top: int = 10, max_tests: int = 5) -> None:
+    total = sum(cluster.count for cluster in clusters)
+    print(f"# {total} errors in {len(clusters)} clusters")
+    for cluster in clusters[:top]:
+        test_names = ', '.join(cluster.test_names[:max_tests])
+        more = f" (+{len(cluster.test_names) - max_tests} more)" if len(cluster.test_names) > max_tests else ''
+        print(f"{cluster.count:5d} x {len(cluster.test_names):4d} tests | {cluster.signature}")
+        print(f"{'':20s}e.g. {cluster.example}")
+        print(f"{'':20s}{test_names}{more}")
+
+
+def print_cluster_diff(clusters_1: list[FailureCluster], clusters_2: list[FailureCluster], top: int = 10) -> None:
+    """Print the clusters whose size changed the most between two runs."""
+    counts_1 = Counter({cluster.signature: cluster.count for cluster in clusters_1})
+    counts_2 = Counter({cluster.signature: cluster.count for cluster in clusters_2})
+    signatures = sorted(
+        counts_1.keys() | counts_2.keys(),
+        key=lambda s: (-abs(counts_2[s] - counts_1[s]), -counts_2[s], s)
+    )
+    print(f"# errors: {sum(counts_1.values())} -> {sum(counts_2.values())}")
+    for signature in signatures[:top]:
+        count_1, count_2 = counts_1[signature], counts_2[signature]
+        if count_1 == count_2:
+            break
+        marker = '>' if not count_1 else '<' if not count_2 else '+' if count_2 > count_1 else '-'
+        print(f"{marker} {count_1:5d} -> {count_2:5d} ({count_2 - count_1:+5d}) | {signature}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "benchmark_dirs", nargs='+', metavar="benchmark_dir",
+        help="Run to cluster, or 2 runs to diff the cluster sizes of"
+    )
+    parser.add_argument("--top", type=int, default=10, help="Number of clusters to print (default: 10)")
+    parser.add_argument("--threads", type=int, default=None, help="Size of the thread pool used to read histories")
+    args = parser.parse_args()
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if len(args.benchmark_dirs) > 2:
+        parser.error("give 1 run to cluster, or 2 runs to diff")
+    run_clusters = [index_benchmark_run(benchmark_dir, args.threads) for benchmark_dir in args.benchmark_dirs]
+    if len(run_clusters) == 1:
+        print_clusters(run_clusters[0], args.top)
+    else:
+        print(f"--- {args.benchmark_dirs[0].split('/')[-1]}")
+        print(f"+++ {args.benchmark_dirs[1].split('/')[-1]}")
+        print_cluster_diff(*run_clusters, top=args.top)
+        print()
+        print_clusters(run_clusters[1], args.top)
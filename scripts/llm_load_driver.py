@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+Load driver for `mock_llm_server.py` (or any OpenAI-compatible endpoint).
+It runs many concurrent chat sessions whose system prompt is built from the CEDARScript prompts (`cedarscript/*.txt`)
+and whose user messages are the prompts recorded in benchmark runs, so the mock server finds their responses.
+
+For each request it measures the time to the first byte and the total time, and subtracts the delay the server reports
+having added (`X-Mock-Delay`), which leaves the local overhead: HTTP, JSON and SSE handling and, with `--parse`,
+parsing the CEDARScript blocks of the response with `cedarscript-ast-parser`.
+"""
+import json
+import os
+import re
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from benchmark_stats import get_distribution
+from mock_llm_server import MOCK_DELAY_HEADER, RecordedResponses
+
+DEFAULT_PROMPT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'cedarscript_integration_aider', 'cedarscript'
+)
+_CEDARSCRIPT_BLOCK_RE = re.compile(r"```CEDARScript\n(.*?)```", re.DOTALL)
+
+
+def build_system_prompt(prompt_dir: str = DEFAULT_PROMPT_DIR, platform: str = sys.platform) -> str:
+    """
+    Assemble the CEDARScript system prompt (`main_system.txt` with its sections filled in, then the system reminder),
+    as aider sends it with shell commands enabled.
+    Files missing from `prompt_dir` (e.g. a prompt pack folder like `cedarscript-lean`) are read from the default one.
+    """
+    def read(name: str) -> str:
+        path = os.path.join(prompt_dir, f"{name}.txt")
+        if not os.path.exists(path):
+            path = os.path.join(DEFAULT_PROMPT_DIR, f"{name}.txt")
+        with open(path, encoding='utf-8') as prompt_file:
+            return prompt_file.read()
+
+    sections = {
+        'lazy_prompt': '',
+        'edit_format_training': read('edit_format_training'),
+        'final_remarks': read('final_remarks'),
+        'shell_cmd_prompt': read('shell_cmd_prompt').replace('{platform}', platform),
+        'shell_cmd_reminder': read('shell_cmd_reminder').replace('{platform}', platform),
+    }
+    system_prompt = read('main_system')
+    system_reminder = read('system_reminder')
+    # Plain replacement: the training examples contain braces that aren't placeholders
+    for name, text in sections.items():
+        system_prompt = system_prompt.replace(f"{{{name}}}", text)
+        system_reminder = system_reminder.replace(f"{{{name}}}", text)
+    return f"{system_prompt}\n{system_reminder}"
+
+
+class RequestTiming(NamedTuple):
+    ok: bool
+    first_byte: float
+    total: float
+    server_delay: float
+    parse: float
+    response_bytes: int
+
+    @property
+    def overhead(self) -> float:
+        """Time not spent waiting on the delay the server added"""
+        return max(0.0, self.total - self.server_delay)
+
+
+def _parse_cedarscript(content: str) -> float:
+    from cedarscript_ast_parser import CEDARScriptASTParser
+    start = time.perf_counter()
+    parser = CEDARScriptASTParser()
+    for block in _CEDARSCRIPT_BLOCK_RE.findall(content):
+        parser.parse_script(block)
+    return time.perf_counter() - start
+
+
+def run_session(
+        base_url: str, system_prompt: str, user_message: str, model: str = 'mock', stream: bool = True,
+        parse: bool = False, timeout: float = 300.0
+) -> RequestTiming:
+    """Send one chat completions request and time it."""
+    body = json.dumps({
+        'model': model, 'stream': stream,
+        'messages': [{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': user_message}],
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        f"{base_url.rstrip('/')}/chat/completions", data=body,
+        headers={'Content-Type': 'application/json', 'Authorization': 'Bearer mock'}
+    )
+    start = time.perf_counter()
+    first_byte = 0.0
+    response_bytes = 0
+    parts = []
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            server_delay = float(response.headers.get(MOCK_DELAY_HEADER) or 0)
+            if not stream:
+                payload = response.read()
+                first_byte = time.perf_counter() - start
+                response_bytes = len(payload)
+                parts.append(json.loads(payload)['choices'][0]['message']['content'] or '')
+            else:
+                for line in response:
+                    if not first_byte:
+                        first_byte = time.perf_counter() - start
+                    response_bytes += len(line)
+                    if not line.startswith(b'data: ') or line.strip() == b'data: [DONE]':
+                        continue
+                    delta = json.loads(line[6:])['choices'][0]['delta']
+                    parts.append(delta.get('content') or '')
+    except (OSError, ValueError, KeyError, IndexError):
+        return RequestTiming(False, first_byte, time.perf_counter() - start, 0.0, 0.0, response_bytes)
+    total = time.perf_counter() - start
+    parse_time = _parse_cedarscript(''.join(parts)) if parse else 0.0
+    return RequestTiming(True, first_byte, total + parse_time, server_delay, parse_time, response_bytes)
+
+
+def run_load(
+        base_url: str, user_messages: list[str], sessions: int, concurrency: int, system_prompt: str,
+        model: str = 'mock', stream: bool = True, parse: bool = False
+) -> tuple[list[RequestTiming], float]:
+    """
+    Run `sessions` requests, `concurrency` at a time, cycling through `user_messages`.
+
+    Returns:
+    tuple[list[RequestTiming], float]: The timing of each request, and the wall-clock time of the whole load
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(
+            lambda i: run_session(
+                base_url, system_prompt, user_messages[i % len(user_messages)], model, stream, parse
+            ),
+            range(sessions)
+        ))
+    return timings, time.perf_counter() - start
+
+
+def print_load_report(timings: list[RequestTiming], wall_time: float, concurrency: int) -> None:
+    ok_timings = [timing for timing in timings if timing.ok]
+    print(f"# Requests   : {len(timings):6d} ({len(timings) - len(ok_timings)} failed), concurrency {concurrency}")
+    print(f"# Wall time  : {wall_time:9.2f} s")
+    print(f"# Throughput : {len(ok_timings) / wall_time if wall_time else 0:9.2f} requests/s,"
+          f" {sum(t.response_bytes for t in ok_timings) / wall_time / 1024 if wall_time else 0:9.1f} KiB/s")
+    print("#                      p50       p90       p95       p99       max   (ms)")
+    for label, values in (
+            ("first byte", [t.first_byte for t in ok_timings]),
+            ("total     ", [t.total for t in ok_timings]),
+            ("srv delay ", [t.server_delay for t in ok_timings]),
+            ("overhead  ", [t.overhead for t in ok_timings]),
+            ("parse     ", [t.parse for t in ok_timings]),
+    ):
+        distribution = get_distribution(value * 1000 for value in values)
+        print(f"# {label}: " + ' '.join(f"{value:9.1f}" for value in distribution))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_url", help="Base URL of the API, e.g. http://127.0.0.1:8765/v1")
+    parser.add_argument(
+        "benchmark_dirs", nargs='*', metavar="benchmark_dir",
+        help="Runs to take the user messages from (default: a single generic refactoring request)"
+    )
+    parser.add_argument("--sessions", type=int, default=100, help="Number of requests to send (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once (default: 8)")
+    parser.add_argument("--model", default='mock', help="Model name to send (default: mock)")
+    parser.add_argument("--no-stream", action="store_true", help="Request complete responses instead of SSE streams")
+    parser.add_argument(
+        "--parse", action="store_true",
+        help="Parse the CEDARScript blocks of each response (needs cedarscript-ast-parser)"
+    )
+    parser.add_argument(
+        "--prompt-dir", default=DEFAULT_PROMPT_DIR, help="Folder with the CEDARScript prompt files"
+    )
+    args = parser.parse_args()
+    if args.parse:
+        try:
+            import cedarscript_ast_parser  # noqa: F401
+        except ImportError:
+            parser.error("--parse needs the `cedarscript-ast-parser` package: pip install cedarscript-ast-parser")
+    recorded = RecordedResponses()
+    recorded.add_benchmark_runs(args.benchmark_dirs)
+    messages = recorded.prompts or [
+        "Refactor the `method` method in the `Class` class to be a stand alone, top level function."
+    ]
+    load_timings, load_wall_time = run_load(
+        args.base_url, messages, args.sessions, args.concurrency, build_system_prompt(args.prompt_dir),
+        model=args.model, stream=not args.no_stream, parse=args.parse
+    )
+    print_load_report(load_timings, load_wall_time, args.concurrency)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+Local OpenAI-compatible chat completions server that answers with assistant turns recorded in benchmark runs.
+It makes load tests of aider with CEDARScript possible without network access or API keys.
+
+Each attempt in a `.aider.chat.history.md` pairs a user message with the assistant response that followed it. Requests
+are answered with the response recorded for their last user message, looked up by a hash of that message. Unknown
+prompts get recorded responses in round-robin order, unless `--strict` is given.
+Latency (before the first byte) and streaming (chunk size and delay) are configurable, and every response reports the
+delay the server added in the `X-Mock-Delay` header, so clients can tell local overhead apart from simulated latency.
+
+Point aider (or `llm_load_driver.py`) at it with e.g. `--openai-api-base http://127.0.0.1:8765/v1`.
+"""
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark_parser import CHAT_HISTORY_FILE_NAME, find_results_files
+from chat_history import get_user_message, iter_assistant_responses, map_chat_history, split_attempts
+
+DEFAULT_PORT = 8765
+MOCK_DELAY_HEADER = 'X-Mock-Delay'
+
+
+def get_prompt_hash(prompt: str) -> str:
+    """Hash a user message, ignoring leading and trailing whitespace on each line."""
+    normalized = '\n'.join(line.strip() for line in prompt.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class RecordedResponses:
+    """Assistant responses recorded in chat histories, indexed by the hash of the user message they answered."""
+
+    def __init__(self):
+        self.by_prompt_hash: dict[str, str] = {}
+        self.prompts: list[str] = []
+        self.responses: list[str] = []
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+
+    def add_chat_history(self, chat_history_path: str) -> None:
+        """Record the first assistant response of each attempt of a chat history."""
+        with map_chat_history(chat_history_path) as buffer:
+            for start, end in split_attempts(buffer):
+                response = next(iter_assistant_responses(buffer, start, end), None)
+                if response is None:
+                    continue
+                prompt = get_user_message(buffer, start, end)
+                self.by_prompt_hash.setdefault(get_prompt_hash(prompt), response.strip())
+                self.prompts.append(prompt)
+                self.responses.append(response.strip())
+
+    def add_benchmark_runs(self, benchmark_dirs: list[str]) -> None:
+        """Record the chat histories of every test of the given benchmark runs (tests without one are skipped)."""
+        for benchmark_dir in benchmark_dirs:
+            for results_file in find_results_files(benchmark_dir):
+                try:
+                    self.add_chat_history(os.path.join(os.path.dirname(results_file), CHAT_HISTORY_FILE_NAME))
+                except FileNotFoundError:
+                    continue
+
+    def get_response(self, prompt: str, strict: bool = False) -> str | None:
+        """
+        Get the response recorded for a user message.
+        Unknown messages get the next recorded response in round-robin order (None in `strict` mode).
+        """
+        response = self.by_prompt_hash.get(get_prompt_hash(prompt))
+        if response is not None or strict or not self.responses:
+            return response
+        with self._lock:
+            i = next(self._round_robin)
+        return self.responses[i % len(self.responses)]
+
+
+def get_last_user_message(messages: list[dict]) -> str:
+    """Text of the last `user` message of a chat completions request (content may be a string or a list of parts)."""
+    for message in reversed(messages):
+        if message.get('role') != 'user':
+            continue
+        content = message.get('content') or ''
+        if isinstance(content, list):
+            return '\n'.join(part.get('text', '') for part in content if isinstance(part, dict))
+        return str(content)
+    return ''
+
+
+def estimate_token_count(text: str) -> int:
+    """Rough token count (4 characters per token), for the `usage` field only."""
+    return max(1, len(text) // 4)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self, address: tuple[str, int], recorded_responses: RecordedResponses,
+            latency: float = 0.0, chunk_size: int = 32, chunk_delay: float = 0.0, strict: bool = False
+    ):
+        super().__init__(address, MockLLMRequestHandler)
+        self.recorded_responses = recorded_responses
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.strict = strict
+
+
+class MockLLMRequestHandler(BaseHTTPRequestHandler):
+    server: MockLLMServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, delay: float = 0.0) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header(MOCK_DELAY_HEADER, f"{delay:.6f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'owned_by': 'mock'}]})
+        else:
+            self._send_json(404, {'error': {'message': f"Unknown path: {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path: {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        messages = request.get('messages') or []
+        server = self.server
+        content = server.recorded_responses.get_response(get_last_user_message(messages), server.strict)
+        if content is None:
+            self._send_json(404, {'error': {'message': "No recorded response for this prompt"}})
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get('model') or 'mock'
+        usage = {
+            'prompt_tokens': sum(estimate_token_count(str(m.get('content') or '')) for m in messages),
+            'completion_tokens': estimate_token_count(content),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{
+                    'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'
+                }],
+                'usage': usage,
+            }, delay=server.latency)
+            return
+        self._stream(completion_id, model, content, usage)
+
+    def _stream(self, completion_id: str, model: str, content: str, usage: dict) -> None:
+        server = self.server
+        chunks = [content[i:i + server.chunk_size] for i in range(0, len(content), server.chunk_size)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.send_header(MOCK_DELAY_HEADER, f"{server.latency + server.chunk_delay * len(chunks):.6f}")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(delta: dict, finish_reason: str | None = None, **extra) -> None:
+            event = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        send_event({'role': 'assistant', 'content': ''})
+        for chunk in chunks:
+            if server.chunk_delay:
+                time.sleep(server.chunk_delay)
+            send_event({'content': chunk})
+        send_event({}, 'stop', usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark_dirs", nargs='+', metavar="benchmark_dir", help="Runs to take responses from")
+    parser.add_argument("--host", default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds to wait before answering each request (default: 0)"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=32, help="Characters per streamed chunk (default: 32)"
+    )
+    parser.add_argument(
+        "--chunk-delay", type=float, default=0.0, help="Seconds to wait before each streamed chunk (default: 0)"
+    )
+    parser.add_argument(
+        "--strict", action="store_true", help="Answer unknown prompts with 404 instead of a round-robin response"
+    )
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.latency < 0 or args.chunk_delay < 0:
+        parser.error("--latency and --chunk-delay can't be negative")
+    recorded_responses = RecordedResponses()
+    recorded_responses.add_benchmark_runs(args.benchmark_dirs)
+    server = MockLLMServer(
+        (args.host, args.port), recorded_responses,
+        latency=args.latency, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay, strict=args.strict
+    )
+    print(
+        f"# Serving {len(recorded_responses.responses)} recorded responses"
+        f" ({len(recorded_responses.by_prompt_hash)} distinct prompts) on http://{args.host}:{args.port}/v1"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
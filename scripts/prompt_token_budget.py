@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Token accounting of the CEDARScript prompts: how many tokens each prompt resource and each of its sections costs, and
+what a turn costs with each prompt variant (shell commands on/off, lazy prompt, fence).
+Counting is done offline, with the approximate tokenizer by default (see `cedarscript_integration_aider.tokens`).
+With several `--pack` options, the budget of each variant is compared across the prompt packs (e.g. `default` and
+`lean`), the first pack being the reference.
+`--cache-layout` prints the segments of the prefix-cache-friendly layout of each variant, with their sha256: the
+cacheable segments should have the same hashes in all variants (see `render_cache_friendly_prompt`).
+
+Needs the package to be installed (`make install`).
+"""
+from cedarscript_integration_aider.prompts import get_default_pack, get_prompt, get_prompt_packs
+from cedarscript_integration_aider.templates import render_cache_friendly_prompt
+from cedarscript_integration_aider.tokens import (
+    ApproximateTokenizer, Tokenizer, count_prompt_tokens, get_prompt_budget, get_tokenizer
+)
+
+RESOURCE_NAMES = (
+    'main_system', 'edit_format_training', 'final_remarks', 'system_reminder', 'shell_cmd_prompt',
+    'no_shell_cmd_prompt', 'shell_cmd_reminder', 'example_messages',
+)
+# As in aider's `CoderPrompts.lazy_prompt`, sent for models marked as lazy
+LAZY_PROMPT = """You are diligent and tireless!
+You NEVER leave comments describing code without implementing it!
+You always COMPLETELY implement the needed code!
+"""
+# (label, fence, lazy prompt, shell commands)
+VARIANTS = (
+    ('default (shell commands)', ('```', '```'), '', True),
+    ('no shell commands', ('```', '```'), '', False),
+    ('lazy prompt', ('```', '```'), LAZY_PROMPT, True),
+    ('lazy prompt, no shell commands', ('```', '```'), LAZY_PROMPT, False),
+    ('<source> fence', ('<source>', '</source>'), '', True),
+)
+
+
+def print_resource_tokens(
+        tokenizer: Tokenizer, names: list[str], max_depth: int, min_tokens: int, pack: str | None = None
+) -> None:
+    totals = {name: count_prompt_tokens(name, tokenizer, max_depth, pack) for name in names}
+    grand_total = sum(total for total, _ in totals.values())
+    print(f"# ============= RESOURCES ({pack or get_default_pack()} pack, {tokenizer.name}) =============")
+    print(f"# {'tokens':>7s} {'share':>6s}  resource / section")
+    for name, (total, sections) in totals.items():
+        print(f"# {total:7,d} {total * 100 / grand_total if grand_total else 0:5.1f}%  {name}")
+        for section_tokens in sections:
+            if section_tokens.tokens < min_tokens:
+                continue
+            indent = '  ' * (section_tokens.section.depth + 1)
+            share = section_tokens.tokens * 100 / total if total else 0
+            print(f"# {section_tokens.tokens:7,d} {share:5.1f}%  {indent}{section_tokens.section.label}")
+    print(f"# {grand_total:7,d}         TOTAL")
+
+
+def print_variant_budgets(tokenizer: Tokenizer, platform: str, packs: list[str]) -> None:
+    """
+    Print the per-turn budget of each variant and pack. The delta is relative to the default variant of the first pack,
+    and to the same variant of the first pack for the other packs.
+    """
+    print(f"# ============= PER-TURN BUDGET ({tokenizer.name}) =============")
+    print(f"# {'system':>7s} {'reminder':>8s} {'examples':>8s} {'total':>7s} {'delta':>7s} {'':>6s}  pack: variant")
+    for label, fence, lazy_prompt, shell in VARIANTS:
+        reference_total = None
+        for pack in packs:
+            budget = get_prompt_budget(tokenizer, fence, lazy_prompt, shell, platform, pack)
+            if reference_total is None:
+                reference_total = budget.total
+                if len(packs) == 1:
+                    reference_total = get_prompt_budget(tokenizer, *VARIANTS[0][1:], platform, pack).total
+            delta = budget.total - reference_total
+            print(
+                f"# {budget.system_prompt:7,d} {budget.system_reminder:8,d} {budget.example_messages:8,d}"
+                f" {budget.total:7,d} {delta:+7,d} {delta * 100 / reference_total if reference_total else 0:+5.1f}%"
+                f"  {pack}: {label}"
+            )
+    print("# (the system prompt includes the reminder; total = system prompt + example messages)")
+
+
+def print_cache_layout(tokenizer: Tokenizer, platform: str, pack: str) -> None:
+    print(f"# ============= CACHE-FRIENDLY LAYOUT ({pack} pack, {tokenizer.name}) =============")
+    print(f"# {'tokens':>7s} {'cached':>6s}  {'sha256':16s}  segment: variant")
+    for label, fence, lazy_prompt, shell in VARIANTS:
+        prompt = render_cache_friendly_prompt(fence, lazy_prompt, shell, platform, pack)
+        for segment in prompt.segments:
+            print(
+                f"# {tokenizer.count(segment.text):7,d} {'yes' if segment.cacheable else 'no':>6s}"
+                f"  {segment.sha256[:16]}  {segment.name}: {label}"
+            )
+        print(f"# {tokenizer.count(prompt.prefix):7,d} {'prefix':>6s}  {prompt.prefix_hashes[-1][:16]}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "resources", nargs='*', default=list(RESOURCE_NAMES), metavar="resource",
+        help=f"Prompt resources to count (default: all of {', '.join(RESOURCE_NAMES)})"
+    )
+    parser.add_argument(
+        "--tokenizer", default='approx',
+        help="approx, approx:<scale>, tiktoken or tiktoken:<encoding> (default: approx)"
+    )
+    parser.add_argument(
+        "--calibrate-with", metavar="TOKENIZER",
+        help="Fit the scale of the approximate tokenizer on the prompt resources, counted with this tokenizer"
+             " (e.g. tiktoken:o200k_base), print it and use it"
+    )
+    parser.add_argument("--depth", type=int, default=1, help="Section levels to report (0 for none, default: 1)")
+    parser.add_argument("--min-tokens", type=int, default=0, help="Hide sections with fewer tokens")
+    parser.add_argument("--platform", default=sys.platform, help="Platform text of the shell command prompts")
+    parser.add_argument(
+        "--pack", action="append", dest="packs", metavar="PACK",
+        help=f"Prompt pack to count; repeat to compare packs (known: {', '.join(get_prompt_packs())};"
+             f" default: {get_default_pack()})"
+    )
+    parser.add_argument(
+        "--cache-layout", action="store_true", help="Also print the segments of the cache-friendly layout"
+    )
+    args = parser.parse_args()
+    packs = args.packs or [get_default_pack()]
+    for pack_name in packs:
+        if pack_name not in get_prompt_packs():
+            parser.error(f"unknown prompt pack: {pack_name} (known: {', '.join(get_prompt_packs())})")
+
+    try:
+        if args.calibrate_with:
+            reference = get_tokenizer(args.calibrate_with)
+            selected_tokenizer = ApproximateTokenizer.calibrate(
+                (get_prompt(name), reference.count(get_prompt(name))) for name in RESOURCE_NAMES
+            )
+            print(f"# Calibrated on {reference.name}: --tokenizer approx:{selected_tokenizer.scale:.4f}")
+        else:
+            selected_tokenizer = get_tokenizer(args.tokenizer)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+    for pack_name in packs:
+        print_resource_tokens(selected_tokenizer, args.resources, args.depth, args.min_tokens, pack_name)
+        print()
+    print_variant_budgets(selected_tokenizer, args.platform, packs)
+    if args.cache_layout:
+        for pack_name in packs:
+            print()
+            print_cache_layout(selected_tokenizer, args.platform, pack_name)
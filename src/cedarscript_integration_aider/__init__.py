@@ -1,11 +1,49 @@
 from ._version import __version__
-from importlib.resources import files
 from pathlib import Path
 
+from .prompts import (
+    PromptName, get_default_pack, get_prompt, get_prompt_folder_path, get_prompt_packs, get_prompt_path,
+    invalidate_prompts, list_prompt_files, set_check_mtime
+)
+from .templates import (
+    CacheFriendlyPrompt, PromptSegment, Template, compile_template, render_cache_friendly_prompt,
+    render_example_messages, render_system_prompt
+)
+from .cedarml import get_example_messages, iter_cedarml_messages, iter_example_messages
+from .example_selection import ExampleIndex, get_example_index, select_example_messages
+from .tokens import count_prompt_tokens, get_prompt_budget, get_tokenizer, register_tokenizer
+
 
 __all__ = [
     "__version__",
     "prompt_folder_path",
+    "PromptName",
+    "get_default_pack",
+    "get_prompt",
+    "get_prompt_folder_path",
+    "get_prompt_packs",
+    "get_prompt_path",
+    "invalidate_prompts",
+    "list_prompt_files",
+    "set_check_mtime",
+    "CacheFriendlyPrompt",
+    "PromptSegment",
+    "Template",
+    "compile_template",
+    "render_cache_friendly_prompt",
+    "render_example_messages",
+    "render_system_prompt",
+    "get_example_messages",
+    "iter_cedarml_messages",
+    "iter_example_messages",
+    "ExampleIndex",
+    "get_example_index",
+    "select_example_messages",
+    "count_prompt_tokens",
+    "get_prompt_budget",
+    "get_tokenizer",
+    "register_tokenizer",
 ]
 
-prompt_folder_path = files('cedarscript_integration_aider')
+# Aider reads `cedarscript/<file>` from here, so it gets the pack set by `CEDARSCRIPT_PROMPT_PACK`
+prompt_folder_path = get_prompt_folder_path()
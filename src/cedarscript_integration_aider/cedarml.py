@@ -0,0 +1,142 @@
+"""
+Streaming parser of CedarML chat transcripts, such as `cedarscript/example_messages.cedarml`:
+
+    <list>
+    <cedarml:role.user>
+    Change `get_factorial` ...
+    </cedarml:role.user>
+    <cedarml:role.assistant>
+    {fence[0]}CEDARScript
+    ...
+    </cedarml:role.assistant>
+    </list>
+
+Lines are read one at a time and each message is yielded as soon as its closing tag is read, as
+`{'role': 'user', 'content': '...'}`. Message contents use `str.format` syntax for their fences (`{fence[0]}`,
+`{fence[1]}`, and `{{`/`}}` for literal braces). Placeholders can't span lines, so they're filled in line by line, and
+only in lines that contain a brace.
+
+Besides `example_messages.cedarml`, a prompt pack can have numbered example files (`1.example_messages.cedarml`,
+`2.example_messages.cedarml`, ...), whose messages are appended in numeric order.
+"""
+import io
+import re
+from collections.abc import Iterable, Iterator
+from string import Formatter
+
+from .prompts import get_default_pack, get_prompt, list_prompt_files
+from .templates import DEFAULT_FENCE, get_fence_pair
+
+_OPENING_TAG_RE = re.compile(r"^\s*<cedarml:role\.([\w-]+)>")
+_CLOSING_TAG_RE = re.compile(r"</cedarml:role\.([\w-]+)>\s*$")
+_EXAMPLE_FILE_RE = re.compile(r"^(?:(\d+)\.)?example_messages\.(?:cedarml|xml)$")
+
+# (pack, fence, texts of the example files) -> parsed messages
+_messages_cache: dict[tuple[str, tuple[str, str], tuple[str, ...]], tuple[tuple[str, str], ...]] = {}
+
+
+def _fill_in_line(line: str, values: dict[str, str]) -> str:
+    if '{' not in line and '}' not in line:
+        return line
+    parts = []
+    for literal, field, format_spec, conversion in Formatter().parse(line):
+        parts.append(literal)
+        if field is not None:
+            if format_spec or conversion:
+                raise ValueError(f"Unsupported conversion or format spec in field: {{{field}}}")
+            parts.append(values[field])
+    return ''.join(parts)
+
+
+def iter_cedarml_messages(
+        lines: Iterable[str], fence: tuple[str, str] | None = DEFAULT_FENCE, source: str = '<cedarml>'
+) -> Iterator[dict[str, str]]:
+    """
+    Parse a CedarML transcript incrementally, yielding each message once its closing tag is read.
+    Text outside of messages (such as the `<list>` wrapper) is ignored.
+
+    Args:
+    lines (Iterable[str]): Lines of the transcript, with their line endings (e.g. an open file)
+    fence (tuple[str, str] | None): Fence pair to fill the placeholders in with, or None to keep contents as they are
+    source (str): Name of the transcript, for error messages
+
+    Returns:
+    Iterator[dict[str, str]]: The messages, as `{'role': ..., 'content': ...}`
+
+    Raises:
+    ValueError: If a message is nested, unclosed or closed with the wrong role, or has an unknown placeholder
+    """
+    values = {'fence[0]': fence[0], 'fence[1]': fence[1]} if fence else None
+    role = None
+    role_line_number = 0
+    content: list[str] = []
+    for line_number, line in enumerate(lines, 1):
+        opening_tag = _OPENING_TAG_RE.match(line)
+        if opening_tag:
+            if role is not None:
+                raise ValueError(
+                    f"{source}:{line_number}: message opened inside the message of line {role_line_number}"
+                )
+            role, role_line_number = opening_tag.group(1), line_number
+            content = []
+            line = line[opening_tag.end():]
+            if not line.strip():
+                continue
+        if role is None:
+            continue
+        closing_tag = _CLOSING_TAG_RE.search(line)
+        if closing_tag:
+            if closing_tag.group(1) != role:
+                raise ValueError(f"{source}:{line_number}: `{closing_tag.group(1)}` closes a `{role}` message")
+            line = line[:closing_tag.start()]
+        try:
+            content.append(line if values is None else _fill_in_line(line, values))
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"{source}:{line_number}: bad placeholder ({e})") from None
+        if closing_tag:
+            yield {'role': role, 'content': ''.join(content).rstrip('\n')}
+            role = None
+    if role is not None:
+        raise ValueError(f"{source}:{role_line_number}: `{role}` message isn't closed")
+
+
+def get_example_file_names(pack: str | None = None) -> list[str]:
+    """`example_messages.cedarml` and the numbered example files of a pack, in merge order."""
+    numbered = []
+    for file_name in list_prompt_files(pack):
+        match = _EXAMPLE_FILE_RE.match(file_name)
+        if match:
+            numbered.append((int(match.group(1) or 0), file_name))
+    return [file_name for _, file_name in sorted(numbered)]
+
+
+def iter_example_messages(
+        fence: tuple[str, str] = DEFAULT_FENCE, pack: str | None = None
+) -> Iterator[dict[str, str]]:
+    """
+    Yield the example messages of a pack (from all its example files, in order), parsing them on first use.
+    Once fully parsed, they're served from a cache, until the files change (see `invalidate_prompts`).
+    """
+    pack = pack or get_default_pack()
+    file_names = get_example_file_names(pack)
+    texts = tuple(get_prompt(file_name, pack) for file_name in file_names)
+    key = (pack, get_fence_pair(fence), texts)
+    cached = _messages_cache.get(key)
+    if cached is not None:
+        for role, content in cached:
+            yield {'role': role, 'content': content}
+        return
+    messages = []
+    for file_name, text in zip(file_names, texts):
+        for message in iter_cedarml_messages(io.StringIO(text), fence, file_name):
+            messages.append((message['role'], message['content']))
+            yield message
+    # Drop what the old texts of these files parsed into
+    for old_key in [k for k in _messages_cache if k[:2] == key[:2]]:
+        del _messages_cache[old_key]
+    _messages_cache[key] = tuple(messages)
+
+
+def get_example_messages(fence: tuple[str, str] = DEFAULT_FENCE, pack: str | None = None) -> list[dict[str, str]]:
+    """All example messages of a pack, as fresh dicts (see `iter_example_messages`)."""
+    return list(iter_example_messages(fence, pack))
@@ -0,0 +1,148 @@
+"""
+Relevance-based selection of the few-shot examples, to send only the examples related to the task at hand.
+
+An example is a user message with the replies that follow it (see `cedarml.get_example_messages`). Examples are
+indexed with Okapi BM25 over their words: identifiers are also split into their parts (`myFirstFunction` and
+`print_greeting` add `my`, `first`, `function`, `print` and `greeting`). The BM25 weight of every (term, example) pair
+is computed when the index is built, so a query only sums a few precomputed weights (well under a millisecond).
+
+The index of a pack and fence pair is built on first use and cached until the example files change.
+"""
+import math
+import os
+import re
+from collections import Counter
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import NamedTuple
+
+from .cedarml import get_example_file_names, get_example_messages
+from .prompts import get_default_pack, get_prompt
+from .templates import DEFAULT_FENCE, get_fence_pair
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)*|\d+")
+_WORD_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have i if in into is it its of on or so that the this to was we with you'
+    .split()
+)
+
+
+def get_terms(text: str) -> list[str]:
+    """Lowercase search terms of a text: its words, plus the parts of its snake_case and camelCase identifiers."""
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lower_word = word.lower()
+        if lower_word in _STOP_WORDS:
+            continue
+        terms.append(lower_word)
+        parts = [part.lower() for piece in word.split('_') for part in _WORD_PART_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in _STOP_WORDS)
+    return terms
+
+
+class Example(NamedTuple):
+    position: int
+    messages: tuple[dict[str, str], ...]
+
+
+def split_examples(messages: Iterable[dict[str, str]]) -> list[Example]:
+    """Group messages into examples: each user message starts a new example."""
+    examples: list[list[dict[str, str]]] = []
+    for message in messages:
+        if message['role'] == 'user' or not examples:
+            examples.append([])
+        examples[-1].append(message)
+    return [Example(i, tuple(example)) for i, example in enumerate(examples)]
+
+
+class ExampleIndex:
+    """
+    BM25 index of examples.
+
+    Args:
+    examples (list[Example]): The examples to index
+    k1 (float): Term frequency saturation
+    b (float): Document length normalization
+    """
+
+    def __init__(self, examples: list[Example], k1: float = 1.5, b: float = 0.75):
+        self.examples = examples
+        term_counts = [Counter(get_terms('\n'.join(m['content'] for m in example.messages))) for example in examples]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        document_frequencies = Counter(term for counts in term_counts for term in counts)
+        # term -> [(example index, BM25 weight of the term in that example)]
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        for example_index, (counts, length) in enumerate(zip(term_counts, lengths)):
+            length_norm = k1 * (1 - b + b * length / average_length) if average_length else k1
+            for term, count in counts.items():
+                frequency = document_frequencies[term]
+                idf = math.log(1 + (len(examples) - frequency + 0.5) / (frequency + 0.5))
+                weight = idf * count * (k1 + 1) / (count + length_norm)
+                self.postings.setdefault(term, []).append((example_index, weight))
+
+    def get_scores(self, query: str, target_files: Iterable[str] = ()) -> list[float]:
+        """BM25 score of each example for a query. Target files add their names and extensions as query terms."""
+        terms = get_terms(query)
+        for path in target_files:
+            terms.extend(get_terms(os.path.basename(path).replace('.', ' ')))
+        scores = [0.0] * len(self.examples)
+        for term in set(terms):
+            for example_index, weight in self.postings.get(term, ()):
+                scores[example_index] += weight
+        return scores
+
+    def search(self, query: str, target_files: Iterable[str] = (), k: int = 3) -> list[Example]:
+        """
+        The `k` examples most relevant to a query, in their original order.
+        When fewer than `k` examples match, the first examples fill the remaining places.
+
+        Raises:
+        ValueError: If `k` is negative
+        """
+        if k < 0:
+            raise ValueError(f"k must not be negative: {k}")
+        scores = self.get_scores(query, target_files)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return [self.examples[i] for i in sorted(ranked[:k])]
+
+
+@lru_cache(maxsize=8)
+def _get_index(texts: tuple[str, ...], fence: tuple[str, str], pack: str | None) -> ExampleIndex:
+    return ExampleIndex(split_examples(get_example_messages(fence, pack)))
+
+
+def get_example_index(fence: tuple[str, str] = DEFAULT_FENCE, pack: str | None = None) -> ExampleIndex:
+    """The index of the example messages of a pack, built once and then served from a cache."""
+    pack = pack or get_default_pack()
+    texts = tuple(get_prompt(file_name, pack) for file_name in get_example_file_names(pack))
+    return _get_index(texts, get_fence_pair(fence), pack)
+
+
+def select_example_messages(
+        query: str, target_files: Iterable[str] = (), k: int = 3, fence: tuple[str, str] = DEFAULT_FENCE,
+        pack: str | None = None
+) -> list[dict[str, str]]:
+    """
+    Messages of the `k` examples most relevant to a request, to send instead of all example messages.
+
+    Args:
+    query (str): The user's request
+    target_files (Iterable[str]): Paths of the files the request is about (their names and extensions are matched)
+    k (int): Number of examples to select
+    fence (tuple[str, str]): Fence pair of the examples
+    pack (str | None): Prompt pack of the examples (default: see `get_default_pack`)
+
+    Returns:
+    list[dict[str, str]]: The messages of the selected examples, in their original order, as fresh dicts
+
+    Raises:
+    ValueError: If `k` is negative
+    """
+    return [
+        dict(message)
+        for example in get_example_index(fence, pack).search(query, target_files, k)
+        for message in example.messages
+    ]
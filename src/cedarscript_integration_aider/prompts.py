@@ -0,0 +1,253 @@
+"""
+Cached access to the CEDARScript prompt resources of this package (`cedarscript/*.txt` and
+`cedarscript/example_messages.cedarml`).
+
+Resources come in prompt packs: the `default` pack is the `cedarscript` folder, and pack `<name>` is the
+`cedarscript-<name>` folder (e.g. `lean`). A pack only needs the resources it changes; the others are taken from the
+default pack. The pack used when none is given can be set with the `CEDARSCRIPT_PROMPT_PACK` environment variable.
+Tools that read the `cedarscript` folder themselves, like aider, see the pack through `get_prompt_folder_path`.
+
+Each resource is read on first access only; its text is interned and kept for the life of the process, so a
+long-lived process serving many sessions holds a single copy of each prompt and does no further file I/O.
+
+While editing the prompts, either call `invalidate_prompts()` after a change, or enable the mtime check
+(`set_check_mtime(True)` or the `CEDARSCRIPT_PROMPTS_CHECK_MTIME=1` environment variable) so that every access
+stats the file and re-reads it when it was modified.
+"""
+import os
+import sys
+import threading
+from collections.abc import Iterator, Mapping, Sequence
+from importlib.resources import files
+from importlib.resources.abc import Traversable
+from pathlib import Path, PurePosixPath
+from typing import IO, Any, Literal
+
+PROMPT_FOLDER = 'cedarscript'
+DEFAULT_PACK = 'default'
+PACK_ENV_VAR = 'CEDARSCRIPT_PROMPT_PACK'
+CHECK_MTIME_ENV_VAR = 'CEDARSCRIPT_PROMPTS_CHECK_MTIME'
+
+PromptName = Literal[
+    'main_system',
+    'system_reminder',
+    'edit_format_training',
+    'final_remarks',
+    'shell_cmd_prompt',
+    'no_shell_cmd_prompt',
+    'shell_cmd_reminder',
+    'example_messages',
+]
+
+# Resources without a `.txt` suffix
+_FILE_NAMES = {
+    'example_messages': 'example_messages.cedarml',
+}
+
+# (pack, name) -> (mtime_ns when read, or None if unknown; text)
+_cache: dict[tuple[str, str], tuple[int | None, str]] = {}
+# pack -> file names of its resources (see `list_prompt_files`)
+_file_names_cache: dict[str, tuple[str, ...]] = {}
+_lock = threading.Lock()
+_check_mtime = os.environ.get(CHECK_MTIME_ENV_VAR, '').lower() in ('1', 'true', 'yes')
+_default_pack = os.environ.get(PACK_ENV_VAR) or DEFAULT_PACK
+
+
+def get_default_pack() -> str:
+    """The pack used when none is given (`default`, unless set by the `CEDARSCRIPT_PROMPT_PACK` environment variable)"""
+    return _default_pack
+
+
+def get_prompt_packs() -> list[str]:
+    """Names of the prompt packs of this package, the default pack first."""
+    prefix = f"{PROMPT_FOLDER}-"
+    return [DEFAULT_PACK] + sorted(
+        entry.name[len(prefix):] for entry in files('cedarscript_integration_aider').iterdir()
+        if entry.name.startswith(prefix) and entry.is_dir()
+    )
+
+
+def _get_pack_folder(package: Traversable, pack: str) -> Traversable:
+    pack_folder = package / f"{PROMPT_FOLDER}-{pack}"
+    if not pack_folder.is_dir():
+        raise ValueError(f"Unknown prompt pack: {pack} (known: {', '.join(get_prompt_packs())})")
+    return pack_folder
+
+
+def get_prompt_path(name: PromptName | str, pack: str | None = None) -> Traversable:
+    """
+    Location of a prompt resource, e.g. `cedarscript/system_reminder.txt` for `system_reminder`.
+    Resources missing from a pack are taken from the default pack.
+
+    Raises:
+    ValueError: If there's no such pack
+    """
+    file_name = _FILE_NAMES.get(name) or (name if '.' in name else f"{name}.txt")
+    package = files('cedarscript_integration_aider')
+    pack = pack or _default_pack
+    if pack != DEFAULT_PACK:
+        pack_folder = _get_pack_folder(package, pack)
+        if (pack_folder / file_name).is_file():
+            return pack_folder / file_name
+    return package / PROMPT_FOLDER / file_name
+
+
+def list_prompt_files(pack: str | None = None) -> tuple[str, ...]:
+    """
+    Sorted file names of the resources of a pack, including those taken from the default pack.
+    The listing is cached until `invalidate_prompts()` is called without arguments.
+
+    Raises:
+    ValueError: If there's no such pack
+    """
+    pack = pack or _default_pack
+    file_names = _file_names_cache.get(pack)
+    if file_names is None:
+        package = files('cedarscript_integration_aider')
+        folders = [package / PROMPT_FOLDER]
+        if pack != DEFAULT_PACK:
+            folders.append(_get_pack_folder(package, pack))
+        file_names = tuple(sorted({entry.name for folder in folders for entry in folder.iterdir() if entry.is_file()}))
+        _file_names_cache[pack] = file_names
+    return file_names
+
+
+class _MergedFolder(Traversable):
+    """
+    Read-only folder holding the entries of several folders (layers), an entry of an earlier layer hiding the entries
+    of the same name in the later ones. Mounts replace the entries of their name in all layers.
+    """
+
+    def __init__(self, name: str, layers: Sequence[Traversable], mounts: Mapping[str, Traversable] | None = None):
+        self._name = name
+        self._layers = layers
+        self._mounts = mounts or {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def iterdir(self) -> Iterator[Traversable]:
+        seen: set[str] = set()
+        for layer in self._layers:
+            for entry in layer.iterdir():
+                if entry.name not in seen:
+                    seen.add(entry.name)
+                    yield self._mounts.get(entry.name, entry)
+
+    def joinpath(self, *descendants: str | os.PathLike[str]) -> Traversable:
+        names = [part for descendant in descendants for part in PurePosixPath(descendant).parts]
+        if not names:
+            return self
+        child = self._mounts.get(names[0])
+        if child is None:
+            # A missing entry is looked up in the last layer, which raises `FileNotFoundError` when read
+            child = next(
+                (entry for layer in self._layers if (entry := layer / names[0]).is_file() or entry.is_dir()),
+                self._layers[-1] / names[0]
+            )
+        return child.joinpath(*names[1:]) if names[1:] else child
+
+    def __truediv__(self, child: str | os.PathLike[str]) -> Traversable:
+        return self.joinpath(child)
+
+    def is_dir(self) -> bool:
+        return True
+
+    def is_file(self) -> bool:
+        return False
+
+    def open(self, mode: str = 'r', *args: Any, **kwargs: Any) -> IO[Any]:
+        raise IsADirectoryError(self._name)
+
+    def read_bytes(self) -> bytes:
+        raise IsADirectoryError(self._name)
+
+    def read_text(self, encoding: str | None = None) -> str:
+        raise IsADirectoryError(self._name)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._name!r}, {self._layers!r})"
+
+
+def get_prompt_folder_path(pack: str | None = None) -> Traversable:
+    """
+    The package folder, with a `cedarscript` folder holding the resources of a pack (those the pack lacks are taken
+    from the default pack). Meant for tools that read `cedarscript/<file>` themselves, like aider.
+
+    Args:
+    pack (str | None): Prompt pack (default: see `get_default_pack`)
+
+    Raises:
+    ValueError: If there's no such pack
+    """
+    package = files('cedarscript_integration_aider')
+    pack = pack or _default_pack
+    if pack == DEFAULT_PACK:
+        return package
+    prompt_folder = _MergedFolder(PROMPT_FOLDER, [_get_pack_folder(package, pack), package / PROMPT_FOLDER])
+    return _MergedFolder(package.name, [package], {PROMPT_FOLDER: prompt_folder})
+
+
+def _get_mtime(path: Traversable) -> int | None:
+    # Resources inside a zip file have no mtime, and never change anyway
+    if not isinstance(path, Path):
+        return None
+    return path.stat().st_mtime_ns
+
+
+def get_prompt(name: PromptName | str, pack: str | None = None, check_mtime: bool | None = None) -> str:
+    """
+    Text of a prompt resource, read once and then served from memory.
+
+    Args:
+    name (str): Resource name without its suffix (see `PromptName`), or a file name inside the `cedarscript` folder
+    pack (str | None): Prompt pack to read it from (default: see `get_default_pack`)
+    check_mtime (bool | None): Re-read the file if it was modified since it was cached (default: see `set_check_mtime`)
+
+    Returns:
+    str: The interned text of the resource
+
+    Raises:
+    FileNotFoundError: If there's no such resource
+    ValueError: If there's no such pack
+    """
+    key = (pack or _default_pack, name)
+    cached = _cache.get(key)
+    if check_mtime is None:
+        check_mtime = _check_mtime
+    if cached is not None and not check_mtime:
+        return cached[1]
+    path = get_prompt_path(name, key[0])
+    mtime = _get_mtime(path) if check_mtime else None
+    if cached is not None and (mtime is None or cached[0] == mtime):
+        return cached[1]
+    with _lock:
+        # Another thread may have read it while we waited
+        cached = _cache.get(key)
+        if cached is not None and (not check_mtime or mtime is None or cached[0] == mtime):
+            return cached[1]
+        if mtime is None:
+            mtime = _get_mtime(path)
+        text = sys.intern(path.read_text(encoding='utf-8'))
+        _cache[key] = (mtime, text)
+        return text
+
+
+def invalidate_prompts(*names: PromptName | str) -> None:
+    """
+    Drop the given prompts of all packs (all prompts and file listings if none are given) from the cache, so their next
+    access reads them again.
+    """
+    with _lock:
+        if not names:
+            _file_names_cache.clear()
+        for key in list(_cache):
+            if not names or key[1] in names:
+                del _cache[key]
+
+
+def set_check_mtime(enabled: bool) -> None:
+    """Turn the mtime check of every `get_prompt` call on or off (meant for prompt development)."""
+    global _check_mtime
+    _check_mtime = enabled
@@ -0,0 +1,316 @@
+"""
+Precompiled prompt templates and cached rendering of the CEDARScript system prompt.
+
+A template is split once into `(literal, field)` segments, so rendering it only joins strings.
+There are two compilation modes:
+- `fields` given: only `{name}` placeholders with a listed name are fields, everything else is literal text.
+  This is how the `.txt` prompts are filled in, since the training examples contain braces that aren't placeholders
+  (e.g. `{self.rank}` or `{e}`)
+- no `fields`: `str.format` syntax (`{{` and `}}` are escaped braces), as used by `example_messages.cedarml`
+
+Rendered prompts are kept in LRU caches keyed by their variant (fence pair, lazy prompt, shell commands on/off and
+platform text) and by the prompt texts they were built from, so a session gets its prompt with a few dict lookups,
+and prompts reloaded by `invalidate_prompts` or the mtime check (see `prompts`) are rendered anew.
+
+`render_cache_friendly_prompt` lays the prompt out for providers with prefix caching: static content first, the parts
+that vary between sessions last, and a sha256 of each segment. Example messages are hashed as the JSON list of chat
+messages a client sends, not as the CedarML source they're parsed from.
+"""
+import hashlib
+import json
+import re
+from collections.abc import Collection, Mapping, Sequence
+from functools import lru_cache
+from string import Formatter
+from typing import NamedTuple
+
+from .prompts import get_default_pack, get_prompt
+
+DEFAULT_FENCE = ('```', '```')
+
+
+def get_fence_pair(fence: Sequence[str]) -> tuple[str, str]:
+    """A fence pair as a hashable 2-tuple (for cache keys), whichever sequence it was given as."""
+    return fence[0], fence[1]
+
+
+# Placeholders of the `.txt` prompts
+PROMPT_FIELDS = (
+    'lazy_prompt', 'edit_format_training', 'final_remarks', 'shell_cmd_prompt', 'shell_cmd_reminder', 'platform',
+    'fence[0]', 'fence[1]',
+)
+
+
+class Template(NamedTuple):
+    segments: tuple[tuple[str, str | None], ...]
+
+    @property
+    def fields(self) -> frozenset[str]:
+        return frozenset(field for _, field in self.segments if field is not None)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        """
+        Join the literal segments with the values of the fields.
+
+        Raises:
+        KeyError: If a field has no value
+        """
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(values[field])
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=64)
+def _compile_fields(text: str, fields: tuple[str, ...]) -> Template:
+    pattern = re.compile(r"\{(" + '|'.join(map(re.escape, fields)) + r")\}")
+    segments = []
+    position = 0
+    for match in pattern.finditer(text):
+        segments.append((text[position:match.start()], match.group(1)))
+        position = match.end()
+    segments.append((text[position:], None))
+    return Template(tuple(segments))
+
+
+@lru_cache(maxsize=64)
+def _compile_format(text: str) -> Template:
+    segments = []
+    for literal, field, format_spec, conversion in Formatter().parse(text):
+        if format_spec or conversion:
+            raise ValueError(f"Unsupported conversion or format spec in template field: {{{field}}}")
+        segments.append((literal, field))
+    return Template(tuple(segments))
+
+
+def compile_template(text: str, fields: Collection[str] | None = None) -> Template:
+    """
+    Split a template into literal and field segments (compiled templates are cached by text).
+
+    Args:
+    text (str): The template
+    fields (Collection[str] | None): Names of the placeholders to recognize, or None for `str.format` syntax
+
+    Returns:
+    Template: The compiled template
+
+    Raises:
+    ValueError: In `str.format` mode, if the template is malformed or a field has a conversion or format spec
+    """
+    if fields is None:
+        return _compile_format(text)
+    return _compile_fields(text, tuple(sorted(fields)))
+
+
+def get_template(name: str, fields: Collection[str] | None = PROMPT_FIELDS, pack: str | None = None) -> Template:
+    """Compiled template of a prompt resource (see `get_prompt`)."""
+    return compile_template(get_prompt(name, pack), fields)
+
+
+class PromptVariant(NamedTuple):
+    fence: tuple[str, str] = DEFAULT_FENCE
+    lazy_prompt: str = ''
+    shell: bool = True
+    platform: str = ''
+
+    def get_values(self) -> dict[str, str]:
+        """Values of the placeholders shared by all `.txt` prompts of this variant."""
+        return {
+            'lazy_prompt': self.lazy_prompt,
+            'platform': self.platform,
+            'fence[0]': self.fence[0],
+            'fence[1]': self.fence[1],
+        }
+
+
+def _render_sections(texts: tuple[str, ...], variant: PromptVariant) -> tuple[str, str]:
+    (
+        main_system, system_reminder, edit_format_training, final_remarks, shell_cmd_prompt, no_shell_cmd_prompt,
+        shell_cmd_reminder
+    ) = (compile_template(text, PROMPT_FIELDS) for text in texts)
+    values = variant.get_values()
+    values['edit_format_training'] = edit_format_training.render(values)
+    values['final_remarks'] = final_remarks.render(values)
+    if variant.shell:
+        values['shell_cmd_prompt'] = shell_cmd_prompt.render(values)
+        values['shell_cmd_reminder'] = shell_cmd_reminder.render(values)
+    else:
+        values['shell_cmd_prompt'] = no_shell_cmd_prompt.render(values)
+        values['shell_cmd_reminder'] = ''
+    return main_system.render(values), system_reminder.render(values)
+
+
+@lru_cache(maxsize=32)
+def _render_cached(texts: tuple[str, ...], variant: PromptVariant) -> tuple[str, str]:
+    return _render_sections(texts, variant)
+
+
+def _get_section_texts(pack: str | None) -> tuple[str, ...]:
+    # Interned and memoized by `get_prompt`: the LRU caches below compare these keys by value, but equal texts are
+    # usually the same objects, so the comparison stops at the identity check
+    return tuple(get_prompt(name, pack) for name in (
+        'main_system', 'system_reminder', 'edit_format_training', 'final_remarks', 'shell_cmd_prompt',
+        'no_shell_cmd_prompt', 'shell_cmd_reminder',
+    ))
+
+
+def render_main_system(
+        fence: tuple[str, str] = DEFAULT_FENCE, lazy_prompt: str = '', shell: bool = True, platform: str = '',
+        pack: str | None = None
+) -> str:
+    """`main_system.txt` with its sections filled in for the given variant."""
+    variant = PromptVariant(get_fence_pair(fence), lazy_prompt, shell, platform)
+    return _render_cached(_get_section_texts(pack), variant)[0]
+
+
+def render_system_reminder(
+        fence: tuple[str, str] = DEFAULT_FENCE, lazy_prompt: str = '', shell: bool = True, platform: str = '',
+        pack: str | None = None
+) -> str:
+    """`system_reminder.txt` with its sections filled in for the given variant."""
+    variant = PromptVariant(get_fence_pair(fence), lazy_prompt, shell, platform)
+    return _render_cached(_get_section_texts(pack), variant)[1]
+
+
+@lru_cache(maxsize=32)
+def _render_system_prompt(texts: tuple[str, ...], variant: PromptVariant) -> str:
+    main_system, system_reminder = _render_cached(texts, variant)
+    return f"{main_system}\n{system_reminder}"
+
+
+def render_system_prompt(
+        fence: tuple[str, str] = DEFAULT_FENCE, lazy_prompt: str = '', shell: bool = True, platform: str = '',
+        pack: str | None = None
+) -> str:
+    """
+    The complete CEDARScript system prompt (main system prompt, then the system reminder) of a variant, rendered once
+    per variant and then served from an LRU cache.
+
+    Args:
+    fence (tuple[str, str]): Opening and closing fence of code blocks
+    lazy_prompt (str): Text of the `{lazy_prompt}` placeholders (aider passes its lazy prompt for lazy models, else '')
+    shell (bool): Whether shell commands may be suggested (`shell_cmd_prompt.txt`, else `no_shell_cmd_prompt.txt`)
+    platform (str): Description of the user's platform, for the `{platform}` placeholders
+    pack (str | None): Prompt pack to use (default: see `get_default_pack`)
+
+    Returns:
+    str: The system prompt
+    """
+    variant = PromptVariant(get_fence_pair(fence), lazy_prompt, shell, platform)
+    return _render_system_prompt(_get_section_texts(pack), variant)
+
+
+@lru_cache(maxsize=16)
+def _render_example_messages(text: str, fence: tuple[str, str]) -> str:
+    return compile_template(text).render({'fence[0]': fence[0], 'fence[1]': fence[1]})
+
+
+def render_example_messages(fence: tuple[str, str] = DEFAULT_FENCE, pack: str | None = None) -> str:
+    """`example_messages.cedarml` with its fences filled in (rendered once per fence pair)."""
+    return _render_example_messages(get_prompt('example_messages', pack), get_fence_pair(fence))
+
+
+class PromptSegment(NamedTuple):
+    name: str
+    text: str
+    cacheable: bool
+    sha256: str
+
+
+def _make_segment(name: str, text: str, cacheable: bool) -> PromptSegment:
+    return PromptSegment(name, text, cacheable, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+class CacheFriendlyPrompt(NamedTuple):
+    """The segments of a prompt, cacheable ones first (see `render_cache_friendly_prompt`)."""
+    segments: tuple[PromptSegment, ...]
+
+    @property
+    def prefix(self) -> str:
+        """The leading cacheable segments, byte-identical across requests (example messages serialized as JSON)"""
+        return ''.join(segment.text for segment in self.segments if segment.cacheable)
+
+    @property
+    def text(self) -> str:
+        return ''.join(segment.text for segment in self.segments)
+
+    @property
+    def prefix_hashes(self) -> tuple[str, ...]:
+        """
+        Cumulative sha256 of the prefix after each cacheable segment: a provider's cached prefix only matches if every
+        segment before it matches too.
+        """
+        hashes = []
+        digest = hashlib.sha256()
+        for segment in self.segments:
+            if not segment.cacheable:
+                break
+            digest.update(segment.text.encode('utf-8'))
+            hashes.append(digest.hexdigest())
+        return tuple(hashes)
+
+
+@lru_cache(maxsize=16)
+def _serialize_example_messages(example_texts: tuple[str, ...], fence: tuple[str, str], pack: str | None) -> str:
+    from .cedarml import get_example_messages  # `cedarml` imports this module
+    return json.dumps(get_example_messages(fence, pack), ensure_ascii=False, separators=(',', ':'))
+
+
+def _get_example_messages_json(fence: tuple[str, str], pack: str | None) -> str:
+    from .cedarml import get_example_file_names
+    pack = pack or get_default_pack()
+    # Keyed by the texts of the example files, so edited examples are serialized anew
+    example_texts = tuple(get_prompt(file_name, pack) for file_name in get_example_file_names(pack))
+    return _serialize_example_messages(example_texts, get_fence_pair(fence), pack)
+
+
+@lru_cache(maxsize=32)
+def _render_cache_friendly(
+        texts: tuple[str, ...], example_messages_json: str, variant: PromptVariant
+) -> CacheFriendlyPrompt:
+    (
+        main_system, system_reminder, edit_format_training, final_remarks, shell_cmd_prompt, no_shell_cmd_prompt,
+        shell_cmd_reminder
+    ) = (compile_template(text, PROMPT_FIELDS) for text in texts)
+    # The static sections are rendered with empty variable placeholders; their values go to the last segment instead
+    static_values = PromptVariant(variant.fence).get_values()
+    static_values['edit_format_training'] = edit_format_training.render(static_values)
+    static_values['final_remarks'] = final_remarks.render(static_values)
+    static_values['shell_cmd_prompt'] = static_values['shell_cmd_reminder'] = ''
+    values = variant.get_values()
+    variable_parts: tuple[str, ...]
+    if variant.shell:
+        variable_parts = (variant.lazy_prompt, shell_cmd_prompt.render(values), shell_cmd_reminder.render(values))
+    else:
+        variable_parts = (variant.lazy_prompt, no_shell_cmd_prompt.render(values))
+    variable_text = '\n'.join(part.strip('\n') for part in variable_parts if part.strip())
+    return CacheFriendlyPrompt((
+        _make_segment('main_system', main_system.render(static_values).rstrip() + '\n', True),
+        _make_segment('system_reminder', system_reminder.render(static_values).strip() + '\n', True),
+        _make_segment('example_messages', example_messages_json, True),
+        _make_segment('variant', variable_text + '\n' if variable_text else '', False),
+    ))
+
+
+def render_cache_friendly_prompt(
+        fence: tuple[str, str] = DEFAULT_FENCE, lazy_prompt: str = '', shell: bool = True, platform: str = '',
+        pack: str | None = None
+) -> CacheFriendlyPrompt:
+    """
+    Prompt layout for providers with prefix caching: the static content comes first, in a byte-stable prefix, and
+    everything that varies between sessions comes last. Segments, in order:
+    - `main_system`: the main system prompt, with the training and the final remarks (cacheable)
+    - `system_reminder`: the system reminder (cacheable)
+    - `example_messages`: the example chat messages with their fences filled in, as a compact JSON list of
+      `{"role": ..., "content": ...}` objects (cacheable, stable for a given fence). Clients send them as separate chat
+      messages, so this hashes what a provider receives rather than the CedarML source
+    - `variant`: the lazy prompt and the shell command prompt and reminder for the platform (not cacheable)
+    Compare the `sha256` of each segment (or the `prefix_hashes`) across requests to check that the prefix is stable.
+    Arguments are those of `render_system_prompt`.
+    """
+    return _render_cache_friendly(
+        _get_section_texts(pack), _get_example_messages_json(fence, pack),
+        PromptVariant(get_fence_pair(fence), lazy_prompt, shell, platform)
+    )
@@ -0,0 +1,230 @@
+"""
+Offline token accounting of the prompt resources.
+
+Tokenizers are pluggable (see `register_tokenizer`):
+- `approx`: a calibrated approximation that needs no dependency. It counts letter runs, digit runs, punctuation and
+  line breaks the way BPE tokenizers roughly merge them, then applies a scale factor that `calibrate` fits on
+  reference counts
+- `tiktoken:<encoding>`, e.g. `tiktoken:o200k_base`: exact counts for OpenAI encodings (needs the `tiktoken` package)
+
+Resources are split into sections along their markup: top-level elements like `<core-commands>`, `<dl>` or `<dt>`,
+and the `<cedarml:role.*>` messages of `example_messages.cedarml`. Text that isn't inside an element is a `(text)`
+section. Tags without a matching closing tag (such as the `<target>` placeholders of the grammar) are plain text.
+"""
+import math
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import NamedTuple, Protocol
+
+from .prompts import get_prompt
+from .templates import DEFAULT_FENCE, render_example_messages, render_system_prompt, render_system_reminder
+
+_TAG_RE = re.compile(r"<(/?)([A-Za-z][\w.:-]*)(?:\s[^<>\n]*)?>")
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\n+|[ \t]+|[^\sA-Za-z\d]+")
+
+
+class Tokenizer(Protocol):
+    @property
+    def name(self) -> str:
+        ...
+
+    def count(self, text: str) -> int:
+        ...
+
+
+@dataclass(frozen=True)
+class ApproximateTokenizer:
+    """
+    Dependency-free token count estimate. Each piece of text costs, before scaling:
+    - letter run: 1 token per 6 letters (common words are a single token)
+    - digit run: 1 token per 3 digits
+    - punctuation run: 1 token per 2 characters
+    - line breaks: 1 token per run; indentation: 1 token per 4 spaces or tabs (a single space is merged with the word
+      that follows it)
+    """
+    scale: float = 1.0
+    name: str = 'approx'
+
+    @staticmethod
+    def get_raw_count(text: str) -> int:
+        raw_count = 0
+        for piece in _PIECE_RE.findall(text):
+            first = piece[0]
+            if first.isalpha():
+                raw_count += math.ceil(len(piece) / 6)
+            elif first.isdigit():
+                raw_count += math.ceil(len(piece) / 3)
+            elif first == '\n':
+                raw_count += 1
+            elif first in ' \t':
+                raw_count += len(piece) // 4
+            else:
+                raw_count += math.ceil(len(piece) / 2)
+        return raw_count
+
+    def count(self, text: str) -> int:
+        return round(self.get_raw_count(text) * self.scale)
+
+    @classmethod
+    def calibrate(cls, samples: Iterable[tuple[str, int]]) -> 'ApproximateTokenizer':
+        """
+        Fit the scale factor on texts whose token counts are known (e.g. from a real tokenizer or API usage data).
+
+        Args:
+        samples (Iterable[tuple[str, int]]): Texts and their reference token counts
+
+        Returns:
+        ApproximateTokenizer: A tokenizer whose total count over the samples matches the reference total
+        """
+        raw_total = reference_total = 0
+        for text, reference_count in samples:
+            raw_total += cls.get_raw_count(text)
+            reference_total += reference_count
+        return cls(scale=reference_total / raw_total if raw_total else 1.0)
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding_name: str = 'o200k_base'):
+        try:
+            import tiktoken
+        except ImportError:
+            raise RuntimeError("Tokenizer `tiktoken` needs the `tiktoken` package: pip install tiktoken") from None
+        self.name = f"tiktoken:{encoding_name}"
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+# tokenizer kind -> factory taking the part of the tokenizer name after `:` ('' if absent)
+_TOKENIZER_FACTORIES: dict[str, Callable[[str], Tokenizer]] = {
+    'approx': lambda argument: ApproximateTokenizer(float(argument) if argument else 1.0),
+    'tiktoken': lambda argument: TiktokenTokenizer(argument or 'o200k_base'),
+}
+
+
+def register_tokenizer(kind: str, factory: Callable[[str], Tokenizer]) -> None:
+    """
+    Make a tokenizer available to `get_tokenizer` as `<kind>` or `<kind>:<argument>`.
+    The factory gets the argument ('' if absent), e.g. a model or encoding name.
+    """
+    _TOKENIZER_FACTORIES[kind] = factory
+
+
+def get_tokenizer(name: str = 'approx') -> Tokenizer:
+    """
+    Tokenizer by name: `approx`, `approx:<scale>`, `tiktoken` or `tiktoken:<encoding>`, or a registered kind.
+
+    Raises:
+    ValueError: If the tokenizer kind is unknown
+    """
+    kind, _, argument = name.partition(':')
+    try:
+        factory = _TOKENIZER_FACTORIES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer: {name} (known: {', '.join(sorted(_TOKENIZER_FACTORIES))})") from None
+    return factory(argument)
+
+
+class Section(NamedTuple):
+    name: str
+    depth: int
+    text: str
+
+    @property
+    def label(self) -> str:
+        """The section name and the start of its first line, e.g. `dt: <dt>UPDATE <update-target> ...`"""
+        first_line = self.text.strip().split('\n', 1)[0]
+        if len(first_line) > 60:
+            first_line = first_line[:57] + '...'
+        return f"{self.name}: {first_line}"
+
+
+def _find_closing_tag(text: str, name: str, position: int) -> re.Match[str] | None:
+    # Skips nested elements of the same name
+    tag_re = re.compile(rf"<(/?){re.escape(name)}(?:\s[^<>\n]*)?>")
+    open_count = 1
+    for match in tag_re.finditer(text, position):
+        open_count += -1 if match.group(1) else 1
+        if not open_count:
+            return match
+    return None
+
+
+def iter_sections(text: str, max_depth: int = 1, depth: int = 0) -> Iterator[Section]:
+    """
+    Split text into its elements (and the text between them), descending into elements up to `max_depth` levels
+    (0 yields nothing, 1 only the top-level sections). An element is yielded before its own sections.
+    """
+    if depth >= max_depth:
+        return
+    position = text_start = 0
+    while match := _TAG_RE.search(text, position):
+        position = match.end()
+        if match.group(1):
+            continue
+        name = match.group(2)
+        closing_tag = _find_closing_tag(text, name, match.end())
+        if closing_tag is None:
+            continue
+        end = closing_tag.end()
+        if text[text_start:match.start()].strip():
+            yield Section('(text)', depth, text[text_start:match.start()])
+        yield Section(name, depth, text[match.start():end])
+        yield from iter_sections(text[match.end():closing_tag.start()], max_depth, depth + 1)
+        position = text_start = end
+    if text[text_start:].strip():
+        yield Section('(text)', depth, text[text_start:])
+
+
+class SectionTokens(NamedTuple):
+    section: Section
+    tokens: int
+
+
+def count_sections(
+        text: str, tokenizer: Tokenizer | None = None, max_depth: int = 1
+) -> tuple[int, list[SectionTokens]]:
+    """
+    Count the tokens of a text and of each of its sections.
+    Tokenization isn't additive, so section counts may not add up exactly to the total.
+
+    Returns:
+    tuple[int, list[SectionTokens]]: The total token count, and the count of each section (see `iter_sections`)
+    """
+    selected_tokenizer = tokenizer or ApproximateTokenizer()
+    return selected_tokenizer.count(text), [
+        SectionTokens(section, selected_tokenizer.count(section.text)) for section in iter_sections(text, max_depth)
+    ]
+
+
+def count_prompt_tokens(
+        name: str, tokenizer: Tokenizer | None = None, max_depth: int = 1, pack: str | None = None
+) -> tuple[int, list[SectionTokens]]:
+    """`count_sections` of a prompt resource (see `get_prompt`), as stored (placeholders not filled in)."""
+    return count_sections(get_prompt(name, pack), tokenizer, max_depth)
+
+
+class PromptBudget(NamedTuple):
+    system_prompt: int
+    system_reminder: int
+    example_messages: int
+
+    @property
+    def total(self) -> int:
+        """Tokens sent on every turn: the system prompt (which includes the reminder) and the example messages"""
+        return self.system_prompt + self.example_messages
+
+
+def get_prompt_budget(
+        tokenizer: Tokenizer | None = None, fence: tuple[str, str] = DEFAULT_FENCE, lazy_prompt: str = '',
+        shell: bool = True, platform: str = '', pack: str | None = None
+) -> PromptBudget:
+    """Per-turn token cost of a prompt variant (see `render_system_prompt` for the arguments)."""
+    selected_tokenizer = tokenizer or ApproximateTokenizer()
+    return PromptBudget(
+        selected_tokenizer.count(render_system_prompt(fence, lazy_prompt, shell, platform, pack)),
+        selected_tokenizer.count(render_system_reminder(fence, lazy_prompt, shell, platform, pack)),
+        selected_tokenizer.count(render_example_messages(fence, pack)),
+    )
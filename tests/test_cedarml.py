@@ -0,0 +1,99 @@
+import pytest
+
+from cedarscript_integration_aider import cedarml
+from cedarscript_integration_aider.cedarml import get_example_file_names, iter_cedarml_messages, iter_example_messages
+
+TRANSCRIPT = """<list>
+<cedarml:role.user>
+Change `f` in {fence[0]}python{fence[1]}
+</cedarml:role.user>
+<cedarml:role.assistant>
+{fence[0]}CEDARScript
+UPDATE FUNCTION "f" WITH CONTENT '''
+return {{'a': 1}}
+''';
+{fence[1]}
+</cedarml:role.assistant>
+</list>
+"""
+
+
+def parse(text: str, fence=('```', '```')) -> list[dict[str, str]]:
+    return list(iter_cedarml_messages(text.splitlines(keepends=True), fence, 'test.cedarml'))
+
+
+def test_fills_in_fences_and_escaped_braces():
+    assert parse(TRANSCRIPT, ('<source>', '</source>')) == [
+        {'role': 'user', 'content': "Change `f` in <source>python</source>"},
+        {
+            'role': 'assistant',
+            'content': "<source>CEDARScript\nUPDATE FUNCTION \"f\" WITH CONTENT '''\nreturn {'a': 1}\n''';\n</source>"
+        },
+    ]
+
+
+def test_keeps_placeholders_without_fence():
+    messages = parse(TRANSCRIPT, None)
+    assert messages[0]['content'] == "Change `f` in {fence[0]}python{fence[1]}"
+    assert "return {{'a': 1}}" in messages[1]['content']
+
+
+def test_single_line_message():
+    assert parse("<cedarml:role.user>Hi</cedarml:role.user>\n") == [{'role': 'user', 'content': 'Hi'}]
+
+
+def test_yields_each_message_once_closed():
+    read_lines = []
+
+    def lines():
+        for line in TRANSCRIPT.splitlines(keepends=True):
+            read_lines.append(line)
+            yield line
+
+    messages = iter_cedarml_messages(lines())
+    assert next(messages)['role'] == 'user'
+    assert read_lines[-1] == "</cedarml:role.user>\n"
+
+
+@pytest.mark.parametrize('text, error', [
+    ("<cedarml:role.user>\n<cedarml:role.assistant>\n", "test.cedarml:2: message opened inside the message of line 1"),
+    ("<cedarml:role.user>\nHi\n", "test.cedarml:1: `user` message isn't closed"),
+    ("<cedarml:role.user>\nHi\n</cedarml:role.assistant>\n", "test.cedarml:3: `assistant` closes a `user` message"),
+    ("<cedarml:role.user>\n{fence[2]}\n</cedarml:role.user>\n", "test.cedarml:2: bad placeholder"),
+    ("<cedarml:role.user>\n{name}\n</cedarml:role.user>\n", "test.cedarml:2: bad placeholder"),
+    ("<cedarml:role.user>\n{fence[0]!r}\n</cedarml:role.user>\n", "test.cedarml:2: bad placeholder"),
+])
+def test_malformed_transcripts(text, error):
+    with pytest.raises(ValueError, match=error):
+        parse(text)
+
+
+def test_numbered_example_files_in_numeric_order(monkeypatch):
+    monkeypatch.setattr(cedarml, 'list_prompt_files', lambda pack=None: (
+        '10.example_messages.cedarml', '2.example_messages.xml', 'example_messages.cedarml', 'main_system.txt',
+        'x.example_messages.cedarml',
+    ))
+    assert get_example_file_names() == [
+        'example_messages.cedarml', '2.example_messages.xml', '10.example_messages.cedarml'
+    ]
+
+
+def test_example_messages_merged_in_order_and_cached_per_pack(monkeypatch):
+    texts = {
+        'example_messages.cedarml': "<cedarml:role.user>first</cedarml:role.user>\n",
+        '2.example_messages.cedarml': "<cedarml:role.user>second {fence[0]}</cedarml:role.user>\n",
+    }
+    monkeypatch.setattr(cedarml, 'list_prompt_files', lambda pack=None: tuple(sorted(texts)))
+    monkeypatch.setattr(cedarml, 'get_prompt', lambda name, pack=None: texts[name])
+    monkeypatch.setattr(cedarml, 'get_default_pack', lambda: 'default')
+    monkeypatch.setattr(cedarml, '_messages_cache', {})
+    assert [m['content'] for m in iter_example_messages(('<', '>'))] == ['first', 'second <']
+    assert [m['content'] for m in iter_example_messages(('<', '>'), 'default')] == ['first', 'second <']
+    assert list(cedarml._messages_cache) == [('default', ('<', '>'), tuple(texts.values()))]
+
+
+def test_shipped_example_messages():
+    messages = cedarml.get_example_messages()
+    assert messages and messages[0]['role'] == 'user'
+    assert {message['role'] for message in messages} == {'user', 'assistant'}
+    assert not any('{fence[' in message['content'] for message in messages)
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+from cedarscript_integration_aider.example_selection import (
+    ExampleIndex, get_terms, select_example_messages, split_examples
+)
+
+MESSAGES = [
+    {'role': 'user', 'content': "Rename the variable `total_count` in `report.py`"},
+    {'role': 'assistant', 'content': "UPDATE FILE \"report.py\" REPLACE ..."},
+    {'role': 'user', 'content': "Move method `parseHeader` to a top-level function"},
+    {'role': 'assistant', 'content': "UPDATE CLASS \"Parser\" MOVE METHOD \"parseHeader\" ..."},
+    {'role': 'user', 'content': "Add a docstring to `main`"},
+    {'role': 'assistant', 'content': "UPDATE FUNCTION \"main\" ..."},
+    {'role': 'user', 'content': "Convert the loop in `build.rs` to an iterator"},
+    {'role': 'assistant', 'content': "UPDATE FUNCTION \"build\" ..."},
+]
+
+
+@pytest.fixture
+def index() -> ExampleIndex:
+    return ExampleIndex(split_examples(MESSAGES))
+
+
+def test_get_terms_splits_identifiers_and_drops_stop_words():
+    assert get_terms("Move the parseHeader to total_count") == [
+        'move', 'parseheader', 'parse', 'header', 'total_count', 'total', 'count'
+    ]
+
+
+def test_split_examples_starts_an_example_at_each_user_message():
+    examples = split_examples([{'role': 'assistant', 'content': 'hi'}] + MESSAGES[:3])
+    assert [len(example.messages) for example in examples] == [1, 2, 1]
+    assert [example.position for example in examples] == [0, 1, 2]
+
+
+def test_search_ranks_by_relevance_and_keeps_original_order(index):
+    assert [example.position for example in index.search("move the header parser method", k=1)] == [1]
+    assert [example.position for example in index.search("docstring for parseHeader", k=2)] == [1, 2]
+
+
+def test_search_matches_target_file_names_and_extensions(index):
+    assert [example.position for example in index.search("change it", ['src/report.py'], k=1)] == [0]
+    assert [example.position for example in index.search("change it", ['src/lib.rs'], k=1)] == [3]
+
+
+def test_search_fills_in_with_the_first_examples(index):
+    assert [example.position for example in index.search("iterator", k=3)] == [0, 1, 3]
+    assert [example.position for example in index.search("no match at all", k=2)] == [0, 1]
+
+
+def test_search_k_bounds(index):
+    assert index.search("move", k=0) == []
+    assert len(index.search("move", k=10)) == 4
+    with pytest.raises(ValueError, match="k must not be negative: -1"):
+        index.search("move", k=-1)
+
+
+def test_select_example_messages_from_shipped_examples():
+    messages = select_example_messages("use math.factorial in get_factorial", k=1)
+    assert messages[0]['role'] == 'user' and 'factorial' in messages[0]['content']
+    assert all(message['role'] != 'user' for message in messages[1:])
+    with pytest.raises(ValueError):
+        select_example_messages("anything", k=-1)
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_BENCHMARKS'), reason="timing benchmark, set RUN_BENCHMARKS=1 to run it")
+def test_select_example_messages_is_well_under_a_millisecond():
+    query = "Move the `convert_to_int` method of class `A` to a top-level function in `main.py`"
+    select_example_messages(query, ['main.py'])  # Builds the index
+    runs = 200
+    start = time.perf_counter()
+    for _ in range(runs):
+        select_example_messages(query, ['main.py'])
+    assert (time.perf_counter() - start) / runs < 1e-3
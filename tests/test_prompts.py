@@ -0,0 +1,19 @@
+import pytest
+
+from cedarscript_integration_aider.prompts import get_prompt, get_prompt_folder_path, get_prompt_path
+
+
+def test_prompt_folder_of_a_pack_overlays_the_default_pack():
+    folder = get_prompt_folder_path('lean') / 'cedarscript'
+    assert (folder / 'main_system.txt').read_text(encoding='utf-8') == get_prompt('main_system', 'lean')
+    assert folder.joinpath('shell_cmd_prompt.txt') == get_prompt_path('shell_cmd_prompt', 'default')
+    assert {entry.name for entry in folder.iterdir()} == {
+        entry.name for entry in (get_prompt_folder_path('default') / 'cedarscript').iterdir()
+    }
+    with pytest.raises(FileNotFoundError):
+        (folder / 'missing.txt').read_text()
+
+
+def test_prompt_folder_of_an_unknown_pack():
+    with pytest.raises(ValueError, match="Unknown prompt pack: nope"):
+        get_prompt_folder_path('nope')